@@ -0,0 +1,232 @@
+"""Background poller that pushes new Mist alarms as they are raised."""
+
+# Standard library
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Local
+from mist_helper import MIST_ERRORS, OrgAlerts, SiteAlerts
+from mist_ratelimit import BACKGROUND
+
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------
+# Poller parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+DEFAULT_POLL_INTERVAL = float(os.environ.get("MIST_ALARM_POLL_INTERVAL", "60"))
+# alarms can be indexed a little after their timestamp, so re-read this much
+DEFAULT_POLL_OVERLAP = int(os.environ.get("MIST_ALARM_POLL_OVERLAP", "120"))
+DEFAULT_PUSH_SEVERITIES = tuple(
+    os.environ.get("MIST_ALARM_PUSH_SEVERITIES", "critical,warn").split(",")
+)
+
+
+# -----------------------------------------------------------------------------
+# Per-site high-water marks
+# -----------------------------------------------------------------------------
+class HighWaterMark:
+    """Latest alarm timestamp of one site, plus the alarm ids seen since."""
+
+    __slots__ = ("timestamp", "seen")
+
+    def __init__(self, timestamp: int = 0):
+        self.timestamp = timestamp
+        self.seen: Dict[str, int] = {}
+
+    def admit(self, alarm) -> bool:
+        """True the first time an alarm id shows up."""
+
+        if alarm.id in self.seen:
+            return False
+
+        self.seen[alarm.id] = alarm.timestamp
+        self.timestamp = max(self.timestamp, alarm.timestamp)
+
+        return True
+
+    def prune(self, before: int):
+        """Forget ids older than any future poll window can return."""
+
+        self.seen = {
+            alarm_id: timestamp
+            for alarm_id, timestamp in self.seen.items()
+            if timestamp >= before
+        }
+
+
+# -----------------------------------------------------------------------------
+# Alarm poller
+# -----------------------------------------------------------------------------
+class AlarmPoller:
+    """Fetch only the alarms raised since the last poll and push new ones.
+
+    Every poll is a single org-wide `alarms/search` covering only the time
+    since the previous poll (plus `overlap`), so its cost does not grow
+    with the history already seen. Alarms are deduped on id against each
+    site's high-water mark, and only the `severities` asked for are handed
+    to `push(org_alerts)`. The first poll starts from now, not a backfill.
+    Every alarm fetched is also recorded in `store`, when one is given.
+
+    With a `lease`, only the replica holding it polls. The leader keeps
+    how far it polled on the lease's backend, so a replica taking over
+    resumes from there instead of skipping or re-pushing alarms.
+    """
+
+    def __init__(
+        self,
+        mist,
+        org_id: str,
+        push: Callable[[OrgAlerts], None],
+        site_names: Optional[Callable[[], Dict[str, str]]] = None,
+        interval: float = DEFAULT_POLL_INTERVAL,
+        overlap: int = DEFAULT_POLL_OVERLAP,
+        severities: Iterable[str] = DEFAULT_PUSH_SEVERITIES,
+        store=None,
+        lease=None,
+    ):
+        self.mist = mist
+        self.org_id = org_id
+        self.push = push
+        self.site_names = site_names or dict
+        self.interval = interval
+        self.overlap = overlap
+        self.severities = tuple(severities)
+        self.store = store
+        self.lease = lease
+        self.marks: Dict[str, HighWaterMark] = {}
+        self.started_at: Optional[int] = None
+        self.polled_until: Optional[int] = None
+        self.stats = {"polls": 0, "fetched": 0, "pushed": 0, "failed": 0}
+        self._stopping = False
+
+    def window_start(self) -> int:
+        """Where the next delta request starts."""
+        return self.polled_until - self.overlap
+
+    def poll(self, now: Optional[int] = None) -> List:
+        """Run one delta poll and return the alarms that were new."""
+
+        now = int(time.time() if now is None else now)
+        if self.started_at is None:
+            # start from here (or where the last leader stopped) rather
+            # than pushing the whole backlog
+            self.started_at = self.polled_until = self._resume_from(now)
+
+        query = (
+            f"start={self.window_start()}&end={now}"
+            f"&severity={','.join(self.severities)}&limit=100"
+        )
+        path = f"orgs/{self.org_id}/alarms/search?{query}"
+
+        alarms = SiteAlerts.from_records(
+            self.mist.iter_results(path, priority=BACKGROUND)
+        ).results
+        if self.store is not None:
+            self.store.record(alarms)
+
+        fresh = []
+        for alarm in alarms:
+            self.stats["fetched"] += 1
+            mark = self.marks.get(alarm.site_id)
+            if mark is None:
+                mark = self.marks[alarm.site_id] = HighWaterMark()
+            if alarm.timestamp < self.started_at or not mark.admit(alarm):
+                continue
+            if alarm.severity in self.severities:
+                fresh.append(alarm)
+
+        self.stats["polls"] += 1
+        self.polled_until = now
+        self._share_progress()
+        for mark in self.marks.values():
+            mark.prune(self.window_start())
+
+        if fresh:
+            self.stats["pushed"] += len(fresh)
+            self.push(OrgAlerts.from_alarms(fresh, self.site_names()))
+
+        return fresh
+
+    def _resume_from(self, now: int) -> int:
+        """Where the previous leader stopped, if recent enough; else `now`."""
+
+        if self.lease is None:
+            return now
+
+        try:
+            raw = self.lease.backend.get(f"poller:{self.org_id}")
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning("reading the poller progress failed: %s", error)
+            raw = None
+        if raw is None:
+            return now
+
+        # a handover gap is at most one lease plus a couple of polls
+        earliest = now - int(self.lease.ttl + 2 * self.interval)
+
+        return min(now, max(int(raw), earliest))
+
+    def _share_progress(self):
+        """Record how far we polled for whoever leads next."""
+
+        if self.lease is None:
+            return
+
+        try:
+            self.lease.backend.set(
+                f"poller:{self.org_id}", str(self.polled_until).encode(), 86400
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning("sharing the poller progress failed: %s", error)
+
+    def tick(self):
+        """Run one cycle: poll if we lead, else forget our progress.
+
+        A failed cycle is logged and counted, never raised, so the next
+        interval still runs.
+        """
+
+        try:
+            if self.lease is None or self.lease.held():
+                self.poll()
+            elif self.started_at is not None:
+                # another replica polls now; resume from its progress later
+                self.started_at = self.polled_until = None
+                self.marks = {}
+        except MIST_ERRORS as error:
+            self.stats["failed"] += 1
+            logger.warning("alarm poll failed: %s", error)
+        except Exception:  # pylint: disable=broad-except
+            # an odd payload, a failing sink or an unreachable lease backend
+            # costs this cycle, not the poller thread
+            self.stats["failed"] += 1
+            logger.exception("alarm poll failed")
+
+    def run(self):
+        """Poll on the current thread until `stop()`, while we lead."""
+
+        while not self._stopping:
+            self.tick()
+            if self.lease is None:
+                time.sleep(self.interval)
+            else:
+                # renew between polls, or the lease lapses when the
+                # interval outlasts its ttl
+                self.lease.wait(self.interval)
+
+    def stop(self):
+        """End `run()` after the current cycle."""
+        self._stopping = True
+
+    def start(self) -> threading.Thread:
+        """Poll on a daemon thread."""
+
+        thread = threading.Thread(target=self.run, name="alarm-poller", daemon=True)
+        thread.start()
+
+        return thread
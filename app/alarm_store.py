@@ -0,0 +1,194 @@
+"""Local SQLite history of every alarm the bot has fetched from Mist."""
+
+# Standard library
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional
+
+# Local
+from mist_helper import SiteAlerts
+
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------
+# Store parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+# anchored to the app, not to whatever directory the bot was started from
+DEFAULT_DATA_DIR = os.environ.get(
+    "MIST_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+)
+DEFAULT_ALARM_DB = os.environ.get(
+    "MIST_ALARM_DB", os.path.join(DEFAULT_DATA_DIR, "alarms.sqlite3")
+)
+# most alarms a single query hands back to a report
+DEFAULT_QUERY_LIMIT = int(os.environ.get("MIST_ALARM_QUERY_LIMIT", "1000"))
+DEFAULT_RETENTION_DAYS = float(os.environ.get("MIST_ALARM_RETENTION_DAYS", "30"))
+DEFAULT_COMPACT_INTERVAL = float(os.environ.get("MIST_ALARM_COMPACT_INTERVAL", "3600"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alarms (
+    id TEXT PRIMARY KEY,
+    site_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alarms_site_time ON alarms (site_id, timestamp);
+CREATE INDEX IF NOT EXISTS alarms_site_type_time ON alarms (site_id, type, timestamp);
+CREATE INDEX IF NOT EXISTS alarms_type_time ON alarms (type, timestamp);
+CREATE INDEX IF NOT EXISTS alarms_severity_time ON alarms (severity, timestamp);
+CREATE INDEX IF NOT EXISTS alarms_time ON alarms (timestamp);
+"""
+
+UPSERT = """
+INSERT INTO alarms (id, site_id, type, severity, timestamp, last_seen, payload)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    severity = excluded.severity,
+    last_seen = excluded.last_seen,
+    payload = excluded.payload
+"""
+
+
+# -----------------------------------------------------------------------------
+# Alarm store
+# -----------------------------------------------------------------------------
+class AlarmStore:
+    """Indexed, persistent alarm history answering queries without Mist.
+
+    Alarms are upserted on id, so the overlapping windows of repeated
+    fetches never duplicate rows. Rows older than `retention_days` are
+    deleted, and the freed pages returned to the filesystem, at most once
+    every `compact_interval` seconds as new alarms come in.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_ALARM_DB,
+        retention_days: float = DEFAULT_RETENTION_DAYS,
+        compact_interval: float = DEFAULT_COMPACT_INTERVAL,
+    ):
+        self.path = path
+        self.retention = int(retention_days * 86400)
+        self.compact_interval = compact_interval
+        self.compacted_at = time.monotonic()
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            # must be set before the first table exists to take effect
+            self._db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self._db.execute("PRAGMA journal_mode = WAL")
+            self._db.execute("PRAGMA synchronous = NORMAL")
+            self._db.executescript(SCHEMA)
+
+    def record(self, alarms: Iterable) -> int:
+        """Upsert `Results`/`AlarmRecord`s; returns how many were written."""
+
+        rows = [
+            (
+                each.id,
+                each.site_id,
+                each.type,
+                each.severity,
+                each.timestamp,
+                each.last_seen,
+                json.dumps(each.dict()),
+            )
+            for each in alarms
+        ]
+        if rows:
+            with self._lock, self._db:
+                self._db.executemany(UPSERT, rows)
+
+        if time.monotonic() - self.compacted_at > self.compact_interval:
+            self.compact()
+
+        return len(rows)
+
+    def query(
+        self,
+        site_id: Optional[str] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        types: Iterable[str] = (),
+        severities: Iterable[str] = (),
+        limit: Optional[int] = DEFAULT_QUERY_LIMIT,
+    ) -> SiteAlerts:
+        """Return the stored alarms matching every filter given, newest first.
+
+        At most `limit` alarms are returned (None for all of them); `total`
+        still counts every match.
+        """
+
+        clauses, params = [], []
+        if site_id is not None:
+            clauses.append("site_id = ?")
+            params.append(site_id)
+        for column, values in (("type", list(types)), ("severity", list(severities))):
+            if values:
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        sql = f"SELECT payload FROM alarms{where} ORDER BY timestamp DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+
+        with self._lock:
+            rows = self._db.execute(
+                sql, params if limit is None else params + [limit]
+            ).fetchall()
+            total = len(rows)
+            if limit is not None and total == limit:
+                total = self._db.execute(
+                    f"SELECT COUNT(*) FROM alarms{where}", params
+                ).fetchone()[0]
+
+        site_alerts = SiteAlerts.from_records(json.loads(row[0]) for row in rows)
+        site_alerts.start, site_alerts.end = since, until
+        site_alerts.limit, site_alerts.total = limit, total
+
+        return site_alerts
+
+    def count(self) -> int:
+        """Number of alarms held."""
+
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM alarms").fetchone()[0]
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """Drop alarms past retention and release their pages; returns rows dropped."""
+
+        cutoff = int(time.time() if now is None else now) - self.retention
+        with self._lock, self._db:
+            dropped = self._db.execute(
+                "DELETE FROM alarms WHERE timestamp < ?", (cutoff,)
+            ).rowcount
+        with self._lock:
+            self._db.execute("PRAGMA incremental_vacuum")
+        self.compacted_at = time.monotonic()
+
+        if dropped:
+            logger.info("alarm store: dropped %s alarms past retention", dropped)
+
+        return dropped
+
+    def close(self):
+        """Close the database."""
+        self._db.close()
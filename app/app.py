@@ -1,8 +1,8 @@
 """Slackbot for Juniper Mist."""
 
 # standard library
-import os
 import json
+import os
 import logging
 import time
 
@@ -10,12 +10,49 @@ import time
 # third party
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
-from slack_sdk.errors import SlackApiError
 from dotenv import load_dotenv
 
 
 # local
-from mist_helper import MarvisIssues, MistApi, SiteAlerts
+from alarm_poller import AlarmPoller
+from alarm_store import AlarmStore
+from mist_helper import MIST_ERRORS, MarvisIssues, OrgAlerts, SiteAlerts
+from mist_metrics import serve_metrics
+from mist_orgs import OrgRegistry, load_org_configs
+from mist_ratelimit import BACKGROUND, INTERACTIVE
+from mist_shared import Lease, default_backend, shared_cache_backend
+from mist_stream import (
+    DEFAULT_STREAM_CHANNELS,
+    DEFAULT_STREAM_URL,
+    MistStream,
+    site_alarm_channels,
+    stream_url,
+)
+from mist_webhook import DEFAULT_WEBHOOK_PORT, WebhookBatcher, WebhookServer
+from report_queue import (
+    ReportCancelled,
+    ReportQueue,
+    ReportQueueFull,
+    check_cancelled,
+    current_job,
+)
+from report_scheduler import (
+    DEFAULT_SCHEDULER_WORKERS,
+    ReportScheduler,
+    parse_interval,
+)
+from site_index import slack_options, start_refresher
+from slack_delivery import SlackDelivery, SlackOutbox, SlackPacer
+from views import (
+    ALARM_TYPES,
+    ALARM_WINDOWS,
+    LIVE_WINDOW,
+    UNMAPPED_CHANNEL,
+    automated_reports_menu_view,
+    cancel_report_actions,
+    site_alerts_form_view,
+    task_menu_view,
+)
 
 # -----------------------------------------------------------------------------
 # Load environment variables as new objects for our script
@@ -23,13 +60,79 @@ from mist_helper import MarvisIssues, MistApi, SiteAlerts
 load_dotenv()
 
 # Registers our environment variables as new objects
-api_token = os.environ.get("MIST_API_TOKEN")
-org_id = os.environ.get("MIST_ORG_ID")
 slack_channel = os.environ.get("SLACK_CHANNEL")
+sweep_concurrency = int(os.environ.get("MIST_SWEEP_CONCURRENCY", "10"))
+stream_alarms = os.environ.get("MIST_STREAM", "false").lower() in ("1", "true", "yes")
+digest_reports = [
+    each for each in os.environ.get("MIST_DIGEST_REPORTS", "").split(",") if each
+]
 
 # create an instance of our logging object
 logger = logging.getLogger(__name__)
 
+# every Mist org we serve, each with its own client pool, rate-limit budget,
+# cache namespace, report workers, site index and Marvis trends
+orgs = OrgRegistry(load_org_configs(), slack_channel)
+
+# every outbound Slack call is paced per method tier and retried on 429; the
+# tiers are Slack's limits for the whole app, so the pacer is shared, but its
+# chat.postMessage slots are per channel and orgs do not share channels
+slack_pacer = SlackPacer()
+delivery = SlackDelivery(slack_pacer)
+
+# each org posts through its own outbox so a burst of one org's reports
+# never holds up another's
+slack_outboxes = {
+    org.name: SlackOutbox(delivery, name=f"slack-outbox-{org.name}") for org in orgs
+}
+
+# automated reports are rendered on a schedule and served warm, on workers of
+# their own per org; with several replicas only the lease holder renders them
+# and the others share its output
+schedulers = {
+    org.name: ReportScheduler(
+        queue=ReportQueue(
+            workers=DEFAULT_SCHEDULER_WORKERS, name=f"scheduled-{org.name}"
+        ),
+        lease=Lease(default_backend, f"{org.name}:scheduler"),
+        shared=shared_cache_backend,
+    )
+    for org in orgs
+}
+
+# every alarm the bot fetches is kept here for historical queries
+alarm_store = AlarmStore()
+
+# pushes alarms raised since its last poll, on a background thread per org
+alarm_pollers = {
+    org.name: AlarmPoller(
+        org.mist,
+        org.org_id,
+        lambda org_alerts, org=org: push_new_alarms(org_alerts, app.client, org),
+        site_names=lambda org=org: dict(org.site_index.sites),
+        store=alarm_store,
+        lease=Lease(default_backend, f"{org.name}:poller"),
+    )
+    for org in orgs
+}
+
+
+def org_stream(org):
+    """With MIST_STREAM, alarms arrive over the Mist WebSocket as they are raised."""
+
+    return MistStream(
+        DEFAULT_STREAM_URL or stream_url(org.mist.baseurl),
+        org.config.api_token,
+        lambda: [
+            channel.format(org_id=org.org_id)
+            for channel in DEFAULT_STREAM_CHANNELS.split(",")
+            if channel
+        ]
+        or site_alarm_channels(org.site_index.sites),
+        lambda alarms: ingest_alarms(alarms, app.client),
+        lease=Lease(default_backend, f"{org.name}:stream"),
+    )
+
 
 # -----------------------------------------------------------------------------
 # Initialize app with bot token and socket mode handler
@@ -46,6 +149,14 @@ def handle_message_events(body, logger):
     logger.info(body)
 
 
+# -----------------------------------------------------------------------------
+# Route each request to the Mist org of the channel it came from
+# -----------------------------------------------------------------------------
+def org_for(body):
+    """Find the org of a slash command (by channel) or of a modal interaction."""
+    return orgs.for_request(body)
+
+
 # -----------------------------------------------------------------------------
 # Present the user with our modal when /mist is executed
 # -----------------------------------------------------------------------------
@@ -53,6 +164,12 @@ def handle_message_events(body, logger):
 def open_modal(ack, body, client):
     """Create a view and present it to the user."""
 
+    org = org_for(body)
+    if org is None:
+        # only the user who ran the command sees this
+        ack(UNMAPPED_CHANNEL)
+        return
+
     # Acknowledge the slash command request
     ack()
 
@@ -63,61 +180,9 @@ def open_modal(ack, body, client):
     client.views_open(
         # Pass a valid trigger_id within 3 seconds of receiving it
         trigger_id=body["trigger_id"],
-        view={
-            "type": "modal",
-            # View identifier
-            "callback_id": "task-menu",
-            "title": {
-                "type": "plain_text",
-                "text": "Juniper Mist Slack bot",
-                "emoji": True,
-            },
-            # "submit": {"type": "plain_text", "text": "Submit", "emoji": True},
-            "close": {"type": "plain_text", "text": "Cancel", "emoji": True},
-            "blocks": [
-                {
-                    "type": "image",
-                    "image_url": logo,
-                    "alt_text": "Juniper Mist Slack bot",
-                },
-                {"type": "divider"},
-                {
-                    "type": "header",
-                    "text": {
-                        "type": "plain_text",
-                        "text": "Please select a task",
-                        "emoji": True,
-                    },
-                },
-                {"type": "divider"},
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "plain_text",
-                        "text": "Retrieve site alerts",
-                        "emoji": True,
-                    },
-                    "accessory": {
-                        "type": "button",
-                        "text": {"type": "plain_text", "text": "Click Here"},
-                        "action_id": "site_alerts",
-                    },
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "plain_text",
-                        "text": "Run Automated Reports",
-                        "emoji": True,
-                    },
-                    "accessory": {
-                        "type": "button",
-                        "text": {"type": "plain_text", "text": "Click Here"},
-                        "action_id": "automated_reports",
-                    },
-                },
-            ],
-        },
+        view=task_menu_view(
+            logo, org.mist.limiter.budget(), json.dumps({"org": org.name})
+        ),
     )
 
 
@@ -138,73 +203,25 @@ def site_alerts_view(ack, body, client):
             "hash"
         ],  # hash string that represents view state to protect against race conditions
         # View payload with updated blocks
-        view={
-            "type": "modal",
-            "callback_id": "site_alerts",  # View identifier
-            "private_metadata": json.dumps(body),
-            "title": {
-                "type": "plain_text",
-                "text": "Juniper Mist",
-                "emoji": True,
-            },
-            "blocks": [
-                {
-                    "type": "header",
-                    "text": {
-                        "type": "plain_text",
-                        "text": ":bar_chart:  Reports",
-                        "emoji": True,
-                    },
-                },
-                {
-                    "type": "context",
-                    "elements": [
-                        {
-                            "text": "Slack bot automation",
-                            "type": "mrkdwn",
-                        }
-                    ],
-                },
-                {
-                    "type": "divider",
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": " :spiral_note_pad: *List of sites*",
-                    },
-                },
-                {
-                    "type": "input",
-                    "block_id": "site_name",
-                    "element": {
-                        "type": "plain_text_input",
-                        "initial_value": "978c48e6-6ef6-11e6-8bbf-02e208b2d34f",
-                    },
-                    "label": {
-                        "type": "plain_text",
-                        "text": "Name of site",
-                        "emoji": True,
-                    },
-                },
-                {"type": "divider"},
-                {
-                    "type": "context",
-                    "elements": [
-                        {
-                            "type": "mrkdwn",
-                            "text": ":pushpin: Do you have something that you would like to see automated? Here's *how to submit a request*.",
-                        }
-                    ],
-                },
-            ],
-            "submit": {"type": "plain_text", "text": "Submit", "emoji": True},
-            "close": {"type": "plain_text", "text": "Cancel", "emoji": True},
-        },
+        view=site_alerts_form_view(body),
     )
 
 
+# -----------------------------------------------------------------------------
+# Typeahead suggestions for the site picker in the `site_alerts` view
+# -----------------------------------------------------------------------------
+@app.options("site_lookup")
+def site_lookup_options(ack, body):
+    """Answer the site picker from the in-memory index, never from Mist."""
+
+    org = org_for(body)
+    if org is None:
+        ack(options=[])
+        return
+
+    ack(options=slack_options(org.site_index.search(body.get("value", ""))))
+
+
 # -----------------------------------------------------------------------------
 # When `site_alerts_view` has been submitted with the input field
 # -----------------------------------------------------------------------------
@@ -219,36 +236,123 @@ def site_alerts_view(ack, body, logger, client):
     logger.info(body)
 
     # define input_site object based on the value passed in the form
-    input_site = body["view"]["state"]["values"]["site_name"]
+    values = body["view"]["state"]["values"]
+    input_site = values["site_name"]
     user = body["user"]["username"]
 
     for key, value in input_site.items():
         if key is None:
             pass
-        user_input = value["value"]
+        user_input = value["selected_option"]["value"]
 
+    window = (values.get("alarm_window", {}).get("alarm_window") or {}).get(
+        "selected_option"
+    ) or {"value": LIVE_WINDOW}
+    alarm_type = (values.get("alarm_type", {}).get("alarm_type") or {}).get(
+        "selected_option"
+    )
+
+    enqueue_report(
+        "site alerts",
+        body,
+        client,
+        site_alerts_report,
+        user_input,
+        user,
+        window["value"],
+        alarm_type and alarm_type["value"],
+    )
+
+
+def alarm_window_query():
+    """Build the alarm search query covering the last six hours."""
+
+    epoch_time = time.time()
+
+    # round the window up to the minute so near-simultaneous requests match
+    current_time = -(-int(epoch_time) // 60) * 60
+
+    return f"limit=100&start={current_time - 21600}&end={current_time}&severity=critical,warn,info"
+
+
+def site_alerts_report(
+    client, org, user_input, user, window=LIVE_WINDOW, alarm_type=None
+):
+    """Fetch and render the alerts of one site, then post them to Slack.
+
+    The live window comes from Mist (and is recorded in the alarm store);
+    longer windows are answered from the store without calling Mist.
+    """
+
+    mist = org.mist
     message = f"user_input:\n{user_input}\n\nuser:\n{user}"
+    label, seconds = ALARM_WINDOWS.get(window, ALARM_WINDOWS[LIVE_WINDOW])
+    types = [alarm_type] if alarm_type else []
+    if alarm_type:
+        label = f"{label} ({ALARM_TYPES.get(alarm_type, alarm_type)} only)"
+
+    if window == LIVE_WINDOW and not types:
+        if serve_warm(org, f"site_alerts:{user_input}", client):
+            return
+
+    if window != LIVE_WINDOW:
+        site_alerts = alarm_store.query(
+            user_input, since=int(time.time()) - seconds, types=types
+        )
+        slack_message(
+            mist.template(site_alerts, "site_alerts.j2", window=label), client, org
+        )
+        return
 
-    try:
-        epoch_time = time.time()
-        current_time = int(epoch_time)
+    report = start_report(client, org, f"_Fetching the alerts of site {user_input}..._")
 
-        # ask Marvis for a list of issues in our organization
-        query = f"limit=100&start={current_time - 21600}&end={current_time}&severity=critical,warn,info"
-        mist_request = MistApi(
-            api_token=api_token, path=f"sites/{user_input}/alarms/search?{query}"
+    def show_page(site_alerts):
+        """Show the alerts parsed so far while further pages load."""
+        if report.due():
+            partial = mist.template(site_alerts, "site_alerts.j2", window=label)
+            report.update(report_text(f"{partial}\n_Loading more alerts..._"))
+
+    def fetch(path):
+        """Parse page by page while the next one is fetched in the background."""
+        site_alerts = SiteAlerts.from_pages(
+            mist.paginate(path, prefetch=True), progress=show_page
         )
-        alerts = mist_request.get()
+        alarm_store.record(site_alerts.results)
+        return site_alerts
+
+    try:
+        # ask Marvis for a list of issues in our organization
+        path = f"sites/{user_input}/alarms/search?{alarm_window_query()}"
+
+        # share the result with anyone requesting the same site meanwhile;
+        # cancellation is checked around the shared fetch, never inside it,
+        # so cancelling one report does not abort the others waiting on it
+        check_cancelled()
+        site_alerts = mist.coalesce(path, lambda: fetch(path))
+        check_cancelled()
+        if types:
+            matching = SiteAlerts(results=[])
+            matching.results.extend(
+                each for each in site_alerts.results if each.type in types
+            )
+            site_alerts = matching
+
+        message = mist.template(site_alerts, "site_alerts.j2", window=label)
 
-        site_alerts = SiteAlerts(**alerts)
+    except ReportCancelled:
+        report.finish(report_text("_Report cancelled._"))
+        raise
 
-        message = mist_request.template(site_alerts, "site_alerts.j2")
+    except MIST_ERRORS as error:
+        logger.error(error)
+        message = f"Mist could not be reached for site {user_input}: {error}"
 
-    except AssertionError as msg:
-        print(msg)
+    except Exception as error:  # pylint: disable=broad-except
+        logger.exception("site alerts report of %s failed", user_input)
+        message = f"The alerts report of site {user_input} failed: {error}"
 
-    # send message to slack
-    slack_message(message, client)
+    # replace the placeholder with the full report
+    report.finish(report_text(message))
 
 
 # -----------------------------------------------------------------------------
@@ -268,99 +372,7 @@ def automated_reports_view(ack, body, client):
             "hash"
         ],  # hash string that represents view state to protect against race conditions
         # View payload with updated blocks
-        view={
-            "type": "modal",
-            "callback_id": "automated_reports_view",  # View identifier
-            "private_metadata": json.dumps(body),
-            "title": {
-                "type": "plain_text",
-                "text": "Juniper Mist",
-                "emoji": True,
-            },
-            "blocks": [
-                {
-                    "type": "header",
-                    "text": {
-                        "type": "plain_text",
-                        "text": ":bar_chart:  Reports",
-                        "emoji": True,
-                    },
-                },
-                {
-                    "type": "context",
-                    "elements": [
-                        {
-                            "text": "Slack bot automation",
-                            "type": "mrkdwn",
-                        }
-                    ],
-                },
-                {
-                    "type": "divider",
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": " :spiral_note_pad: *List of sites*",
-                    },
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": "Retrieve a list of sites within an organization.",
-                    },
-                    "accessory": {
-                        "type": "button",
-                        "text": {
-                            "type": "plain_text",
-                            "text": "Create Report",
-                            "emoji": True,
-                        },
-                        "action_id": "list_of_sites",
-                    },
-                },
-                {
-                    "type": "divider",
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": " :robot_face: *Marvis Issues*",
-                    },
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": "Retrieve a list of issues reported by Marvis.",
-                    },
-                    "accessory": {
-                        "type": "button",
-                        "text": {
-                            "type": "plain_text",
-                            "text": "Create Report",
-                            "emoji": True,
-                        },
-                        "action_id": "marvis_issues",
-                    },
-                },
-                {"type": "divider"},
-                {
-                    "type": "context",
-                    "elements": [
-                        {
-                            "type": "mrkdwn",
-                            "text": ":pushpin: Do you have something that you would like to see automated? Here's *how to submit a request*.",
-                        }
-                    ],
-                },
-            ],
-            # "submit": {"type": "plain_text", "text": "Submit", "emoji": True},
-            "close": {"type": "plain_text", "text": "Close Window", "emoji": True},
-        },
+        view=automated_reports_menu_view(body),
     )
 
 
@@ -368,71 +380,435 @@ def automated_reports_view(ack, body, client):
 # When `list_of_sites` button is clicked in the `automated_reports_view` view
 # -----------------------------------------------------------------------------
 @app.action("list_of_sites")
-def list_of_sites_action(ack, logger, client):
+def list_of_sites_action(ack, body, logger, client):
     """Actions to take after submission of site report form."""
 
     # Acknowledge the slash command request
     ack(response_action="clear")
 
+    enqueue_report("list of sites", body, client, list_of_sites_report)
+
+
+def list_of_sites_message(org, priority=INTERACTIVE):
+    """Fetch and render the sites of an organization."""
+
+    sites = org.mist.list_sites(org.org_id, priority=priority)
+
+    return org.mist.template(sites, "list_of_sites.j2")
+
+
+def list_of_sites_report(client, org):
+    """Post the sites of an organization to Slack, warm if we have them."""
+
+    if serve_warm(org, "list_of_sites", client):
+        return
+
+    report = start_report(client, org, "_Fetching the sites of the organization..._")
+
     try:
-        mist_request = MistApi(api_token=api_token, path=f"orgs/{org_id}/sites")
-        sites = mist_request.get()
-        message = mist_request.template(sites, "list_of_sites.j2")
+        message = list_of_sites_message(org)
+        check_cancelled()
+
+        # replace the placeholder with the full report
+        report.finish(report_text(message))
 
-        # send message to slack
-        slack_message(message, client)
+    except ReportCancelled:
+        report.finish(report_text("_Report cancelled._"))
+        raise
 
-    except AssertionError as msg:
-        print(msg)
+    except MIST_ERRORS as error:
+        logger.error(error)
+        report.finish(report_text(f"Mist could not be reached: {error}"))
+
+    except Exception as error:  # pylint: disable=broad-except
+        logger.exception("sites report of %s failed", org.name)
+        report.finish(report_text(f"The sites report failed: {error}"))
 
 
 # -----------------------------------------------------------------------------
 # When `marvis_issues` button is clicked in the `automated_reports_view` view
 # -----------------------------------------------------------------------------
 @app.action("marvis_issues")
-def marvis_issues_action(ack, logger, client):
+def marvis_issues_action(ack, body, logger, client):
     """Actions to take after submission of site report form."""
 
     # Acknowledge the slash command request
     ack(response_action="clear")
 
+    enqueue_report("marvis issues", body, client, marvis_issues_report)
+
+
+def marvis_issues_message(org, priority=INTERACTIVE):
+    """Fetch and render the Marvis issues of an organization."""
+
+    mist = org.mist
+
+    # ask Marvis for a list of issues in our organization
+    query = "query=group_by_category_symptom&display_priority=high&active=true"
+    path = f"labs/orgs/{org.org_id}/suggestions?{query}"
+    marvis_issues = mist.coalesce(
+        path, lambda: sample_marvis(org, mist.get(path, priority=priority))
+    )
+
+    return mist.template(marvis_issues, "marvis_issues.j2", trends=org.marvis_trends)
+
+
+def sample_marvis(org, response):
+    """Parse a suggestions response and record it in the org's Marvis trends."""
+
+    marvis_issues = MarvisIssues.from_response(response)
+    org.marvis_trends.sample(marvis_issues)
+
+    return marvis_issues
+
+
+def marvis_issues_report(client, org):
+    """Post the Marvis issues of an organization, warm if we have them."""
+
+    if serve_warm(org, "marvis_issues", client):
+        return
+
+    report = start_report(
+        client, org, "_Asking Marvis for the issues of the organization..._"
+    )
+
     try:
-        # ask Marvis for a list of issues in our organization
-        query = "query=group_by_category_symptom&display_priority=high&active=true"
-        mist_request = MistApi(
-            api_token=api_token, path=f"labs/orgs/{org_id}/suggestions?{query}"
+        message = marvis_issues_message(org)
+        check_cancelled()
+
+        # replace the placeholder with the full report
+        report.finish(report_text(message))
+
+    except ReportCancelled:
+        report.finish(report_text("_Report cancelled._"))
+        raise
+
+    except MIST_ERRORS as error:
+        logger.error(error)
+        report.finish(report_text(f"Mist could not be reached: {error}"))
+
+    except Exception as error:  # pylint: disable=broad-except
+        logger.exception("Marvis issues report of %s failed", org.name)
+        report.finish(report_text(f"The Marvis issues report failed: {error}"))
+
+
+# -----------------------------------------------------------------------------
+# When `org_alerts` button is clicked in the `automated_reports_view` view
+# -----------------------------------------------------------------------------
+@app.action("org_alerts")
+def org_alerts_action(ack, body, logger, client):
+    """Actions to take after requesting the alerts of every site."""
+
+    # Acknowledge the slash command request
+    ack(response_action="clear")
+
+    enqueue_report("all sites alerts", body, client, org_alerts_report)
+
+
+def org_alerts_report(client, org):
+    """Sweep the alarms of every site concurrently and post one merged report."""
+
+    mist = org.mist
+    report = start_report(client, org, "_Sweeping the alerts of every site..._")
+
+    def show_sites(org_alerts, done, total):
+        """Show the alerts of the sites swept so far."""
+        if report.due():
+            partial = mist.template(org_alerts, "org_alerts.j2")
+            report.update(
+                report_text(f"{partial}\n_{done} of {total} sites checked..._")
+            )
+
+    try:
+        check_cancelled()
+        org_alerts = mist.coalesce(
+            f"org_alerts/{org.org_id}",
+            lambda: record_org_alerts(
+                mist.sweep_alarms(
+                    org.org_id,
+                    alarm_window_query(),
+                    min(sweep_concurrency, org.config.pool_maxsize),
+                    progress=show_sites,
+                )
+            ),
         )
-        issues = mist_request.get()
-        marvis_issues = MarvisIssues(**issues["data"])
-        message = mist_request.template(marvis_issues, "marvis_issues.j2")
+        check_cancelled()
+        message = mist.template(org_alerts, "org_alerts.j2")
+
+        # replace the placeholder with the full report
+        report.finish(report_text(message))
+
+    except ReportCancelled:
+        report.finish(report_text("_Report cancelled._"))
+        raise
+
+    except MIST_ERRORS as error:
+        logger.error(error)
+        report.finish(report_text(f"Mist could not be reached: {error}"))
 
-        # send message to slack
-        slack_message(message, client)
+    except Exception as error:  # pylint: disable=broad-except
+        logger.exception("all sites alerts report of %s failed", org.name)
+        report.finish(report_text(f"The all sites alerts report failed: {error}"))
 
-    except AssertionError as msg:
-        print(msg)
+
+def record_org_alerts(org_alerts):
+    """Keep the alarms of a sweep in the alarm store."""
+
+    alarm_store.record(
+        each
+        for by_site in org_alerts.severities.values()
+        for alerts in by_site.values()
+        for each in alerts
+    )
+
+    return org_alerts
+
+
+# -----------------------------------------------------------------------------
+# Reports kept warm by the scheduler
+# -----------------------------------------------------------------------------
+def site_alerts_message(org, site_id):
+    """Fetch and render the live alerts of one site in the background."""
+
+    path = f"sites/{site_id}/alarms/search?{alarm_window_query()}"
+    site_alerts = SiteAlerts.from_pages(
+        org.mist.paginate(path, prefetch=True, priority=BACKGROUND)
+    )
+    alarm_store.record(site_alerts.results)
+
+    return org.mist.template(site_alerts, "site_alerts.j2")
+
+
+def serve_warm(org, name, client):
+    """Post the prepared result of an org's scheduled job; False if there is none."""
+
+    warm = schedulers[org.name].warm(f"{org.name}:{name}")
+    if warm is None:
+        return False
+
+    message, age = warm
+    slack_message(f"{message}\n_Prepared {int(age // 60)} min ago._", client, org)
+
+    return True
+
+
+def digest_message(org):
+    """Gather the warm results of an org's MIST_DIGEST_REPORTS jobs."""
+
+    parts = []
+    for name in digest_reports:
+        warm = schedulers[org.name].warm(f"{org.name}:{name}")
+        job = schedulers[org.name].jobs.get(f"{org.name}:{name}")
+        if warm is None and job is not None:
+            warm = job.render(), 0
+        if warm is not None:
+            parts.append(warm[0])
+
+    return "\n\n".join(parts)
+
+
+def schedule_reports(client, org):
+    """Register an org's automated reports, plus its optional channel digest."""
+
+    jobs = [
+        (
+            "list_of_sites",
+            lambda: list_of_sites_message(org, BACKGROUND),
+            os.environ.get("MIST_SCHEDULE_LIST_OF_SITES", "15m"),
+        ),
+        (
+            "marvis_issues",
+            lambda: marvis_issues_message(org, BACKGROUND),
+            os.environ.get("MIST_SCHEDULE_MARVIS_ISSUES", "15m"),
+        ),
+    ] + [
+        (
+            f"site_alerts:{site_id}",
+            lambda site_id=site_id: site_alerts_message(org, site_id),
+            os.environ.get("MIST_SCHEDULE_SITE_ALERTS", "5m"),
+        )
+        for site_id in org.config.schedule_sites
+    ]
+
+    scheduler = schedulers[org.name]
+    for name, render, interval in jobs:
+        scheduler.add(f"{org.name}:{name}", render, parse_interval(interval))
+
+    if digest_reports:
+        scheduler.add(
+            f"{org.name}:digest",
+            lambda: digest_message(org),
+            parse_interval(os.environ.get("MIST_DIGEST_INTERVAL", "1d")),
+            lambda message: message and slack_message(message, client, org),
+        )
+
+
+# -----------------------------------------------------------------------------
+# Hand reports to the worker pool so listeners return straight after ack()
+# -----------------------------------------------------------------------------
+def enqueue_report(name, body, client, report, *args):
+    """Queue `report(client, org, *args)` on the workers of the request's org
+    and tell the user if they have to wait."""
+
+    org = org_for(body)
+    user_id = body["user"]["id"]
+    if org is None:
+        logger.warning("dropping %s report of an unmapped request", name)
+        return
+
+    try:
+        job = org.reports.submit(name, report, client, org, *args)
+    except ReportQueueFull:
+        notify_user(
+            f"Too many reports are running right now, please try your {name} report again in a minute.",
+            user_id,
+            client,
+            org,
+        )
+        return
+
+    if job.position:
+        message = f"Your {name} report is queued, position {job.position}."
+        notify_user(
+            message,
+            user_id,
+            client,
+            org,
+            blocks=[{"type": "section", "text": {"type": "mrkdwn", "text": message}}]
+            + cancel_report_actions(f"{org.name}:{job.id}"),
+        )
+
+
+def notify_user(message, user_id, client, org, blocks=None):
+    """Send a message only the requesting user can see."""
+
+    slack_pacer.call(
+        client,
+        "chat_postEphemeral",
+        channel=f"{org.channel}",
+        user=user_id,
+        text=message,
+        blocks=blocks,
+    )
+
+
+# -----------------------------------------------------------------------------
+# When the `cancel_report` button of a queued or running report is clicked
+# -----------------------------------------------------------------------------
+@app.action("cancel_report")
+def cancel_report_action(ack, body, client, respond):
+    """Cancel a report: queued ones never run, running ones stop at their next step."""
+
+    # Acknowledge the button click
+    ack()
+
+    name, job_id = body["actions"][0]["value"].rsplit(":", 1)
+    org = orgs.get(name)
+
+    if not org.reports.cancel(int(job_id)):
+        notify_user(
+            "That report has already finished.", body["user"]["id"], client, org
+        )
+    elif (body.get("container") or {}).get("is_ephemeral"):
+        # clear the queued notice; running reports say so in their placeholder
+        respond(text="_Report cancelled._", replace_original=True)
 
 
 # -----------------------------------------------------------------------------
 # Send message back to Slack channel
 # -----------------------------------------------------------------------------
-def slack_message(message, client):
-    """Send our message to Slack."""
+def report_text(message):
+    """Prefix a report the way every message of the bot is."""
+    return f"*Successfully requested a report*: \n{message}"
+
+
+def start_report(client, org, placeholder):
+    """Post a placeholder straight away and return it for progressive updates.
+
+    It bypasses the outbox batching since we need its ts to `chat_update`.
+    Reports run by the workers get a button to cancel them meanwhile.
+    """
+
+    job = current_job()
+    actions = None if job is None else cancel_report_actions(f"{org.name}:{job.id}")
+
+    return delivery.progressive(
+        client, f"{org.channel}", report_text(placeholder), actions=actions
+    )
+
+
+def slack_message(message, client, org):
+    """Send our message to the org's Slack channel.
+
+    Reports go through the outbox, which splits them into Block Kit
+    sections (threading any overflow), paces chat.postMessage and merges
+    bursts of small reports into one post.
+    """
 
     # ID of the channel you want to send the message to
-    channel_id = f"{slack_channel}"
-    try:
-        # Call the chat.postMessage method using the WebClient
-        result = client.chat_postMessage(
-            channel=channel_id,
-            text=f"*Successfully requested a report*: \n{message}",
+    channel_id = f"{org.channel}"
+    slack_outboxes[org.name].submit(client, channel_id, report_text(message))
+
+
+def push_new_alarms(org_alerts, client, org):
+    """Post alarms the poller has not seen before to the org's channel."""
+
+    message = org.mist.template(org_alerts, "new_alarms.j2")
+    slack_outboxes[org.name].submit(client, f"{org.channel}", message)
+
+
+def ingest_alarms(alarms, client):
+    """Record streamed alarms and push those severe enough to their org's channel.
+
+    Alarms of orgs we are not configured for are dropped, never routed to
+    the default org.
+    """
+
+    by_org, known, unknown = {}, [], set()
+    for each in alarms:
+        org = orgs.for_org_id(each.org_id)
+        if org is None:
+            unknown.add(each.org_id)
+            continue
+        known.append(each)
+        if each.severity in alarm_pollers[org.name].severities:
+            by_org.setdefault(org.name, []).append(each)
+
+    if unknown:
+        logger.warning(
+            "dropping %s alarms of unconfigured Mist orgs %s",
+            len(alarms) - len(known),
+            ", ".join(sorted(map(str, unknown))),
         )
-        logger.info(result)
+    alarm_store.record(known)
 
-    except SlackApiError as error_message:
-        logger.error(error_message)
+    for name, wanted in by_org.items():
+        org = orgs.get(name)
+        push_new_alarms(
+            OrgAlerts.from_alarms(wanted, dict(org.site_index.sites)), client, org
+        )
 
 
 # Start your app
 if __name__ == "__main__":
+    for each_org in orgs:
+        start_refresher(
+            each_org.site_index,
+            lambda org=each_org: org.mist.list_sites(org.org_id, priority=BACKGROUND),
+        )
+        schedule_reports(app.client, each_org)
+        schedulers[each_org.name].start()
+        # the stream and webhooks replace polling; running both would post
+        # every alarm twice
+        if stream_alarms:
+            org_stream(each_org).start()
+        elif not DEFAULT_WEBHOOK_PORT and alarm_pollers[each_org.name].interval > 0:
+            alarm_pollers[each_org.name].start()
+    if DEFAULT_WEBHOOK_PORT:
+        # Mist webhooks, batched so alarm storms become a few posts
+        WebhookServer(
+            WebhookBatcher(lambda alarms: ingest_alarms(alarms, app.client))
+        ).start()
+    # Prometheus scrapes /metrics next to the Socket Mode connection
+    serve_metrics()
     SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"]).start()
@@ -0,0 +1,317 @@
+"""Asyncio Slackbot for Juniper Mist.
+
+Same handlers as `app.py`, running on `AsyncApp` and the asyncio Socket Mode
+handler so Mist I/O never blocks a Bolt worker thread.
+"""
+
+# standard library
+import asyncio
+import json
+import logging
+import os
+import time
+
+
+# third party
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from dotenv import load_dotenv
+
+
+# local
+from mist_async import ASYNC_MIST_ERRORS
+from mist_helper import MarvisIssues, SiteAlerts
+from mist_metrics import serve_metrics
+from mist_orgs import OrgRegistry, load_org_configs
+from site_index import slack_options
+from slack_delivery import SlackDelivery
+from views import (
+    ALARM_TYPES,
+    ALARM_WINDOWS,
+    LIVE_WINDOW,
+    UNMAPPED_CHANNEL,
+    automated_reports_menu_view,
+    site_alerts_form_view,
+    task_menu_view,
+)
+
+# -----------------------------------------------------------------------------
+# Load environment variables as new objects for our script
+# -----------------------------------------------------------------------------
+load_dotenv()
+
+# Registers our environment variables as new objects
+slack_channel = os.environ.get("SLACK_CHANNEL")
+sweep_concurrency = int(os.environ.get("MIST_SWEEP_CONCURRENCY", "10"))
+
+# create an instance of our logging object
+logger = logging.getLogger(__name__)
+
+# the same orgs and channel routing as the sync app; each org has its own
+# async Mist client (one aiohttp connector each) and site index
+orgs = OrgRegistry(load_org_configs(), slack_channel)
+
+# running site index refreshes, at most one per org
+site_refreshes = {}
+
+# reports are split into Block Kit sections and paced per Slack method tier,
+# as the sync app's are
+delivery = SlackDelivery()
+
+
+# -----------------------------------------------------------------------------
+# Initialize app with bot token
+# -----------------------------------------------------------------------------
+app = AsyncApp(token=os.environ.get("SLACK_BOT_TOKEN"))
+
+
+@app.event("message")
+async def handle_message_events(body, logger):
+    """When a message is recorded, send it to our logging object."""
+    logger.info(body)
+
+
+@app.command("/mist")
+async def open_modal(ack, body, client):
+    """Create a view and present it to the user."""
+
+    org = orgs.for_request(body)
+    if org is None:
+        await ack(UNMAPPED_CHANNEL)
+        return
+
+    await ack()
+
+    logo = "https://raw.githubusercontent.com/cdot65/svg-locker-shhhhh/master/slack-modal.png"
+
+    await client.views_open(
+        trigger_id=body["trigger_id"],
+        view=task_menu_view(
+            logo, org.mist.limiter.budget(), json.dumps({"org": org.name})
+        ),
+    )
+
+
+@app.action("site_alerts")
+async def site_alerts_view(ack, body, client):
+    """Update the view when Site Alerts has been selected."""
+
+    await ack(response_action="clear")
+
+    await client.views_update(
+        view_id=body["view"]["id"],
+        hash=body["view"]["hash"],
+        view=site_alerts_form_view(body),
+    )
+
+
+@app.options("site_lookup")
+async def site_lookup_options(ack, body):
+    """Answer the site picker from the in-memory index, never from Mist.
+
+    A stale index is still served, within Slack's 3 second deadline, while
+    it refreshes in the background.
+    """
+
+    org = orgs.for_request(body)
+    if org is None:
+        await ack(options=[])
+        return
+
+    if org.site_index.is_stale():
+        refresh_site_index(org)
+
+    await ack(options=slack_options(org.site_index.search(body.get("value", ""))))
+
+
+def refresh_site_index(org):
+    """Reload an org's site index in a background task, unless one is running."""
+
+    running = site_refreshes.get(org.name)
+    if running is not None and not running.done():
+        return running
+
+    async def refresh():
+        try:
+            org.site_index.update(await org.async_mist.list_sites(org.org_id))
+        except ASYNC_MIST_ERRORS as error:
+            logger.warning("site index refresh failed: %s", error)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("site index refresh failed")
+
+    site_refreshes[org.name] = asyncio.ensure_future(refresh())
+
+    return site_refreshes[org.name]
+
+
+@app.view("site_alerts")
+async def site_alerts_submission(ack, body, logger, client):
+    """Handle the submission of our site's name."""
+
+    await ack(response_action="clear")
+
+    logger.info(body)
+
+    org = orgs.for_request(body)
+    if org is None:
+        return
+    mist = org.async_mist
+
+    values = body["view"]["state"]["values"]
+    input_site = values["site_name"]
+    user = body["user"]["username"]
+
+    for value in input_site.values():
+        user_input = value["selected_option"]["value"]
+
+    # without the alarm store, every window is asked of Mist directly
+    window = (values.get("alarm_window", {}).get("alarm_window") or {}).get(
+        "selected_option"
+    ) or {"value": LIVE_WINDOW}
+    alarm_type = (values.get("alarm_type", {}).get("alarm_type") or {}).get(
+        "selected_option"
+    )
+    label, seconds = ALARM_WINDOWS.get(window["value"], ALARM_WINDOWS[LIVE_WINDOW])
+    if alarm_type:
+        label = f"{label} ({ALARM_TYPES.get(alarm_type['value'], alarm_type['value'])} only)"
+
+    message = f"user_input:\n{user_input}\n\nuser:\n{user}"
+
+    try:
+        site_alerts = await mist.site_alarms(user_input, alarm_window_query(seconds))
+        if alarm_type:
+            matching = SiteAlerts(results=[])
+            matching.results.extend(
+                each for each in site_alerts.results if each.type == alarm_type["value"]
+            )
+            site_alerts = matching
+
+        message = mist.template(site_alerts, "site_alerts.j2", window=label)
+
+    except ASYNC_MIST_ERRORS as error:
+        logger.error(error)
+        message = f"Mist could not be reached for site {user_input}: {error}"
+
+    await slack_message(message, client, org)
+
+
+@app.action("automated_reports")
+async def automated_reports_view(ack, body, client):
+    """Update the view when Automated Reports has been selected."""
+
+    await ack(response_action="clear")
+
+    await client.views_update(
+        view_id=body["view"]["id"],
+        hash=body["view"]["hash"],
+        view=automated_reports_menu_view(body),
+    )
+
+
+@app.action("list_of_sites")
+async def list_of_sites_action(ack, body, logger, client):
+    """Actions to take after submission of site report form."""
+
+    await ack(response_action="clear")
+
+    org = orgs.for_request(body)
+    if org is None:
+        return
+
+    try:
+        sites = await org.async_mist.list_sites(org.org_id)
+        message = org.async_mist.template(sites, "list_of_sites.j2")
+
+    except ASYNC_MIST_ERRORS as error:
+        logger.error(error)
+        message = f"Mist could not be reached: {error}"
+
+    await slack_message(message, client, org)
+
+
+@app.action("marvis_issues")
+async def marvis_issues_action(ack, body, logger, client):
+    """Actions to take after submission of site report form."""
+
+    await ack(response_action="clear")
+
+    org = orgs.for_request(body)
+    if org is None:
+        return
+    mist = org.async_mist
+
+    try:
+        query = "query=group_by_category_symptom&display_priority=high&active=true"
+        issues = await mist.get(f"labs/orgs/{org.org_id}/suggestions?{query}")
+        marvis_issues = MarvisIssues.from_response(issues)
+        message = mist.template(marvis_issues, "marvis_issues.j2")
+
+    except ASYNC_MIST_ERRORS as error:
+        logger.error(error)
+        message = f"Mist could not be reached: {error}"
+
+    await slack_message(message, client, org)
+
+
+@app.action("org_alerts")
+async def org_alerts_action(ack, body, logger, client):
+    """Sweep the alarms of every site concurrently and post one merged report."""
+
+    await ack(response_action="clear")
+
+    org = orgs.for_request(body)
+    if org is None:
+        return
+    mist = org.async_mist
+
+    try:
+        org_alerts = await mist.sweep_alarms(
+            org.org_id, alarm_window_query(), sweep_concurrency
+        )
+        message = mist.template(org_alerts, "org_alerts.j2")
+
+    except ASYNC_MIST_ERRORS as error:
+        logger.error(error)
+        message = f"Mist could not be reached: {error}"
+
+    await slack_message(message, client, org)
+
+
+def alarm_window_query(seconds=21600):
+    """Build the alarm search query covering the last `seconds`."""
+
+    current_time = int(time.time())
+
+    return f"limit=100&start={current_time - seconds}&end={current_time}&severity=critical,warn,info"
+
+
+# -----------------------------------------------------------------------------
+# Send message back to Slack channel
+# -----------------------------------------------------------------------------
+async def slack_message(message, client, org):
+    """Send our message to the org's Slack channel, threading whatever does not
+    fit in one post."""
+
+    await delivery.post_async(
+        client,
+        f"{org.channel}",
+        f"*Successfully requested a report*: \n{message}",
+    )
+
+
+async def main():
+    """Run the Socket Mode handler until cancelled, then release the connector."""
+
+    serve_metrics()
+    for org in orgs:
+        refresh_site_index(org)
+    try:
+        await AsyncSocketModeHandler(app, os.environ["SLACK_APP_TOKEN"]).start_async()
+    finally:
+        for org in orgs:
+            await org.async_mist.close()
+
+
+# Start your app
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,255 @@
+"""Compact time series of Marvis counters, with hourly and daily rollups."""
+
+# Standard library
+import os
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Local
+from mist_helper import MARVIS_CATEGORIES, MARVIS_SYMPTOMS, MarvisIssues
+
+
+# -----------------------------------------------------------------------------
+# Trend parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+# raw samples are at least 5 minutes apart, so 432 of them keep a day and a
+# half of history at the tightest and 4.5 days at the 15-minute Marvis schedule
+DEFAULT_SAMPLE_INTERVAL = float(os.environ.get("MIST_TREND_SAMPLE_INTERVAL", "300"))
+DEFAULT_RAW_SAMPLES = int(os.environ.get("MIST_TREND_RAW_SAMPLES", "432"))
+DEFAULT_HOURLY_SAMPLES = int(os.environ.get("MIST_TREND_HOURLY_SAMPLES", "336"))
+DEFAULT_DAILY_SAMPLES = int(os.environ.get("MIST_TREND_DAILY_SAMPLES", "90"))
+
+SPARK_BARS = "▁▂▃▄▅▆▇█"
+
+# every symptom counter plus a total per category
+TREND_KEYS = tuple(each.key for each in MARVIS_SYMPTOMS) + tuple(MARVIS_CATEGORIES)
+
+
+# -----------------------------------------------------------------------------
+# Ring buffer
+# -----------------------------------------------------------------------------
+class Ring:
+    """Fixed-size ring of timestamped rows, one `array('d')` per column.
+
+    Every column shares the timestamp ring, so a sample of all counters
+    costs one slot per array and no per-sample objects are kept.
+    """
+
+    def __init__(self, capacity: int, keys: Iterable[str]):
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.columns = {key: array("d", bytes(8 * capacity)) for key in keys}
+        self.size = 0
+        self._head = 0  # next slot to write
+
+    def append(self, timestamp: float, row: Dict[str, float]):
+        """Write one row, overwriting the oldest once full."""
+
+        slot = self._head
+        self.times[slot] = timestamp
+        for key, column in self.columns.items():
+            column[slot] = row.get(key, 0.0)
+
+        self._head = (slot + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def _slots(self) -> range:
+        """Slot indexes from oldest to newest."""
+        start = (self._head - self.size) % self.capacity
+        return range(start, start + self.size)
+
+    def series(self, key: str) -> List[Tuple[float, float]]:
+        """(timestamp, value) pairs of one column, oldest first."""
+
+        column = self.columns[key]
+        return [
+            (self.times[slot % self.capacity], column[slot % self.capacity])
+            for slot in self._slots()
+        ]
+
+    def at(self, key: str, timestamp: float) -> Optional[Tuple[float, float]]:
+        """Latest (timestamp, value) at or before `timestamp`, if any."""
+
+        found = None
+        for when, value in self.series(key):
+            if when > timestamp:
+                break
+            found = (when, value)
+
+        return found
+
+    def oldest(self) -> Optional[float]:
+        """Timestamp of the oldest row."""
+        return self.times[self._slots()[0] % self.capacity] if self.size else None
+
+    def latest(self) -> Optional[float]:
+        """Timestamp of the newest row."""
+        return self.times[(self._head - 1) % self.capacity] if self.size else None
+
+
+class Rollup:
+    """Averages rows into fixed `period` buckets before writing them to a ring."""
+
+    def __init__(self, period: float, capacity: int, keys: Iterable[str]):
+        self.period = period
+        self.ring = Ring(capacity, keys)
+        self._bucket: Optional[float] = None
+        self._sums = array("d", bytes(8 * len(self.ring.columns)))
+        self._samples = 0
+
+    def add(self, timestamp: float, row: Dict[str, float]):
+        """Account one sample, closing the bucket when it moves on."""
+
+        bucket = timestamp // self.period * self.period
+        if self._bucket is not None and bucket != self._bucket:
+            self.flush()
+        self._bucket = bucket
+
+        for index, key in enumerate(self.ring.columns):
+            self._sums[index] += row.get(key, 0.0)
+        self._samples += 1
+
+    def flush(self):
+        """Write the open bucket's averages to the ring."""
+
+        if not self._samples:
+            return
+
+        self.ring.append(
+            self._bucket,
+            {
+                key: self._sums[index] / self._samples
+                for index, key in enumerate(self.ring.columns)
+            },
+        )
+        self._sums = array("d", bytes(8 * len(self.ring.columns)))
+        self._samples = 0
+
+
+# -----------------------------------------------------------------------------
+# Marvis trends
+# -----------------------------------------------------------------------------
+def sparkline(values: List[float]) -> str:
+    """Render values as a row of block characters."""
+
+    if not values:
+        return ""
+
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARK_BARS[0] * len(values)
+
+    scale = (len(SPARK_BARS) - 1) / (high - low)
+    return "".join(SPARK_BARS[round((value - low) * scale)] for value in values)
+
+
+def ago(seconds: float) -> str:
+    """Say how long ago a reference point was, the way a report would."""
+
+    if seconds >= 86400 * 0.9 and seconds < 86400 * 1.5:
+        return "yesterday"
+    if seconds >= 86400:
+        return f"{round(seconds / 86400)}d ago"
+    if seconds >= 3600:
+        return f"{round(seconds / 3600)}h ago"
+
+    return f"{max(1, round(seconds / 60))}m ago"
+
+
+class MarvisTrends:
+    """Every Marvis counter sampled into raw, hourly and daily rings.
+
+    Samples ride along with the Marvis fetches the bot already makes, so
+    deltas and sparklines in the reports cost no extra Mist calls. Samples
+    closer than `interval` to the last one are dropped, so repeat clicks
+    served from the response cache do not skew the averages.
+    """
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_SAMPLE_INTERVAL,
+        raw_samples: int = DEFAULT_RAW_SAMPLES,
+        hourly_samples: int = DEFAULT_HOURLY_SAMPLES,
+        daily_samples: int = DEFAULT_DAILY_SAMPLES,
+    ):
+        self.interval = interval
+        self.raw = Ring(raw_samples, TREND_KEYS)
+        self.hourly = Rollup(3600, hourly_samples, TREND_KEYS)
+        self.daily = Rollup(86400, daily_samples, TREND_KEYS)
+        self._lock = threading.Lock()
+
+    def sample(self, marvis_issues: MarvisIssues, now: Optional[float] = None) -> bool:
+        """Record the counters of one Marvis snapshot, unless one was just taken."""
+
+        now = time.time() if now is None else now
+        row = {key: float(count) for key, count in marvis_issues.counts.items()}
+        for category in MARVIS_CATEGORIES:
+            row[category] = float(marvis_issues.category_total(category))
+
+        with self._lock:
+            latest = self.raw.latest()
+            if latest is not None and now - latest < self.interval:
+                return False
+
+            self.raw.append(now, row)
+            self.hourly.add(now, row)
+            self.daily.add(now, row)
+
+        return True
+
+    def _ring_covering(self, timestamp: float) -> Ring:
+        """Finest ring still holding data from `timestamp`."""
+
+        for ring in (self.raw, self.hourly.ring, self.daily.ring):
+            oldest = ring.oldest()
+            if oldest is not None and oldest <= timestamp:
+                return ring
+
+        return self.raw
+
+    def delta(
+        self, key: str, period: float = 86400, now: Optional[float] = None
+    ) -> Optional[Tuple[float, float, float]]:
+        """(current, previous, seconds between) comparing now with `period` ago.
+
+        Falls back to the oldest sample when history is shorter than
+        `period`; None until there are two samples.
+        """
+
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.raw.size < 2:
+                return None
+            current = self.raw.series(key)[-1]
+            ring = self._ring_covering(now - period)
+            previous = ring.at(key, now - period) or ring.series(key)[0]
+
+        if previous[0] >= current[0]:
+            return None
+
+        return current[1], previous[1], current[0] - previous[0]
+
+    def spark(self, key: str, points: int = 24) -> str:
+        """Sparkline of the last `points` hours (raw samples until then)."""
+
+        with self._lock:
+            ring = self.hourly.ring if self.hourly.ring.size >= 2 else self.raw
+            values = [value for _, value in ring.series(key)[-points:]]
+
+        return sparkline(values) if len(values) >= 2 else ""
+
+    def describe(self, key: str, period: float = 86400) -> str:
+        """Short trend note such as `▂▃▅█ +40% vs yesterday`, or ""."""
+
+        found = self.delta(key, period)
+        if found is None:
+            return ""
+
+        current, previous, elapsed = found
+        if not current and not previous:
+            return ""
+        change = f"{(current - previous) / previous:+.0%}" if previous else "new"
+
+        return f"{self.spark(key)} {change} vs {ago(elapsed)}".strip()
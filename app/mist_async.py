@@ -0,0 +1,263 @@
+"""Asyncio flavour of the Mist API helper."""
+
+# Standard library
+import asyncio
+import json
+import os
+import time
+from typing import Any, Optional
+
+# Third Party
+import aiohttp
+
+# Local
+from mist_endpoints import canonical_path, endpoint_template
+from mist_helper import SITES_PAGE_LIMIT, MistApi, OrgAlerts, SiteAlerts
+from mist_metrics import observe_mist
+from mist_ratelimit import INTERACTIVE, MistRateLimited, parse_retry_after
+from mist_resilience import CircuitOpen
+from mist_session import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+from mist_singleflight import AsyncSingleFlight
+
+
+# -----------------------------------------------------------------------------
+# Connector parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+DEFAULT_ASYNC_LIMIT = int(os.environ.get("MIST_ASYNC_LIMIT", "200"))
+DEFAULT_ASYNC_LIMIT_PER_HOST = int(os.environ.get("MIST_ASYNC_LIMIT_PER_HOST", "100"))
+
+# everything an async handler should expect from a Mist call that did not work out
+ASYNC_MIST_ERRORS = (
+    MistRateLimited,
+    CircuitOpen,
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+)
+
+
+# -----------------------------------------------------------------------------
+# Async Mist API helper object
+# -----------------------------------------------------------------------------
+class AsyncMistApi(MistApi):
+    """Non-blocking Mist API client sharing one aiohttp session per loop.
+
+    Mirrors `MistApi`: same URL building, headers, rate limiter, retries,
+    circuit breakers, response cache and coalescing of identical GETs, but
+    `get`/`put`/`post`/`delete` are coroutines, so a single event loop can
+    keep hundreds of Mist calls in flight.
+    """
+
+    limit: Optional[int] = DEFAULT_ASYNC_LIMIT
+    limit_per_host: Optional[int] = DEFAULT_ASYNC_LIMIT_PER_HOST
+    session: Optional[Any] = None
+
+    def __init__(self, **data: Any):
+        # the thread-based flight would block the event loop
+        if data.get("flight") is None:
+            data["flight"] = AsyncSingleFlight()
+        super().__init__(**data)
+
+    def _client_session(self):
+        """Return the aiohttp session, creating it inside the running loop."""
+
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host
+            )
+            timeout = aiohttp.ClientTimeout(
+                sock_connect=DEFAULT_CONNECT_TIMEOUT, sock_read=DEFAULT_READ_TIMEOUT
+            )
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+        return self.session
+
+    async def _request(
+        self, method, url, endpoint, headers, body, priority, expires=None
+    ):
+        """Make one rate-limited request, waiting out a single 429.
+
+        As in `MistApi._request`, the retry may wait up to `expires`. The
+        limiter blocks, so its token is taken on the default executor
+        rather than on the event loop.
+        """
+
+        loop = asyncio.get_running_loop()
+        max_wait = None
+        for _ in range(2):
+            await loop.run_in_executor(None, self.limiter.acquire, priority, max_wait)
+            with observe_mist(method, endpoint) as outcome:
+                async with self._client_session().request(
+                    method, url, headers=headers, data=body
+                ) as response:
+                    outcome["status"] = response.status
+                    if response.status != 429:
+                        response.raise_for_status()
+                        return await response.json(content_type=None)
+
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+
+            self.limiter.pause(60 if retry_after is None else retry_after)
+            if expires is not None:
+                max_wait = max(self.limiter.max_wait, expires - time.monotonic())
+
+        raise MistRateLimited(f"Mist API throttled {method} {url}")
+
+    async def send(
+        self, method, path, headers, data=None, priority=INTERACTIVE, deadline=None
+    ):
+        """Build the URL, handle the response of API calls.
+
+        As in `MistApi.send`: every call takes a limiter token, a 429 pauses
+        the limiter and is retried once, connection errors, timeouts and 5xx
+        answers to idempotent methods are retried with jittered backoff
+        until `deadline`, and the endpoint's circuit breaker records every
+        outcome.
+        """
+
+        url = self._path_strip(path)
+        body = json.dumps(data) if data is not None else None
+        endpoint = endpoint_template(path)
+
+        breaker = self.breakers.breaker(endpoint)
+        expires = time.monotonic() + (deadline or self.retry.deadline)
+        attempts = self.retry.attempts_for(method)
+
+        for attempt in range(1, attempts + 1):
+            breaker.before_call()
+            delay = self.retry.backoff(attempt)
+            give_up = attempt == attempts or time.monotonic() + delay >= expires
+
+            try:
+                result = await self._request(
+                    method, url, endpoint, headers, body, priority, expires
+                )
+            except aiohttp.ClientResponseError as error:
+                if error.status < 500:
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if give_up:
+                    raise
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                breaker.record_failure()
+                if give_up:
+                    raise
+            except BaseException:
+                # throttled, cancelled or undecodable: free the trial slot
+                breaker.abandon()
+                raise
+            else:
+                breaker.record_success()
+                return result
+
+            await asyncio.sleep(delay)
+
+    async def get(self, path=None, cache=True, priority=INTERACTIVE, deadline=None):
+        """HTTP GET method, defaulting to the path the client was built with.
+
+        As in `MistApi.get`, endpoints with a TTL are served from the
+        response cache unless `cache` is False, identical GETs already in
+        flight share that single upstream call, and `deadline` bounds the
+        retries.
+        """
+
+        path = path or self.path
+        key = f"{self._namespace()}{self.baseurl}/{canonical_path(path)}"
+
+        async def fetch():
+            return await self.flight.do(
+                key,
+                lambda: self.send(
+                    "GET", path, self.headers, priority=priority, deadline=deadline
+                ),
+            )
+
+        if not cache:
+            return await fetch()
+
+        return await self.cache.get_or_fetch_async(key, endpoint_template(path), fetch)
+
+    async def put(self, path, headers, data=None):
+        """HTTP PUT method."""
+        return await self.send("PUT", path, headers, data)
+
+    async def post(self, path, headers, data=None):
+        """HTTP POST method."""
+        return await self.send("POST", path, headers, data)
+
+    async def delete(self, path, headers, data=None):
+        """HTTP DELETE method."""
+        return await self.send("DELETE", path, headers, data)
+
+    async def list_sites(self, org_id):
+        """Every site of `org_id`, merged from all pages of the listing."""
+
+        path = f"orgs/{org_id}/sites?limit={SITES_PAGE_LIMIT}&page=1"
+
+        return [site async for page in self.paginate(path) for site in page]
+
+    async def paginate(self, path=None, prefetch=False):
+        """Lazily yield every page of a paginated GET, optionally prefetching."""
+
+        path = path or self.path
+        pending = asyncio.ensure_future(self.get(path))
+
+        try:
+            while pending is not None:
+                page = await pending
+                path = self._next_page_path(path, page)
+                pending = None
+                if path and prefetch:
+                    pending = asyncio.ensure_future(self.get(path))
+                yield page
+                if path and pending is None:
+                    pending = asyncio.ensure_future(self.get(path))
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def site_alarms(self, site_id, query):
+        """Every alarm of one site matching `query`, from all result pages."""
+
+        site_alerts = SiteAlerts(results=[])
+        async for page in self.paginate(
+            f"sites/{site_id}/alarms/search?{query}", prefetch=True
+        ):
+            site_alerts.extend(page)
+
+        return site_alerts
+
+    async def sweep_alarms(self, org_id, query, concurrency=None):
+        """Fetch the alarms of every site in `org_id`, `concurrency` at a time."""
+
+        sites = await self.list_sites(org_id)
+        org_alerts = OrgAlerts(sites={site["id"]: site.get("name") for site in sites})
+        slots = asyncio.Semaphore(concurrency or self.limit_per_host)
+
+        async def fetch(site_id):
+            async with slots:
+                return await self.site_alarms(site_id, query)
+
+        site_ids = list(org_alerts.sites)
+        results = await asyncio.gather(
+            *(fetch(site_id) for site_id in site_ids), return_exceptions=True
+        )
+        for site_id, result in zip(site_ids, results):
+            if isinstance(result, ASYNC_MIST_ERRORS):
+                org_alerts.failed_sites.append(org_alerts.sites[site_id] or site_id)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                org_alerts.add(site_id, result)
+
+        return org_alerts
+
+    async def gather(self, *paths):
+        """GET several paths concurrently and return their bodies in order."""
+        return await asyncio.gather(*(self.get(path) for path in paths))
+
+    async def close(self):
+        """Close the underlying aiohttp session."""
+
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
@@ -0,0 +1,260 @@
+"""TTL response cache with stale-while-revalidate for Mist GETs."""
+
+# Standard library
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# Local
+from mist_json import dumps, loads
+from mist_metrics import MIST_CACHE_REQUESTS
+from mist_shared import shared_cache_backend
+
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------
+# Cache parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+DEFAULT_CACHE_MAXSIZE = int(os.environ.get("MIST_CACHE_MAXSIZE", "512"))
+DEFAULT_STALE_TTL = float(os.environ.get("MIST_CACHE_STALE_TTL", "600"))
+
+# seconds a response stays fresh, by endpoint template; unlisted endpoints
+# are never cached
+DEFAULT_TTLS = {
+    "orgs/{org_id}/sites": 300,
+    "labs/orgs/{org_id}/suggestions": 120,
+}
+
+
+# -----------------------------------------------------------------------------
+# Cache entries
+# -----------------------------------------------------------------------------
+class CacheEntry:
+    """A cached response body and the moments it goes stale and expires."""
+
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value, fresh_until, stale_until):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+# -----------------------------------------------------------------------------
+# Response cache
+# -----------------------------------------------------------------------------
+class ResponseCache:
+    """Size-bounded LRU cache of Mist response bodies.
+
+    Fresh entries are served directly. Once an entry's TTL lapses it is
+    still served for up to `stale_ttl` seconds while a background thread
+    refreshes it, so repeat clicks never wait on Mist. Cached bodies are
+    shared between callers and must be treated as read-only.
+
+    With a `shared` backend (see `mist_shared`), fresh responses are also
+    published there and looked up before fetching, so replicas share one
+    copy of each response instead of each calling Mist for it.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_CACHE_MAXSIZE,
+        ttls: Optional[Dict[str, float]] = None,
+        stale_ttl: float = DEFAULT_STALE_TTL,
+        shared=None,
+    ):
+        self.maxsize = maxsize
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.stale_ttl = stale_ttl
+        self.shared = shared
+        self.stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+        }
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._refreshing = set()
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    def ttl(self, template: str) -> float:
+        """Return the freshness TTL for an endpoint template, 0 if uncached."""
+        return self.ttls.get(template, 0)
+
+    def get_or_fetch(self, key: str, template: str, fetch: Callable[[], Any]):
+        """Serve `key` from cache, or call `fetch()` and remember its result."""
+
+        ttl = self.ttl(template)
+        if ttl <= 0:
+            return fetch()
+
+        found, value, refresh = self._cached(key)
+        if found:
+            if refresh:
+                threading.Thread(
+                    target=self._refresh, args=(key, ttl, fetch), daemon=True
+                ).start()
+            return value
+
+        found = self._from_shared(key)
+        if found is not None:
+            return found
+
+        self._count_miss()
+        value = fetch()
+        self.set(key, value, ttl)
+
+        return value
+
+    async def get_or_fetch_async(
+        self, key: str, template: str, fetch: Callable[[], Awaitable[Any]]
+    ):
+        """`get_or_fetch` for coroutines: stale entries refresh in a task."""
+
+        ttl = self.ttl(template)
+        if ttl <= 0:
+            return await fetch()
+
+        found, value, refresh = self._cached(key)
+        if found:
+            if refresh:
+                task = asyncio.ensure_future(self._refresh_async(key, ttl, fetch))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            return value
+
+        found = self._from_shared(key)
+        if found is not None:
+            return found
+
+        self._count_miss()
+        value = await fetch()
+        self.set(key, value, ttl)
+
+        return value
+
+    def _cached(self, key: str) -> Tuple[bool, Any, bool]:
+        """Return `(found, value, refresh)`; `refresh` asks the caller, and
+        only that caller, to refetch a stale entry in the background."""
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now >= entry.stale_until:
+                return False, None, False
+
+            self._entries.move_to_end(key)
+            if now < entry.fresh_until:
+                self.stats["hits"] += 1
+                MIST_CACHE_REQUESTS.labels("hit").inc()
+                return True, entry.value, False
+
+            self.stats["stale_hits"] += 1
+            MIST_CACHE_REQUESTS.labels("stale").inc()
+            refresh = key not in self._refreshing
+            self._refreshing.add(key)
+
+            return True, entry.value, refresh
+
+    def _count_miss(self):
+        """Record a lookup that has to go to Mist."""
+
+        with self._lock:
+            self.stats["misses"] += 1
+        MIST_CACHE_REQUESTS.labels("miss").inc()
+
+    def set(self, key: str, value: Any, ttl: float, share: bool = True):
+        """Store `value` under `key`, evicting the least recently used entry."""
+
+        if share and self.shared is not None:
+            try:
+                self.shared.set(f"cache:{key}", dumps([time.time() + ttl, value]), ttl)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning("sharing %s failed: %s", key, error)
+
+        now = time.monotonic()
+        entry = CacheEntry(value, now + ttl, now + ttl + self.stale_ttl)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def _from_shared(self, key: str) -> Optional[Any]:
+        """Adopt another replica's fresh copy of `key`, if there is one."""
+
+        if self.shared is None:
+            return None
+
+        try:
+            raw = self.shared.get(f"cache:{key}")
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning("reading shared %s failed: %s", key, error)
+            return None
+        if raw is None:
+            return None
+
+        fresh_until, value = loads(raw)
+        remaining = fresh_until - time.time()
+        if remaining <= 0:
+            return None
+
+        self.set(key, value, remaining, share=False)
+        with self._lock:
+            self.stats["shared_hits"] += 1
+        MIST_CACHE_REQUESTS.labels("shared").inc()
+
+        return value
+
+    def _refresh(self, key: str, ttl: float, fetch: Callable[[], Any]):
+        """Refetch a stale entry in the background."""
+
+        try:
+            if self._from_shared(key) is None:
+                self.set(key, fetch(), ttl)
+        except Exception as error:  # pylint: disable=broad-except
+            # keep serving the stale copy; the next stale hit retries
+            logger.warning("background refresh of %s failed: %s", key, error)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def _refresh_async(
+        self, key: str, ttl: float, fetch: Callable[[], Awaitable[Any]]
+    ):
+        """Refetch a stale entry in a background task."""
+
+        try:
+            if self._from_shared(key) is None:
+                self.set(key, await fetch(), ttl)
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning("background refresh of %s failed: %s", key, error)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def invalidate(self, key: Optional[str] = None):
+        """Drop one entry, or the whole cache when no key is given."""
+
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# process-wide cache used by MistApi unless a client is handed its own
+default_cache = ResponseCache(shared=shared_cache_backend)
@@ -0,0 +1,46 @@
+"""Normalize Mist API paths into endpoint templates."""
+
+# Standard library
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+
+# -----------------------------------------------------------------------------
+# Path normalization
+# -----------------------------------------------------------------------------
+UUID = re.compile(
+    r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.IGNORECASE
+)
+
+# the identifier that follows one of these collections gets a descriptive name
+ID_NAMES = {
+    "orgs": "{org_id}",
+    "sites": "{site_id}",
+    "devices": "{device_id}",
+    "alarms": "{alarm_id}",
+}
+
+
+def endpoint_template(path):
+    """Turn `orgs/<uuid>/sites?limit=5` into `orgs/{org_id}/sites`."""
+
+    segments = urlsplit(path).path.strip("/").split("/")
+
+    template = []
+    for index, segment in enumerate(segments):
+        if UUID.match(segment):
+            previous = segments[index - 1] if index else ""
+            template.append(ID_NAMES.get(previous, "{id}"))
+        else:
+            template.append(segment)
+
+    return "/".join(template)
+
+
+def canonical_path(path):
+    """Strip the leading / and sort the query so equal requests compare equal."""
+
+    parts = urlsplit(path.lstrip("/"))
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+
+    return f"{parts.path}?{query}" if query else parts.path
@@ -2,196 +2,155 @@
 # pylint: disable=inconsistent-return-statements
 
 # Standard library
-from typing import List, Optional, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
 import json
+import os
+import time
 
 # Third Party
-from pydantic import BaseModel
-from jinja2 import Environment, FileSystemLoader
+from pydantic import BaseModel, PrivateAttr, validator
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 import requests
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
 
+# Local
+from mist_cache import default_cache
+from mist_endpoints import canonical_path, endpoint_template
+from mist_json import iter_records, loads
+from mist_metrics import TEMPLATE_RENDER_SECONDS, observe_mist
+from mist_ratelimit import (
+    INTERACTIVE,
+    MistRateLimited,
+    default_limiter,
+    parse_retry_after,
+)
+from mist_resilience import CircuitOpen, default_breakers, default_retry
+from mist_session import DEFAULT_POOL_MAXSIZE, default_pool
+from mist_singleflight import default_flight
 
-# -----------------------------------------------------------------------------
-# Jinja2 parameters
-# -----------------------------------------------------------------------------
-file_loader = FileSystemLoader("templates")
-env = Environment(loader=file_loader)
-env.trim_blocks = True
-env.lstrip_blocks = True
-env.rstrip_blocks = True
-
-
-# -----------------------------------------------------------------------------
-# Marvis Issues data modeling: Connectivity Issues
-# -----------------------------------------------------------------------------
-class AuthFailures(BaseModel):
-    """Marvis Connectivity Issues: Auth Failures."""
-
-    scope: int
-    wlan: Optional[int] = 0
-    radius: Optional[int] = 0
-    total: Optional[int] = 0
-
-
-class DhcpFailures(BaseModel):
-    """Marvis Connectivity Issues: DHCP Failures."""
 
-    scope: int
-    MARVIS_EVENT_CLIENT_DHCP_FAILURE: Optional[int] = 0
-    dhcp: Optional[int] = 0
-    total: Optional[int] = 0
+# everything a handler should expect from a Mist call that did not work out
+MIST_ERRORS = (MistRateLimited, CircuitOpen, requests.RequestException)
 
+# failures worth another attempt, provided they are not a 4xx answer
+RETRYABLE_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    requests.HTTPError,
+)
 
-class ArpFailures(BaseModel):
-    """Marvis Connectivity Issues: ARP Failures."""
 
-    scope: int
-    CLIENT_GW_ARP_FAILURE: Optional[int] = 0
-    total: Optional[int] = 0
+def transient(error: Exception) -> bool:
+    """True for a timeout, a dropped connection or a 5xx answer from Mist."""
 
+    if not isinstance(error, requests.HTTPError):
+        return isinstance(error, RETRYABLE_ERRORS)
 
-class DnsFailures(BaseModel):
-    """Marvis Connectivity Issues: DNS Failures."""
+    response = getattr(error, "response", None)
 
-    scope: int
-    MARVIS_DNS_FAILURE: Optional[int] = 0
-    dns: Optional[int] = 0
-    total: Optional[int] = 0
+    return response is not None and response.status_code >= 500
 
 
-class Connectivity(BaseModel):
-    """Mapping out object."""
+# sites per page when listing an org's sites (Mist defaults to 100)
+SITES_PAGE_LIMIT = int(os.environ.get("MIST_SITES_PAGE_LIMIT", "1000"))
 
-    auth_failure: AuthFailures
-    dhcp_failure: DhcpFailures
-    arp_failure: ArpFailures
-    dns_failure: DnsFailures
 
-
-# -----------------------------------------------------------------------------
-# Marvis Issues data modeling: AP Issues
 # -----------------------------------------------------------------------------
-class ApDisconnect(BaseModel):
-    """Marvis Connectivity Issues: DNS Failures."""
-
-    ap: Optional[int] = 0
-    switch: Optional[int] = 0
-
-
-class EthernetError(BaseModel):
-    """Marvis Connectivity Issues: DNS Failures."""
-
-    ap: Optional[int] = 0
-
-
-class HealthCheck(BaseModel):
-    """Marvis Connectivity Issues: DNS Failures."""
-
-    ap: Optional[int] = 0
-
-
-class Capacity(BaseModel):
-    """Marvis Connectivity Issues: DNS Failures."""
-
-    ap: Optional[int] = 0
-
-
-class Coverage(BaseModel):
-    """Marvis Connectivity Issues: DNS Failures."""
-
-    ap: Optional[int] = 0
-
-
-class AccessPoint(BaseModel):
-    """Helper for interacting with the Mist API."""
-
-    ap_disconnect: ApDisconnect
-    ethernet_error: EthernetError
-    health_check: HealthCheck
-    insufficient_capacity: Capacity
-    insufficient_coverage: Coverage
-
-
-# -----------------------------------------------------------------------------
-# Marvis Issues data modeling: Switch Issues
-# -----------------------------------------------------------------------------
-class BadCable(BaseModel):
-    """Marvis Connectivity Issues: DNS Failures."""
-
-    interface: Optional[int] = 0
-
-
-class MissingVlan(BaseModel):
-    """Marvis Connectivity Issues: DNS Failures."""
-
-    switch: Optional[int] = 0
-
-
-class DuplexMismatch(BaseModel):
-    """Marvis Connectivity Issues: DNS Failures."""
-
-    interface: Optional[int] = 0
-
-
-class PortFlapping(BaseModel):
-    """Marvis Connectivity Issues: DNS Failures."""
-
-    interface: Optional[int] = 0
-
-
-class SpanningTreeLoop(BaseModel):
-    """Marvis Connectivity Issues: DNS Failures."""
-
-    site: Optional[int] = 0
-
-
-class Switch(BaseModel):
-    """Helper for interacting with the Mist API."""
-
-    bad_cable: BadCable
-    missing_vlan: MissingVlan
-    negotiation_mismatch: DuplexMismatch
-    port_flap: PortFlapping
-    stp_loop: SpanningTreeLoop
-
-
-# -----------------------------------------------------------------------------
-# Marvis Issues data modeling: Gateway Issues
+# Jinja2 parameters
 # -----------------------------------------------------------------------------
-class BadWanLink(BaseModel):
-    """Marvis Connectivity Issues: DNS Failures."""
-
-    interface: Optional[int] = 0
-
-
-class BadCable(BaseModel):
-    """Marvis Connectivity Issues: DNS Failures."""
-
-    interface: Optional[int] = 0
-    ap: Optional[int] = 0
-
-
-class VpnPathDown(BaseModel):
-    """Marvis Connectivity Issues: DNS Failures."""
-
-    interface: Optional[int] = 0
-
-
-class Gateway(BaseModel):
-    """Helper for interacting with the Mist API."""
-
-    bad_wan_link: BadWanLink
-    bad_cable: BadCable
-    vpn_path_down: VpnPathDown
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+# auto-reload re-stats every template on each render; only worth it while
+# editing templates, so production keeps the precompiled ones
+TEMPLATE_RELOAD = os.environ.get("MIST_TEMPLATE_RELOAD", "false").lower() == "true"
+# compiled templates are kept in Jinja's private per-user directory (0700,
+# ownership checked) unless MIST_TEMPLATE_CACHE names one of our own
+TEMPLATE_CACHE_DIR = os.environ.get("MIST_TEMPLATE_CACHE")
+if TEMPLATE_CACHE_DIR:
+    os.makedirs(TEMPLATE_CACHE_DIR, mode=0o700, exist_ok=True)
+    # fails unless we own it, and shuts out anyone else if it pre-existed
+    os.chmod(TEMPLATE_CACHE_DIR, 0o700)
+
+file_loader = FileSystemLoader(TEMPLATE_DIR)
+env = Environment(
+    loader=file_loader,
+    auto_reload=TEMPLATE_RELOAD,
+    bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+    trim_blocks=True,
+    lstrip_blocks=True,
+)
+
+# compile every template once at startup
+templates = {name: env.get_template(name) for name in env.list_templates(["j2"])}
 
 
 # -----------------------------------------------------------------------------
-# Marvis Issues data modeling: Layer1 Issues
+# Marvis Issues registry: which counters make up each symptom's total
 # -----------------------------------------------------------------------------
-class Layer1(BaseModel):
-    """Helper for interacting with the Mist API."""
-
-    bad_cable: Optional[BadCable] = 0
+class MarvisSymptom(NamedTuple):
+    """One Marvis symptom and the counters summed into its total."""
+
+    category: str
+    symptom: str
+    label: str
+    counters: Tuple[str, ...]
+
+    @property
+    def key(self) -> str:
+        """Flat `category.symptom` name used for counters."""
+        return f"{self.category}.{self.symptom}"
+
+
+MARVIS_CATEGORIES = {
+    "connectivity": "Client Connectivity Issues",
+    "ap": "AP Issues",
+    "switch": "Switch Issues",
+    "gateway": "Gateway Issues",
+    "layer_1": "Layer 1 Issues",
+}
+
+MARVIS_SYMPTOMS = (
+    MarvisSymptom(
+        "connectivity", "auth_failure", "Authorization Failures", ("wlan", "radius")
+    ),
+    MarvisSymptom(
+        "connectivity",
+        "dhcp_failure",
+        "DHCP Failures",
+        ("MARVIS_EVENT_CLIENT_DHCP_FAILURE", "dhcp"),
+    ),
+    MarvisSymptom(
+        "connectivity",
+        "arp_failure",
+        "Client Gateway ARP Failures",
+        ("CLIENT_GW_ARP_FAILURE",),
+    ),
+    MarvisSymptom(
+        "connectivity",
+        "dns_failure",
+        "Client DNS Failures",
+        ("MARVIS_DNS_FAILURE", "dns"),
+    ),
+    MarvisSymptom("ap", "ap_disconnect", "AP disconnects", ("ap",)),
+    MarvisSymptom("ap", "ethernet_error", "Ethernet errors", ("ap",)),
+    MarvisSymptom("ap", "health_check", "Health Check", ("ap",)),
+    MarvisSymptom("ap", "insufficient_capacity", "Insufficient Capacity", ("ap",)),
+    MarvisSymptom("ap", "insufficient_coverage", "Insufficient Coverage", ("ap",)),
+    MarvisSymptom("switch", "bad_cable", "Bad Cables", ("interface",)),
+    MarvisSymptom("switch", "missing_vlan", "Missing VLAN", ("switch",)),
+    MarvisSymptom(
+        "switch", "negotiation_mismatch", "Negotiation Mismatch", ("interface",)
+    ),
+    MarvisSymptom("switch", "port_flap", "Port Flapping", ("interface",)),
+    MarvisSymptom("switch", "stp_loop", "Spanning Tree Loop", ("site",)),
+    MarvisSymptom("gateway", "bad_wan_link", "Bad WAN links", ("interface",)),
+    MarvisSymptom("gateway", "bad_cable", "Bad cable", ("interface",)),
+    MarvisSymptom("gateway", "vpn_path_down", "VPN path down", ("interface",)),
+    MarvisSymptom("layer_1", "bad_cable", "Bad Cable", ("ap",)),
+)
 
 
 # -----------------------------------------------------------------------------
@@ -200,45 +159,57 @@ class Layer1(BaseModel):
 class MarvisIssues(BaseModel):
     """Helping structure an object to hold issues from Marvis."""
 
-    connectivity: Optional[Connectivity] = None
-    ap: Optional[AccessPoint] = None
-    switch: Optional[Switch] = None
-    gateway: Optional[Gateway] = None
-    layer_1: Optional[Layer1] = None
+    counts: Dict[str, int] = {}
 
     def __init__(self, **data: Any):
         """
         Here we manipulate pydandic's BaseModel auto-generated __init__ method.
-          - run our connectivity issues through the `_total_count()` function.
-          - create new objects to hold the return value.
-          - update the object with the correct counter.
+          - walk the registry once over the raw `suggestions` payload.
+          - sum each symptom's counters, leaving out `scope`.
+          - keep only the flat totals, no nested models.
         """
 
-        super().__init__(**data)
-
-        # ---------------------------------------------------------------------
-        # Creating a 'total' by adding the values of our dictionary k/v pairs
-        # ---------------------------------------------------------------------
-        self.connectivity.arp_failure.total = self._total_count(
-            self.connectivity.arp_failure.dict()
-        )
-        self.connectivity.auth_failure.total = self._total_count(
-            self.connectivity.auth_failure.dict()
-        )
-        self.connectivity.dhcp_failure.total = self._total_count(
-            self.connectivity.dhcp_failure.dict()
-        )
-        self.connectivity.dns_failure.total = self._total_count(
-            self.connectivity.dns_failure.dict()
+        if "counts" in data:
+            super().__init__(**data)
+            return
+
+        counts = {}
+        for symptom in MARVIS_SYMPTOMS:
+            raw = (data.get(symptom.category) or {}).get(symptom.symptom) or {}
+            total = 0
+            for counter in symptom.counters:
+                total += raw.get(counter) or 0
+            counts[symptom.key] = total
+
+        super().__init__(counts=counts)
+
+    @classmethod
+    def from_response(cls, response: dict):
+        """Build our issues from a `labs/orgs/{org_id}/suggestions` body."""
+        return cls(**response["data"])
+
+    def count(self, category: str, symptom: str) -> int:
+        """Total of one symptom, 0 when Marvis did not report it."""
+        return self.counts.get(f"{category}.{symptom}", 0)
+
+    def category_total(self, category: str) -> int:
+        """Sum of every symptom within a category."""
+        return sum(
+            self.counts.get(each.key, 0)
+            for each in MARVIS_SYMPTOMS
+            if each.category == category
         )
 
-    def _total_count(self, payload):
-        """Loop over a dictionary and add the value of its k/v pairs."""
-        total = 0
-        for key, value in payload.items():
-            total = total + value
+    def sections(self, categories=None):
+        """Yield (category, heading, [(key, label, count), ...]) per category,
+        in registry order."""
 
-        return total
+        for category in categories or MARVIS_CATEGORIES:
+            yield category, MARVIS_CATEGORIES[category], [
+                (each.key, each.label, self.counts.get(each.key, 0))
+                for each in MARVIS_SYMPTOMS
+                if each.category == category
+            ]
 
 
 # -----------------------------------------------------------------------------
@@ -269,6 +240,60 @@ class Results(BaseModel):
     vlans: Optional[List[int]] = []
 
 
+class AlarmRecord:
+    """Compact, slotted alarm built straight from decoded JSON.
+
+    Exposes the same attributes as `Results` for templates, but checks only
+    that the required keys are present and shares one empty tuple for
+    every absent list instead of building per-instance defaults, which
+    makes bulk parsing of org-wide sweeps several times cheaper.
+    """
+
+    __slots__ = tuple(Results.__fields__)
+
+    def __init__(self, raw: dict):
+        get = raw.get
+        try:
+            self.count = raw["count"]
+            self.group = raw["group"]
+            self.hostnames = raw["hostnames"]
+            self.id = raw["id"]
+            self.last_seen = raw["last_seen"]
+            self.org_id = raw["org_id"]
+            self.severity = raw["severity"]
+            self.site_id = raw["site_id"]
+            self.timestamp = raw["timestamp"]
+            self.type = raw["type"]
+        except KeyError as field:
+            raise ValueError(f"alarm {get('id')} is missing {field}") from None
+        self.aps = get("aps") or ()
+        self.bssids = get("bssids") or ()
+        self.client_count = get("client_count") or 0
+        self.incident_count = get("incident_count") or 0
+        self.macs = get("macs") or ()
+        self.reasons = get("reasons") or ()
+        self.servers = get("servers") or ()
+        self.switches = get("switches") or ()
+        self.ssids = get("ssids") or ()
+        self.vlans = get("vlans") or ()
+
+    def dict(self):
+        """Return the record as a plain dictionary, like `Results.dict()`."""
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return f"AlarmRecord(id={self.id!r}, type={self.type!r}, severity={self.severity!r})"
+
+
+def parse_alarms(raw_alarms: Iterable[dict], strict=False) -> list:
+    """Parse decoded alarms, as `AlarmRecord`s or, with `strict`, `Results`."""
+
+    if strict:
+        return [Results(**each) for each in raw_alarms]
+
+    return list(map(AlarmRecord, raw_alarms))
+
+
 class SiteAlerts(BaseModel):
     """Helping structure an object to hold alerts from a site."""
 
@@ -278,6 +303,127 @@ class SiteAlerts(BaseModel):
     limit: Optional[int] = None
     total: Optional[int] = None
 
+    _by_severity: Optional[dict] = PrivateAttr(default=None)
+
+    @property
+    def by_severity(self) -> Dict[str, Dict[str, List[Results]]]:
+        """Our results bucketed severity → type → alerts in one pass."""
+
+        if self._by_severity is None:
+            index = {}
+            for each in self.results or []:
+                index.setdefault(each.severity, {}).setdefault(each.type, []).append(
+                    each
+                )
+            self._by_severity = index
+
+        return self._by_severity
+
+    def extend(self, page: dict, strict=False):
+        """Parse one page of an alarm search into our results.
+
+        Alarms become `AlarmRecord`s unless `strict` asks for full pydantic
+        validation into `Results`.
+        """
+
+        if self.results is None:
+            self.results = []
+
+        self._by_severity = None
+
+        for field in ("start", "end", "limit", "total"):
+            if getattr(self, field) is None and page.get(field) is not None:
+                setattr(self, field, page[field])
+
+        self.results.extend(parse_alarms(page.get("results") or [], strict))
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict], strict=False):
+        """Build our alerts from alarms handed over one at a time."""
+
+        site_alerts = cls(results=[])
+        site_alerts.results.extend(
+            (Results(**each) for each in records)
+            if strict
+            else map(AlarmRecord, records)
+        )
+
+        return site_alerts
+
+    @classmethod
+    def from_pages(
+        cls,
+        pages: Iterable[dict],
+        max_results: Optional[int] = None,
+        strict=False,
+        progress: Optional[Callable] = None,
+    ):
+        """Build our alerts page by page, so raw pages are dropped once parsed.
+
+        `progress(site_alerts)` is called after every page but the last.
+        """
+
+        site_alerts = cls(results=[])
+        for page in pages:
+            site_alerts.extend(page, strict)
+            if max_results is not None and len(site_alerts.results) >= max_results:
+                del site_alerts.results[max_results:]
+                break
+            if progress is not None and page.get("next"):
+                progress(site_alerts)
+
+        return site_alerts
+
+
+# -----------------------------------------------------------------------------
+# Organization-wide alerts object
+# -----------------------------------------------------------------------------
+SEVERITIES = ("critical", "warn", "info")
+
+
+class OrgAlerts(BaseModel):
+    """Alerts of every site in an organization, grouped by severity then site."""
+
+    sites: Dict[str, str] = {}
+    severities: Dict[str, Dict[str, List[Results]]] = {}
+    failed_sites: List[str] = []
+    total: int = 0
+
+    @validator("sites", pre=True)
+    def name_unnamed_sites(cls, sites):  # pylint: disable=no-self-argument
+        """Fall back to the site id for sites Mist returns without a name."""
+        return {site_id: name or site_id for site_id, name in (sites or {}).items()}
+
+    def add(self, site_id: str, site_alerts: SiteAlerts):
+        """Merge the alerts of one site."""
+
+        for each in site_alerts.results or []:
+            by_site = self.severities.setdefault(each.severity, {})
+            by_site.setdefault(site_id, []).append(each)
+            self.total += 1
+
+    @classmethod
+    def from_alarms(cls, alarms: Iterable, sites: Optional[Dict[str, str]] = None):
+        """Group loose alarms, of any number of sites, by severity then site."""
+
+        org_alerts = cls(sites=sites or {})
+        for each in alarms:
+            by_site = org_alerts.severities.setdefault(each.severity, {})
+            by_site.setdefault(each.site_id, []).append(each)
+            org_alerts.total += 1
+
+        return org_alerts
+
+    def ordered(self):
+        """Yield (severity, site name, alerts), most severe first."""
+
+        known = [each for each in SEVERITIES if each in self.severities]
+        others = sorted(set(self.severities) - set(SEVERITIES))
+        for severity in known + others:
+            by_site = self.severities[severity]
+            for site_id in sorted(by_site, key=lambda each: self.sites.get(each, each)):
+                yield severity, self.sites.get(site_id, site_id), by_site[site_id]
+
 
 # -----------------------------------------------------------------------------
 # Mist API helper object
@@ -289,6 +435,14 @@ class MistApi(BaseModel):
     baseurl: Optional[str] = "api.mist.com/api/v1"
     headers: Optional[dict] = {}
     path: Optional[str] = "self"
+    namespace: Optional[str] = None
+    pool: Optional[Any] = None
+    timeout: Optional[Any] = None
+    cache: Optional[Any] = None
+    flight: Optional[Any] = None
+    limiter: Optional[Any] = None
+    retry: Optional[Any] = None
+    breakers: Optional[Any] = None
 
     def __init__(self, **data: Any):
         """
@@ -306,6 +460,28 @@ class MistApi(BaseModel):
             "Content-Type": "application/json",
         }
 
+        # share the process-wide keep-alive pool unless given a dedicated one
+        if self.pool is None:
+            self.pool = default_pool
+
+        if self.timeout is None:
+            self.timeout = self.pool.timeout
+
+        if self.cache is None:
+            self.cache = default_cache
+
+        if self.flight is None:
+            self.flight = default_flight
+
+        if self.limiter is None:
+            self.limiter = default_limiter
+
+        if self.retry is None:
+            self.retry = default_retry
+
+        if self.breakers is None:
+            self.breakers = default_breakers
+
     def _path_strip(self, path):
         """Strip off leading / within the url path and return full url."""
 
@@ -314,24 +490,341 @@ class MistApi(BaseModel):
 
         return f"{self.baseurl}/{path}"
 
-    def send(self, method, path, headers, data=None):
-        """Build the URL, handle the response of API calls."""
+    def _request(
+        self,
+        method,
+        url,
+        headers,
+        body,
+        priority,
+        read_timeout,
+        stream=False,
+        expires=None,
+    ):
+        """Make one rate-limited request, waiting out a single 429.
+
+        The retry after a 429 may wait for Mist's Retry-After up to the
+        `expires` deadline, even past the limiter's usual `max_wait`. Each
+        attempt's latency and status code are recorded per endpoint template.
+        """
+
+        endpoint = endpoint_template(url[len(self.baseurl) :])
+
+        connect_timeout = self.timeout[0] if isinstance(self.timeout, tuple) else None
+
+        max_wait = None
+        for _ in range(2):
+            self.limiter.acquire(priority, max_wait)
+            with observe_mist(method, endpoint) as outcome:
+                response = self.pool.session(url).request(
+                    method,
+                    url,
+                    headers=headers,
+                    data=body,
+                    timeout=(connect_timeout or read_timeout, read_timeout),
+                    stream=stream,
+                )
+                outcome["status"] = response.status_code
+            if response.status_code != 429:
+                return response
+
+            response.close()
+
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            self.limiter.pause(60 if retry_after is None else retry_after)
+            if expires is not None:
+                max_wait = max(self.limiter.max_wait, expires - time.monotonic())
+
+        raise MistRateLimited(f"Mist API throttled {method} {url}")
+
+    def send(
+        self, method, path, headers, data=None, priority=INTERACTIVE, deadline=None
+    ):
+        """Build the URL, handle the response of API calls.
+
+        Every call takes a token from the rate limiter first; a 429 pauses
+        the limiter for Mist's Retry-After and the call is retried once,
+        once the pause is over if that is before `deadline`.
+        Timeouts, connection errors and 5xx answers to idempotent methods
+        are retried with jittered backoff until `deadline` seconds have
+        passed, and trip the endpoint's circuit breaker when they persist.
+        """
 
         url = self._path_strip(path)
 
-        response = requests.request(
-            method,
-            url,
-            headers=headers,
-            data=json.dumps(data),
+        # a bodiless GET must not carry `null`, or it desyncs kept-alive sockets
+        body = json.dumps(data) if data is not None else None
+
+        breaker = self.breakers.breaker(endpoint_template(path))
+        read_timeout = (
+            self.timeout[1] if isinstance(self.timeout, tuple) else self.timeout
         )
-        response.raise_for_status()
+        expires = time.monotonic() + (deadline or self.retry.deadline)
+        attempts = self.retry.attempts_for(method)
+
+        for attempt in range(1, attempts + 1):
+            breaker.before_call()
+            # an attempt ending any other way (throttled, undecodable body)
+            # must still free a half-open breaker's trial slot
+            settled = False
+
+            remaining = expires - time.monotonic()
+            try:
+                response = self._request(
+                    method,
+                    url,
+                    headers,
+                    body,
+                    priority,
+                    min(read_timeout, remaining),
+                    expires=expires,
+                )
+                if response.status_code < 500:
+                    breaker.record_success()
+                    settled = True
+                    response.raise_for_status()
+                    return loads(response.content)
+
+                response.raise_for_status()
+
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                requests.HTTPError,
+            ) as error:
+                if not transient(error):
+                    raise
+
+                breaker.record_failure()
+                settled = True
+                delay = self.retry.backoff(attempt)
+                if attempt == attempts or time.monotonic() + delay >= expires:
+                    raise
+
+                time.sleep(delay)
+
+            finally:
+                if not settled:
+                    breaker.abandon()
+
+    def get(self, path=None, cache=True, priority=INTERACTIVE, deadline=None):
+        """HTTP GET method, defaulting to the path the client was built with.
+
+        Endpoints with a TTL in the response cache are served from it unless
+        `cache` is False. `deadline` bounds the retries, as in `send`.
+        """
+
+        path = path or self.path
+        key = f"{self._namespace()}{self.baseurl}/{canonical_path(path)}"
+
+        # identical GETs already on the wire share that single upstream call
+        def fetch():
+            return self.flight.do(
+                key,
+                lambda: self.send(
+                    "GET", path, self.headers, priority=priority, deadline=deadline
+                ),
+            )
+
+        if not cache:
+            return fetch()
+
+        return self.cache.get_or_fetch(key, endpoint_template(path), fetch)
+
+    def coalesce(self, key, build):
+        """Share the parsed result of `build()` with concurrent identical reports."""
+        return self.flight.do((self._namespace(), self.baseurl, key), build)
+
+    def _namespace(self):
+        """Prefix keeping this client's cache and flight keys apart from others'."""
+        return f"{self.namespace}:" if self.namespace else ""
+
+    def _next_page_path(self, path, page):
+        """Work out the path of the page after `page`, or None on the last one."""
+
+        # search endpoints hand back a ready-made `next` link
+        if isinstance(page, dict) and page.get("next"):
+            next_path = page["next"]
+            prefix = urlsplit(self.baseurl).path
+            if next_path.startswith(prefix):
+                next_path = next_path[len(prefix) :]
+            return next_path
+
+        # list endpoints take `page=N` and are exhausted by a short page
+        parts = urlsplit(path)
+        query = dict(parse_qsl(parts.query))
+        if "page" not in query or "limit" not in query:
+            return None
+
+        records = (page.get("results") or []) if isinstance(page, dict) else page
+        if len(records) < int(query["limit"]):
+            return None
+
+        query["page"] = int(query["page"]) + 1
+        return f"{parts.path}?{urlencode(query)}"
+
+    def list_sites(self, org_id, priority=INTERACTIVE):
+        """Every site of `org_id`, merged from all pages of the listing."""
+
+        path = f"orgs/{org_id}/sites?limit={SITES_PAGE_LIMIT}&page=1"
+
+        return [
+            site for page in self.paginate(path, priority=priority) for site in page
+        ]
+
+    def paginate(self, path=None, prefetch=False, priority=INTERACTIVE, deadline=None):
+        """Lazily yield every page of a paginated GET.
+
+        With `prefetch`, the next page is requested in the background while
+        the caller is still working on the current one. `deadline` bounds
+        the retries of each page's request.
+        """
+
+        path = path or self.path
+
+        if not prefetch:
+            while path:
+                page = self.get(path, priority=priority, deadline=deadline)
+                path = self._next_page_path(path, page)
+                yield page
+            return
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            page = self.get(path, priority=priority, deadline=deadline)
+            while True:
+                next_path = self._next_page_path(path, page)
+                future = None
+                if next_path:
+                    future = executor.submit(
+                        self.get, next_path, priority=priority, deadline=deadline
+                    )
+                yield page
+                if future is None:
+                    return
+                path, page = next_path, future.result()
+
+    def stream(
+        self,
+        path,
+        prefix="results.item",
+        meta=None,
+        priority=INTERACTIVE,
+        deadline=None,
+    ):
+        """GET `path` and yield the records at `prefix` as they are decoded.
+
+        The body is never held whole; top-level scalars such as `next` land
+        in `meta`. Streams are not retried, since part of them may already
+        have been handed to the caller; only a 429 is waited out, up to
+        `deadline` seconds.
+        """
+
+        url = self._path_strip(path)
+        expires = time.monotonic() + (deadline or self.retry.deadline)
+        breaker = self.breakers.breaker(endpoint_template(path))
+        read_timeout = (
+            self.timeout[1] if isinstance(self.timeout, tuple) else self.timeout
+        )
+
+        breaker.before_call()
+        try:
+            response = self._request(
+                "GET",
+                url,
+                self.headers,
+                None,
+                priority,
+                read_timeout,
+                stream=True,
+                expires=expires,
+            )
+        except (requests.ConnectionError, requests.Timeout):
+            breaker.record_failure()
+            raise
+        except Exception:
+            # throttled or otherwise inconclusive: free the trial slot
+            breaker.abandon()
+            raise
+
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+        with response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            try:
+                yield from iter_records(response.raw, prefix, meta)
+            # the raw body is read without requests' wrapping of these
+            except ProtocolError as error:
+                raise requests.exceptions.ChunkedEncodingError(error) from error
+            except ReadTimeoutError as error:
+                raise requests.ConnectionError(error) from error
+
+    def collect(self, path, build, priority=INTERACTIVE, deadline=None):
+        """Return `build(records)` over every streamed page of a search.
+
+        Unlike `stream`, whose records may already be in the caller's
+        hands, `build` starts over on every attempt, so timeouts, dropped
+        connections (even halfway through a body) and 5xx answers are
+        retried with the same backoff and deadline as `send`.
+        """
+
+        expires = time.monotonic() + (deadline or self.retry.deadline)
+        attempts = self.retry.attempts_for("GET")
+
+        for attempt in range(1, attempts + 1):
+            try:
+                records = self.iter_results(
+                    path,
+                    priority=priority,
+                    stream=True,
+                    deadline=expires - time.monotonic(),
+                )
+                return build(records)
+            except RETRYABLE_ERRORS as error:
+                delay = self.retry.backoff(attempt)
+                if (
+                    not transient(error)
+                    or attempt == attempts
+                    or time.monotonic() + delay >= expires
+                ):
+                    raise
+
+                time.sleep(delay)
+
+    def iter_results(
+        self,
+        path=None,
+        prefetch=False,
+        priority=INTERACTIVE,
+        stream=False,
+        deadline=None,
+    ):
+        """Lazily yield the `results` records of every page of a search.
+
+        With `stream`, each page is decoded record by record off the wire
+        instead of being parsed whole (and `prefetch` is ignored).
+        `deadline` bounds the retries of each page's request.
+        """
 
-        return response.json()
+        path = path or self.path
 
-    def get(self):
-        """HTTP GET method."""
-        return self.send("GET", self.path, self.headers)
+        if not stream:
+            pages = self.paginate(
+                path, prefetch=prefetch, priority=priority, deadline=deadline
+            )
+            for page in pages:
+                yield from page.get("results") or []
+            return
+
+        while path:
+            meta = {}
+            yield from self.stream(
+                path, meta=meta, priority=priority, deadline=deadline
+            )
+            path = self._next_page_path(path, meta)
 
     def put(self, path, headers, data=None):
         """HTTP PUT method."""
@@ -345,9 +838,54 @@ class MistApi(BaseModel):
         """HTTP DELETE method."""
         return self.send("DELETE", path, headers, data)
 
-    def template(self, payload, template_file):
+    def map_concurrent(self, fn: Callable, items: Iterable, concurrency=None):
+        """Yield `(item, result, error)` for `fn(item)` run on up to
+        `concurrency` threads, in completion order."""
+
+        concurrency = concurrency or DEFAULT_POOL_MAXSIZE
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {executor.submit(fn, item): item for item in items}
+            for future in as_completed(futures):
+                error = future.exception()
+                result = None if error is not None else future.result()
+                yield futures[future], result, error
+
+    def sweep_alarms(self, org_id, query, concurrency=None, progress=None):
+        """Fetch the alarms of every site in `org_id` concurrently.
+
+        Keep `concurrency` at or below the session pool size, otherwise
+        surplus connections are thrown away instead of kept alive.
+        `progress(org_alerts, done, total)` is called as each site lands.
+        """
+
+        sites = self.list_sites(org_id)
+        org_alerts = OrgAlerts(sites={site["id"]: site.get("name") for site in sites})
+
+        def fetch(site_id):
+            # a transient failure retries this site, not the whole sweep
+            path = f"sites/{site_id}/alarms/search?{query}"
+            return self.collect(path, SiteAlerts.from_records)
+
+        site_ids = list(org_alerts.sites)
+        for done, (site_id, site_alerts, error) in enumerate(
+            self.map_concurrent(fetch, site_ids, concurrency), 1
+        ):
+            if error is not None:
+                org_alerts.failed_sites.append(org_alerts.sites[site_id] or site_id)
+            else:
+                org_alerts.add(site_id, site_alerts)
+            if progress is not None and done < len(site_ids):
+                progress(org_alerts, done, len(site_ids))
+
+        return org_alerts
+
+    def template(self, payload, template_file, **context):
         """Template our message to slack."""
-        template = env.get_template(template_file)
-        message = template.render(data=payload)
+        template = templates.get(template_file)
+        if template is None or TEMPLATE_RELOAD:
+            template = env.get_template(template_file)
+        with TEMPLATE_RENDER_SECONDS.labels(template_file).time():
+            message = template.render(data=payload, **context)
 
         return message
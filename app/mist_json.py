@@ -0,0 +1,89 @@
+"""JSON decoding for Mist responses, with optional faster/streaming backends.
+
+`orjson` speeds up whole-body decoding and `ijson` lets large search
+responses be decoded record by record straight off the socket. Both are
+optional; without them we fall back to the standard library.
+"""
+
+# Standard library
+import json
+from typing import IO, Iterator, Optional
+
+# Third Party
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - optional streaming backend
+    ijson = None
+
+
+# -----------------------------------------------------------------------------
+# Whole-body decoding
+# -----------------------------------------------------------------------------
+def loads(payload):
+    """Decode a JSON document with the fastest backend available."""
+
+    if orjson is not None:
+        return orjson.loads(payload)
+
+    return json.loads(payload)
+
+
+def dumps(value) -> bytes:
+    """Encode a value as compact JSON bytes with the fastest backend available."""
+
+    if orjson is not None:
+        return orjson.dumps(value)
+
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+# -----------------------------------------------------------------------------
+# Streaming decoding
+# -----------------------------------------------------------------------------
+def iter_records(
+    fileobj: IO[bytes], prefix: str = "results.item", meta: Optional[dict] = None
+) -> Iterator:
+    """Yield each value found at `prefix` while reading `fileobj`.
+
+    Scalar top-level fields (`next`, `total`, `start`, ...) are stored in
+    `meta` as they go by, so callers can follow pagination once the
+    records are exhausted. Without ijson the body is decoded in one go.
+    """
+
+    if ijson is None:
+        meta = {} if meta is None else meta
+        body = loads(fileobj.read())
+        for key, value in body.items():
+            if not isinstance(value, (dict, list)):
+                meta[key] = value
+        node = body
+        for part in prefix.split(".")[:-1]:
+            node = node.get(part) or []
+        yield from node
+        return
+
+    # without metadata to collect, ijson's native item builder is much faster
+    if meta is None:
+        yield from ijson.items(fileobj, prefix, use_float=True)
+        return
+
+    builder = None
+    for path, event, value in ijson.parse(fileobj, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if path == prefix and event in ("end_map", "end_array"):
+                yield builder.value
+                builder = None
+        elif path == prefix:
+            if event in ("start_map", "start_array"):
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+            else:
+                yield value
+        elif "." not in path and event in ("string", "number", "boolean", "null"):
+            meta[path] = value
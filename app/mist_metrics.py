@@ -0,0 +1,111 @@
+"""Prometheus metrics of Mist calls, report rendering and Slack posts."""
+
+# Standard library
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+# Third Party
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------
+# Exporter parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+# 0 leaves the /metrics endpoint off
+DEFAULT_METRICS_PORT = int(os.environ.get("MIST_METRICS_PORT", "8000"))
+# loopback only unless the scraper needs it exposed, e.g. "0.0.0.0" in a pod
+DEFAULT_METRICS_ADDR = os.environ.get("MIST_METRICS_ADDR", "127.0.0.1")
+
+# Mist searches can take many seconds, template renders a few milliseconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RENDER_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+
+# -----------------------------------------------------------------------------
+# Metrics
+# -----------------------------------------------------------------------------
+MIST_REQUEST_SECONDS = Histogram(
+    "mist_request_seconds",
+    "Mist API request latency, up to the response headers.",
+    ["method", "endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+MIST_RESPONSES = Counter(
+    "mist_responses_total",
+    "Mist API responses by status code ('error' when none came back).",
+    ["method", "endpoint", "status"],
+)
+MIST_CACHE_REQUESTS = Counter(
+    "mist_cache_requests_total",
+    "Response cache lookups by result (hit, stale, shared or miss).",
+    ["result"],
+)
+SINGLE_FLIGHT_CALLS = Counter(
+    "mist_singleflight_calls_total",
+    "Mist calls by single-flight role (leader runs it, collapsed waits on one).",
+    ["role"],
+)
+REPORT_QUEUE_DEPTH = Gauge(
+    "report_queue_depth", "Jobs waiting for a worker.", ["queue"]
+)
+REPORT_QUEUE_RUNNING = Gauge("report_queue_running", "Jobs being worked on.", ["queue"])
+TEMPLATE_RENDER_SECONDS = Histogram(
+    "template_render_seconds",
+    "Time spent rendering a report template.",
+    ["template"],
+    buckets=RENDER_BUCKETS,
+)
+SLACK_REQUEST_SECONDS = Histogram(
+    "slack_request_seconds",
+    "Slack Web API call latency.",
+    ["method"],
+    buckets=LATENCY_BUCKETS,
+)
+SLACK_RATE_LIMITED = Counter(
+    "slack_rate_limited_total",
+    "Slack Web API calls answered with HTTP 429.",
+    ["method"],
+)
+
+
+@contextmanager
+def observe_mist(method: str, endpoint: str):
+    """Time one Mist request; the caller sets `status` on the yielded dict."""
+
+    outcome = {"status": "error"}
+    started = time.monotonic()
+    try:
+        yield outcome
+    finally:
+        MIST_REQUEST_SECONDS.labels(method, endpoint).observe(
+            time.monotonic() - started
+        )
+        MIST_RESPONSES.labels(method, endpoint, str(outcome["status"])).inc()
+
+
+def track_queue(name: str, depth, running=None):
+    """Report a queue's depth (and busy workers) whenever /metrics is scraped."""
+
+    REPORT_QUEUE_DEPTH.labels(name).set_function(depth)
+    if running is not None:
+        REPORT_QUEUE_RUNNING.labels(name).set_function(running)
+
+
+# -----------------------------------------------------------------------------
+# Exporter
+# -----------------------------------------------------------------------------
+def serve_metrics(port: int = DEFAULT_METRICS_PORT, addr: str = DEFAULT_METRICS_ADDR):
+    """Serve /metrics on a daemon thread; a port of 0 leaves it off."""
+
+    if not port:
+        return None
+
+    server = start_http_server(port, addr)
+    logger.info("serving Prometheus metrics on %s:%s/metrics", addr, port)
+
+    return server
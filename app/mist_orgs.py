@@ -0,0 +1,216 @@
+"""Multi-org configuration: one isolated Mist client and worker pool per org."""
+
+# Standard library
+import json
+import logging
+import os
+from typing import Dict, Iterator, List, Optional
+
+# Third Party
+from pydantic import BaseModel
+
+# Local
+from marvis_trends import MarvisTrends
+from mist_cache import DEFAULT_CACHE_MAXSIZE, ResponseCache
+from mist_async import AsyncMistApi
+from mist_helper import MistApi
+from mist_ratelimit import DEFAULT_HOURLY_BUDGET, RateLimiter
+from mist_resilience import BreakerBoard
+from mist_shared import shared_cache_backend
+from mist_session import DEFAULT_POOL_MAXSIZE, SessionPool
+from report_queue import DEFAULT_REPORT_QUEUE_SIZE, DEFAULT_REPORT_WORKERS, ReportQueue
+from site_index import SiteIndex
+
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------
+# Routing parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+# answer unmapped channels with the default org; off by default, since with
+# several customers' orgs it would show one customer's data in any channel
+DEFAULT_CHANNEL_FALLBACK = os.environ.get("MIST_CHANNEL_FALLBACK", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+
+# -----------------------------------------------------------------------------
+# Org configuration
+# -----------------------------------------------------------------------------
+class OrgConfig(BaseModel):
+    """One Mist organization served by the bot, and its share of resources."""
+
+    name: str
+    org_id: str
+    api_token: str
+    baseurl: Optional[str] = "api.mist.com/api/v1"
+    # Slack channels routed to this org; the first one receives its reports
+    channels: List[str] = []
+    hourly_budget: int = DEFAULT_HOURLY_BUDGET
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE
+    workers: int = DEFAULT_REPORT_WORKERS
+    queue_size: int = DEFAULT_REPORT_QUEUE_SIZE
+    cache_size: int = DEFAULT_CACHE_MAXSIZE
+    schedule_sites: List[str] = []
+
+
+def load_org_configs(environ=os.environ) -> List[OrgConfig]:
+    """Read the orgs from MIST_ORGS_FILE or MIST_ORGS (a JSON list).
+
+    Without either, the single org of MIST_ORG_ID/MIST_API_TOKEN is served
+    on SLACK_CHANNEL, exactly as before.
+    """
+
+    raw = environ.get("MIST_ORGS")
+    if environ.get("MIST_ORGS_FILE"):
+        with open(environ["MIST_ORGS_FILE"], encoding="utf-8") as config_file:
+            raw = config_file.read()
+
+    if raw:
+        return [OrgConfig(**each) for each in json.loads(raw)]
+
+    channel = environ.get("SLACK_CHANNEL")
+    sites = environ.get("MIST_SCHEDULE_SITES", "")
+
+    return [
+        OrgConfig(
+            name="default",
+            org_id=environ.get("MIST_ORG_ID") or "",
+            api_token=environ.get("MIST_API_TOKEN") or "",
+            channels=[channel] if channel else [],
+            schedule_sites=[each for each in sites.split(",") if each],
+        )
+    ]
+
+
+# -----------------------------------------------------------------------------
+# Org runtime
+# -----------------------------------------------------------------------------
+class Org:
+    """Everything one org owns, so a noisy org cannot starve the others.
+
+    Each org gets its own keep-alive pool, hourly rate-limit budget,
+    circuit breakers, response cache (keyed under the org's namespace)
+    and report workers, plus its own site index and Marvis trends.
+    """
+
+    def __init__(self, config: OrgConfig, default_channel: Optional[str] = None):
+        self.config = config
+        self.name = config.name
+        self.org_id = config.org_id
+        self.channel = (config.channels or [default_channel])[0]
+        self.mist = MistApi(
+            api_token=config.api_token,
+            baseurl=config.baseurl,
+            namespace=config.name,
+            pool=SessionPool(pool_maxsize=config.pool_maxsize),
+            limiter=RateLimiter(hourly_budget=config.hourly_budget),
+            cache=ResponseCache(maxsize=config.cache_size, shared=shared_cache_backend),
+            breakers=BreakerBoard(),
+        )
+        self.reports = ReportQueue(
+            workers=config.workers,
+            maxsize=config.queue_size,
+            name=f"reports-{config.name}",
+        )
+        self.site_index = SiteIndex()
+        self.marvis_trends = MarvisTrends()
+        self._async_mist: Optional[AsyncMistApi] = None
+
+    @property
+    def async_mist(self) -> AsyncMistApi:
+        """Asyncio client of the org, sharing the sync one's budget, breakers and cache."""
+
+        if self._async_mist is None:
+            self._async_mist = AsyncMistApi(
+                api_token=self.config.api_token,
+                baseurl=self.config.baseurl,
+                namespace=self.name,
+                limiter=self.mist.limiter,
+                cache=self.mist.cache,
+                breakers=self.mist.breakers,
+                limit_per_host=self.config.pool_maxsize,
+            )
+
+        return self._async_mist
+
+    def __repr__(self):
+        return f"Org(name={self.name!r}, org_id={self.org_id!r})"
+
+
+class OrgRegistry:
+    """The orgs served by this process, looked up by name, org id or channel."""
+
+    def __init__(
+        self,
+        configs: List[OrgConfig],
+        default_channel: Optional[str] = None,
+        fallback: bool = DEFAULT_CHANNEL_FALLBACK,
+    ):
+        if not configs:
+            raise ValueError("at least one Mist org must be configured")
+
+        self.orgs: Dict[str, Org] = {}
+        self._by_org_id: Dict[str, Org] = {}
+        self._by_channel: Dict[str, Org] = {}
+        for config in configs:
+            org = Org(config, default_channel)
+            self.orgs[org.name] = org
+            self._by_org_id[org.org_id] = org
+            for channel in config.channels:
+                self._by_channel[channel] = org
+
+        self.default = next(iter(self.orgs.values()))
+        self.fallback = fallback
+        logger.info("serving %s Mist org(s): %s", len(self.orgs), ", ".join(self.orgs))
+
+    def __iter__(self) -> Iterator[Org]:
+        return iter(self.orgs.values())
+
+    def __len__(self):
+        return len(self.orgs)
+
+    def get(self, name: Optional[str]) -> Org:
+        """Org called `name`, or the default one."""
+        return self.orgs.get(name or "", self.default)
+
+    def for_org_id(self, org_id: Optional[str]) -> Optional[Org]:
+        """Org with Mist id `org_id`, or None if we do not serve it.
+
+        Unlike channels, alarms never fall back to the default org: that
+        would post one customer's alarms into another's channel.
+        """
+        return self._by_org_id.get(org_id or "")
+
+    def for_request(self, body: dict) -> Optional[Org]:
+        """Org of a Slack request: by channel for slash commands, by the
+        `org` carried in `private_metadata` for modal interactions.
+
+        Returns None when the request cannot be routed to one of our orgs.
+        """
+
+        if "channel_id" in body:
+            return self.for_channel(body["channel_id"])
+
+        metadata = (body.get("view") or {}).get("private_metadata") or ""
+        try:
+            name = json.loads(metadata).get("org")
+        except (ValueError, AttributeError):
+            name = None
+
+        if name in self.orgs:
+            return self.orgs[name]
+
+        return self.default if self.fallback else None
+
+    def for_channel(self, channel_id: Optional[str]) -> Optional[Org]:
+        """Org routed to a Slack channel, or None if the channel is not mapped.
+
+        With `fallback`, unmapped channels get the default org instead.
+        """
+        return self._by_channel.get(
+            channel_id or "", self.default if self.fallback else None
+        )
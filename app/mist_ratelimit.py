@@ -0,0 +1,149 @@
+"""Client-side token bucket keeping us inside the Mist hourly API budget."""
+
+# Standard library
+import email.utils
+import os
+import threading
+import time
+from typing import Optional
+
+
+# -----------------------------------------------------------------------------
+# Budget parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+DEFAULT_HOURLY_BUDGET = int(os.environ.get("MIST_HOURLY_BUDGET", "5000"))
+DEFAULT_BACKGROUND_RESERVE = float(os.environ.get("MIST_BACKGROUND_RESERVE", "0.2"))
+DEFAULT_MAX_WAIT = float(os.environ.get("MIST_RATE_LIMIT_MAX_WAIT", "10"))
+
+# request priorities
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+
+class MistRateLimited(Exception):
+    """Raised when a Mist call cannot be scheduled within its wait budget."""
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Turn a Retry-After header (seconds or HTTP date) into seconds."""
+
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, when.timestamp() - time.time())
+
+
+# -----------------------------------------------------------------------------
+# Token bucket scheduler
+# -----------------------------------------------------------------------------
+class RateLimiter:
+    """Token bucket refilled at the hourly budget rate.
+
+    Interactive calls may drain the bucket; background calls only run
+    while more than `background_reserve` of it is left and no interactive
+    caller is waiting, so Slack users always get served first. A 429 from
+    Mist pauses everyone until its Retry-After has passed.
+    """
+
+    def __init__(
+        self,
+        hourly_budget: int = DEFAULT_HOURLY_BUDGET,
+        background_reserve: float = DEFAULT_BACKGROUND_RESERVE,
+        max_wait: float = DEFAULT_MAX_WAIT,
+    ):
+        self.capacity = float(hourly_budget)
+        self.rate = hourly_budget / 3600.0
+        self.reserve = self.capacity * background_reserve
+        self.max_wait = max_wait
+        self.throttled = 0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._interactive_waiting = 0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        """Top the bucket up for the time elapsed since the last refill."""
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def _ready(self, priority, now):
+        """Return how long `priority` must wait for a token, 0 when it may go."""
+
+        if now < self._blocked_until:
+            return self._blocked_until - now
+
+        floor = 1.0
+        if priority == BACKGROUND:
+            if self._interactive_waiting:
+                return 0.05
+            floor += self.reserve
+
+        if self._tokens >= floor:
+            return 0.0
+
+        return (floor - self._tokens) / self.rate
+
+    def acquire(self, priority: str = INTERACTIVE, max_wait: Optional[float] = None):
+        """Take one token, waiting at most `max_wait` seconds for it."""
+
+        max_wait = self.max_wait if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+
+        with self._cond:
+            if priority == INTERACTIVE:
+                self._interactive_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = self._ready(priority, now)
+                    if wait <= 0:
+                        self._tokens -= 1
+                        return
+                    if now + wait > deadline:
+                        raise MistRateLimited(
+                            f"Mist API budget exhausted, next {priority} slot in {wait:.0f}s"
+                        )
+                    self._cond.wait(wait)
+            finally:
+                if priority == INTERACTIVE:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Hold every caller back for `seconds`, as asked by a 429."""
+
+        with self._cond:
+            self.throttled += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = min(self._tokens, 0.0)
+
+    def budget(self) -> dict:
+        """Report the calls left in the bucket and any active back-off."""
+
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                "remaining": int(self._tokens),
+                "capacity": int(self.capacity),
+                "blocked_for": round(max(0.0, self._blocked_until - now), 1),
+                "throttled": self.throttled,
+            }
+
+
+# process-wide limiter used by MistApi unless a client is handed its own
+default_limiter = RateLimiter()
@@ -0,0 +1,158 @@
+"""Retry with jittered backoff and per-endpoint circuit breakers for Mist."""
+
+# Standard library
+import os
+import random
+import threading
+import time
+from typing import Dict
+
+
+# -----------------------------------------------------------------------------
+# Resilience parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+DEFAULT_RETRY_ATTEMPTS = int(os.environ.get("MIST_RETRY_ATTEMPTS", "3"))
+DEFAULT_RETRY_BASE = float(os.environ.get("MIST_RETRY_BASE", "0.25"))
+DEFAULT_RETRY_CAP = float(os.environ.get("MIST_RETRY_CAP", "4"))
+DEFAULT_DEADLINE = float(os.environ.get("MIST_CALL_DEADLINE", "20"))
+DEFAULT_BREAKER_THRESHOLD = int(os.environ.get("MIST_BREAKER_THRESHOLD", "5"))
+DEFAULT_BREAKER_RESET = float(os.environ.get("MIST_BREAKER_RESET", "30"))
+
+# only these are safe to send twice
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an endpoint whose breaker is open."""
+
+
+# -----------------------------------------------------------------------------
+# Retry policy
+# -----------------------------------------------------------------------------
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by an overall deadline."""
+
+    def __init__(
+        self,
+        attempts: int = DEFAULT_RETRY_ATTEMPTS,
+        base: float = DEFAULT_RETRY_BASE,
+        cap: float = DEFAULT_RETRY_CAP,
+        deadline: float = DEFAULT_DEADLINE,
+    ):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+        self.deadline = deadline
+
+    def attempts_for(self, method: str) -> int:
+        """Number of tries allowed for an HTTP method."""
+        return self.attempts if method.upper() in IDEMPOTENT_METHODS else 1
+
+    def backoff(self, attempt: int) -> float:
+        """Seconds to sleep after failed attempt number `attempt` (1-based)."""
+        return random.uniform(0, min(self.cap, self.base * 2 ** (attempt - 1)))
+
+
+# -----------------------------------------------------------------------------
+# Circuit breakers
+# -----------------------------------------------------------------------------
+class CircuitBreaker:
+    """Closed → open after `threshold` straight failures → half-open after
+    `reset_timeout`, where a single trial call decides whether to close."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        threshold: int = DEFAULT_BREAKER_THRESHOLD,
+        reset_timeout: float = DEFAULT_BREAKER_RESET,
+    ):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call to this endpoint may go ahead."""
+
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+
+            if self.state == self.OPEN:
+                retry_in = self._opened_at + self.reset_timeout - time.monotonic()
+                if retry_in > 0:
+                    raise CircuitOpen(
+                        f"Mist endpoint {self.name} is failing, retrying in {retry_in:.0f}s"
+                    )
+                self.state = self.HALF_OPEN
+
+            if self._trial_running:
+                raise CircuitOpen(f"Mist endpoint {self.name} is being probed")
+            self._trial_running = True
+
+    def abandon(self):
+        """Give up a trial call that ended without telling us anything."""
+
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        """Close the breaker after a healthy response."""
+
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        """Count a failure, opening the breaker once the threshold is hit."""
+
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class BreakerBoard:
+    """One circuit breaker per endpoint template, created on first use."""
+
+    def __init__(
+        self,
+        threshold: int = DEFAULT_BREAKER_THRESHOLD,
+        reset_timeout: float = DEFAULT_BREAKER_RESET,
+    ):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, template: str) -> CircuitBreaker:
+        """Return the breaker guarding an endpoint template."""
+
+        with self._lock:
+            breaker = self._breakers.get(template)
+            if breaker is None:
+                breaker = self._breakers[template] = CircuitBreaker(
+                    template, self.threshold, self.reset_timeout
+                )
+
+        return breaker
+
+    def states(self) -> Dict[str, str]:
+        """Map every known endpoint template to its breaker state."""
+        return {name: breaker.state for name, breaker in self._breakers.items()}
+
+
+# process-wide policy and breakers used by MistApi unless handed its own
+default_retry = RetryPolicy()
+default_breakers = BreakerBoard()
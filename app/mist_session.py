@@ -0,0 +1,98 @@
+"""Pooled HTTP sessions shared by every Mist API client in the process."""
+
+# Standard library
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Third Party
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# -----------------------------------------------------------------------------
+# Pool parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+DEFAULT_POOL_MAXSIZE = int(os.environ.get("MIST_POOL_MAXSIZE", "10"))
+DEFAULT_CONNECT_TIMEOUT = float(os.environ.get("MIST_CONNECT_TIMEOUT", "3.05"))
+DEFAULT_READ_TIMEOUT = float(os.environ.get("MIST_READ_TIMEOUT", "30"))
+
+
+# -----------------------------------------------------------------------------
+# Session pool
+# -----------------------------------------------------------------------------
+class SessionPool:
+    """Hand out one keep-alive `requests.Session` per host.
+
+    Every session mounts an `HTTPAdapter` sized for its host, so concurrent
+    handlers reuse warm TCP/TLS connections instead of dialing api.mist.com
+    for every report.
+    """
+
+    def __init__(
+        self,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        host_pool_sizes: Optional[Dict[str, int]] = None,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+    ):
+        self.pool_maxsize = pool_maxsize
+        self.host_pool_sizes = dict(host_pool_sizes or {})
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """Default (connect, read) timeout tuple passed to requests."""
+        return (self.connect_timeout, self.read_timeout)
+
+    def pool_size(self, host: str) -> int:
+        """Return the connection pool size configured for a host."""
+        return self.host_pool_sizes.get(host, self.pool_maxsize)
+
+    def session(self, url: str) -> requests.Session:
+        """Return the shared session for the host of `url`."""
+
+        host = urlsplit(url).netloc
+        session = self._sessions.get(host)
+        if session is not None:
+            return session
+
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                size = self.pool_size(host)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[host] = session
+
+        return session
+
+    def close(self):
+        """Close every pooled session and drop their connections."""
+
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+def _host_pool_sizes_from_env() -> Dict[str, int]:
+    """Parse MIST_HOST_POOL_SIZES, e.g. `api.mist.com=20,api.eu.mist.com=5`."""
+
+    sizes = {}
+    for item in os.environ.get("MIST_HOST_POOL_SIZES", "").split(","):
+        if "=" in item:
+            host, size = item.split("=", 1)
+            sizes[host.strip()] = int(size)
+
+    return sizes
+
+
+# process-wide pool used by MistApi unless a client is handed its own
+default_pool = SessionPool(host_pool_sizes=_host_pool_sizes_from_env())
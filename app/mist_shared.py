@@ -0,0 +1,251 @@
+"""Cache and lock backend shared between replicas, with lease-based leadership."""
+
+# Standard library
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------
+# Backend parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+# redis://host:6379/0 (or any Redis-compatible server); empty keeps everything
+# in this process, as a single replica needs
+DEFAULT_SHARED_URL = os.environ.get("MIST_SHARED_URL", "")
+DEFAULT_SHARED_PREFIX = os.environ.get("MIST_SHARED_PREFIX", "mistbot:")
+DEFAULT_LEASE_TTL = float(os.environ.get("MIST_LEASE_TTL", "30"))
+REPLICA_ID = (
+    os.environ.get("MIST_REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}"
+)
+
+# take the lease if it is free, or extend it if we already own it
+ACQUIRE_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if owner == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+if not owner then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+# -----------------------------------------------------------------------------
+# Backends
+# -----------------------------------------------------------------------------
+class LocalBackend:
+    """In-process backend: values and leases live in this process only.
+
+    With a single replica every lease is simply granted, so background
+    jobs behave exactly as they did before leadership existed.
+    """
+
+    shared = False
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[bytes, float]] = {}
+        self._leases: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Value stored under `key`, None once it expired."""
+
+        with self._lock:
+            value, expires = self._values.get(key, (None, 0.0))
+            if value is not None and expires <= time.monotonic():
+                del self._values[key]
+                return None
+
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float):
+        """Store `value` for `ttl` seconds."""
+
+        with self._lock:
+            self._values[key] = (value, time.monotonic() + ttl)
+
+    def acquire(self, key: str, owner: str, ttl: float) -> bool:
+        """Take or extend the lease `key` for `owner`; False if someone else holds it."""
+
+        now = time.monotonic()
+        with self._lock:
+            holder, expires = self._leases.get(key, (None, 0.0))
+            if holder not in (None, owner) and expires > now:
+                return False
+            self._leases[key] = (owner, now + ttl)
+
+        return True
+
+    def release(self, key: str, owner: str):
+        """Give the lease `key` up if `owner` holds it."""
+
+        with self._lock:
+            if self._leases.get(key, (None, 0.0))[0] == owner:
+                del self._leases[key]
+
+
+class RedisBackend:
+    """Backend on a Redis-compatible server, shared by every replica.
+
+    `client` is a `redis.Redis` or anything speaking its API (a local
+    `fakeredis` works as a stand-in). Keys are prefixed with `prefix` so
+    several deployments can share one server.
+    """
+
+    shared = True
+
+    def __init__(self, client, prefix: str = DEFAULT_SHARED_PREFIX):
+        self.client = client
+        self.prefix = prefix
+        self._acquire = client.register_script(ACQUIRE_SCRIPT)
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = DEFAULT_SHARED_PREFIX):
+        """Connect to `url`; needs the optional `redis` package."""
+
+        # Third Party
+        import redis  # pylint: disable=import-outside-toplevel
+
+        return cls(redis.Redis.from_url(url), prefix)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Value stored under `key`, None once it expired."""
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        """Store `value` for `ttl` seconds."""
+        self.client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    def acquire(self, key: str, owner: str, ttl: float) -> bool:
+        """Take or extend the lease `key` for `owner`; False if someone else holds it."""
+
+        granted = self._acquire(
+            keys=[self.prefix + key], args=[owner, max(1, int(ttl * 1000))]
+        )
+
+        return bool(granted)
+
+    def release(self, key: str, owner: str):
+        """Give the lease `key` up if `owner` holds it."""
+        self._release(keys=[self.prefix + key], args=[owner])
+
+
+def backend_from_url(url: str = DEFAULT_SHARED_URL):
+    """Build the backend configured by MIST_SHARED_URL."""
+
+    if not url:
+        return LocalBackend()
+
+    logger.info("sharing cache and leases through %s", url.split("@")[-1])
+
+    return RedisBackend.from_url(url)
+
+
+# -----------------------------------------------------------------------------
+# Leases
+# -----------------------------------------------------------------------------
+class Lease:
+    """Leadership of one background job, held by a single replica at a time.
+
+    `held()` takes the lease when it is free and renews it every third of
+    its `ttl`; jobs call it at least that often (or sleep through `wait`),
+    so the leader keeps it while alive and another replica takes over
+    within `ttl` seconds of it dying. When the backend cannot
+    be reached, the lease is kept only until the last grant runs out.
+    """
+
+    def __init__(
+        self,
+        backend,
+        name: str,
+        owner: str = REPLICA_ID,
+        ttl: float = DEFAULT_LEASE_TTL,
+    ):
+        self.backend = backend
+        self.key = f"lease:{name}"
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.renew_interval = ttl / 3
+        self._held = False
+        self._checked_at: Optional[float] = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def held(self) -> bool:
+        """True while this replica leads `name`."""
+
+        now = time.monotonic()
+        with self._lock:
+            if (
+                self._checked_at is not None
+                and now < self._checked_at + self.renew_interval
+            ):
+                return self._held
+
+            try:
+                granted = self.backend.acquire(self.key, self.owner, self.ttl)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning("renewing lease %s failed: %s", self.name, error)
+                granted = now < self._expires
+            else:
+                if granted:
+                    self._expires = now + self.ttl
+
+            if granted != self._held:
+                logger.info(
+                    "%s %s the lead of %s",
+                    self.owner,
+                    "took" if granted else "lost",
+                    self.name,
+                )
+            self._held, self._checked_at = granted, now
+
+            return granted
+
+    def wait(self, seconds: float):
+        """Sleep `seconds`, renewing the lease every `renew_interval` meanwhile.
+
+        Jobs whose interval outlasts the `ttl` sleep through this, so the
+        leader never lets its lease lapse between two runs.
+        """
+
+        deadline = time.monotonic() + seconds
+        while True:
+            self.held()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, self.renew_interval))
+
+    def release(self):
+        """Step down so another replica can take over straight away."""
+
+        with self._lock:
+            if self._held:
+                self.backend.release(self.key, self.owner)
+            self._held, self._checked_at, self._expires = False, None, 0.0
+
+
+# process-wide backend used for shared caches and leases
+default_backend = backend_from_url()
+
+# backend response caches publish to, None while nothing is shared
+shared_cache_backend = default_backend if default_backend.shared else None
@@ -0,0 +1,123 @@
+"""Collapse identical concurrent Mist requests into one upstream call."""
+
+# Standard library
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+# Local
+from mist_metrics import SINGLE_FLIGHT_CALLS
+
+
+# -----------------------------------------------------------------------------
+# In-flight calls
+# -----------------------------------------------------------------------------
+class _Call:
+    """One upstream call that followers wait on."""
+
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+# -----------------------------------------------------------------------------
+# Single-flight group
+# -----------------------------------------------------------------------------
+class SingleFlight:
+    """Run at most one call per key at a time and share its outcome.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait and receive the same result, or the
+    same exception.
+    """
+
+    def __init__(self):
+        self.stats = {"calls": 0, "leaders": 0, "collapsed": 0}
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]):
+        """Return `fn()`, sharing it with concurrent callers using `key`."""
+
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self.stats["collapsed"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats["leaders"] += 1
+                leader = True
+        SINGLE_FLIGHT_CALLS.labels("leader" if leader else "collapsed").inc()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        """Number of keys currently being fetched."""
+        return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """`SingleFlight` for coroutines sharing one event loop.
+
+    The upstream call runs as a task of its own that every caller, the
+    leader included, awaits through `asyncio.shield`: a caller that is
+    cancelled stops waiting without cancelling the call for the others.
+    """
+
+    def __init__(self):
+        self.stats = {"calls": 0, "leaders": 0, "collapsed": 0}
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]):
+        """Return `await fn()`, sharing it with concurrent callers using `key`."""
+
+        self.stats["calls"] += 1
+        call = self._calls.get(key)
+        if call is not None:
+            self.stats["collapsed"] += 1
+            SINGLE_FLIGHT_CALLS.labels("collapsed").inc()
+        else:
+            self.stats["leaders"] += 1
+            SINGLE_FLIGHT_CALLS.labels("leader").inc()
+            call = self._calls[key] = asyncio.ensure_future(fn())
+            call.add_done_callback(lambda done: self._forget(key, done))
+
+        return await asyncio.shield(call)
+
+    def _forget(self, key: Hashable, call: asyncio.Future):
+        """Drop a finished call, retrieving its error if nobody waited for it."""
+
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.cancelled():
+            call.exception()
+
+    def in_flight(self) -> int:
+        """Number of keys currently being fetched."""
+        return len(self._calls)
+
+
+# process-wide group used by MistApi unless a client is handed its own
+default_flight = SingleFlight()
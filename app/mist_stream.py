@@ -0,0 +1,240 @@
+"""Real-time alarm ingestion over the Mist WebSocket streaming API."""
+
+# Standard library
+import asyncio
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+# Third Party
+import aiohttp
+
+# Local
+from mist_helper import parse_alarms
+from mist_json import loads
+from mist_resilience import RetryPolicy
+
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------
+# Stream parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+DEFAULT_STREAM_URL = os.environ.get("MIST_STREAM_URL")
+DEFAULT_STREAM_CHANNELS = os.environ.get("MIST_STREAM_CHANNELS", "")
+DEFAULT_HEARTBEAT = float(os.environ.get("MIST_STREAM_HEARTBEAT", "30"))
+# how often the channel list is checked for sites added or removed
+DEFAULT_RESYNC_INTERVAL = float(os.environ.get("MIST_STREAM_RESYNC", "60"))
+DEFAULT_BACKOFF_BASE = float(os.environ.get("MIST_STREAM_BACKOFF_BASE", "1"))
+DEFAULT_BACKOFF_CAP = float(os.environ.get("MIST_STREAM_BACKOFF_CAP", "60"))
+# alarm ids remembered to drop the updates Mist sends for known alarms
+SEEN_ALARMS = 10000
+
+
+def stream_url(baseurl: str) -> str:
+    """Map a REST base URL (https://api.mist.com/api/v1) to its stream URL."""
+
+    host = urlsplit(baseurl).hostname or "api.mist.com"
+    if host.startswith("api."):
+        host = "api-ws." + host[len("api.") :]
+
+    return f"wss://{host}/api-ws/v1/stream"
+
+
+def site_alarm_channels(site_ids: Iterable[str]) -> List[str]:
+    """Alarm channel of every site."""
+    return [f"/sites/{site_id}/alarms" for site_id in site_ids]
+
+
+# -----------------------------------------------------------------------------
+# Alarm stream
+# -----------------------------------------------------------------------------
+class MistStream:
+    """Persistent WebSocket subscription to Mist alarm channels.
+
+    Subscribes to every channel from `channels()` and re-checks that list
+    every `resync` seconds, so sites that come and go are followed
+    without reconnecting. Alarm events are parsed like `alarms/search`
+    results, deduped on id and handed to `on_alarms(alarms)`. Dropped
+    connections are retried forever with jittered exponential backoff.
+
+    With a `lease`, only the replica holding it stays connected; the
+    others wait to take over, so each alarm is pushed once.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        api_token: str,
+        channels: Callable[[], Iterable[str]],
+        on_alarms: Callable[[List], None],
+        heartbeat: float = DEFAULT_HEARTBEAT,
+        resync: float = DEFAULT_RESYNC_INTERVAL,
+        backoff: Optional[RetryPolicy] = None,
+        lease=None,
+    ):
+        self.url = url
+        self.headers = {"Authorization": f"Token {api_token}"}
+        self.channels = channels
+        self.on_alarms = on_alarms
+        self.heartbeat = heartbeat
+        self.resync = resync
+        self.backoff = backoff or RetryPolicy(
+            base=DEFAULT_BACKOFF_BASE, cap=DEFAULT_BACKOFF_CAP
+        )
+        self.lease = lease
+        self.subscribed = set()
+        self.connected = False
+        self.stats = {
+            "connects": 0,
+            "messages": 0,
+            "alarms": 0,
+            "duplicates": 0,
+            "failed": 0,
+        }
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._stopping = False
+
+    async def run(self):
+        """Stay connected until `stop()`, reconnecting with backoff."""
+
+        failures = 0
+        async with aiohttp.ClientSession() as session:
+            while not self._stopping:
+                if not self._leading():
+                    await asyncio.sleep(self.lease.renew_interval)
+                    continue
+
+                try:
+                    await self._session(session)
+                    failures = 0
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as error:
+                    failures += 1
+                    logger.warning("Mist stream dropped: %s", error)
+                except Exception:  # pylint: disable=broad-except
+                    # anything else is a failed connection too: back off and
+                    # reconnect rather than end the stream thread
+                    failures += 1
+                    logger.exception("Mist stream failed")
+                finally:
+                    self.connected = False
+                    self.subscribed = set()
+
+                if not self._stopping:
+                    await asyncio.sleep(self.backoff.backoff(max(failures, 1)))
+
+    async def _session(self, session):
+        """Hold one connection: subscribe, then dispatch messages until it closes."""
+
+        async with session.ws_connect(
+            self.url, headers=self.headers, heartbeat=self.heartbeat
+        ) as websocket:
+            self.connected = True
+            self.stats["connects"] += 1
+            await self._sync_channels(websocket)
+
+            while not self._stopping:
+                if not self._leading():
+                    # another replica streams now
+                    return
+
+                try:
+                    message = await websocket.receive(timeout=self._timeout())
+                except asyncio.TimeoutError:
+                    await self._sync_channels(websocket)
+                    continue
+
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    self._receive(message.data)
+                elif message.type in (
+                    aiohttp.WSMsgType.CLOSE,
+                    aiohttp.WSMsgType.CLOSED,
+                    aiohttp.WSMsgType.ERROR,
+                ):
+                    raise aiohttp.ClientConnectionError(
+                        f"stream closed ({websocket.close_code})"
+                    )
+
+    def _leading(self) -> bool:
+        """True unless a lease is given and another replica holds it."""
+        return self.lease is None or self.lease.held()
+
+    def _timeout(self) -> float:
+        """Longest wait for a message before resyncing or renewing the lease."""
+        return (
+            self.resync
+            if self.lease is None
+            else min(self.resync, self.lease.renew_interval)
+        )
+
+    async def _sync_channels(self, websocket):
+        """Subscribe to new channels and leave those no longer wanted."""
+
+        wanted = set(self.channels())
+        for channel in sorted(wanted - self.subscribed):
+            await websocket.send_json({"subscribe": channel})
+        for channel in sorted(self.subscribed - wanted):
+            await websocket.send_json({"unsubscribe": channel})
+        self.subscribed = wanted
+
+    def _receive(self, data: str):
+        """Dispatch one frame; a bad frame or a failing handler only costs that frame."""
+
+        try:
+            self._dispatch(loads(data))
+        except Exception:  # pylint: disable=broad-except
+            self.stats["failed"] += 1
+            logger.exception("Mist stream: skipping a message")
+
+    def _dispatch(self, message: dict):
+        """Turn one stream message into fresh alarms for `on_alarms`."""
+
+        if message.get("event") != "data":
+            logger.debug("Mist stream %s", message)
+            return
+
+        self.stats["messages"] += 1
+        data = message.get("data")
+        if isinstance(data, (str, bytes)):
+            data = loads(data)
+        raw_alarms = data if isinstance(data, list) else [data]
+
+        try:
+            alarms = parse_alarms(raw_alarms)
+        except ValueError as error:
+            logger.warning(
+                "Mist stream: skipping %s: %s", message.get("channel"), error
+            )
+            return
+
+        fresh = []
+        for alarm in alarms:
+            if alarm.id in self._seen:
+                self.stats["duplicates"] += 1
+                continue
+            self._seen[alarm.id] = None
+            if len(self._seen) > SEEN_ALARMS:
+                self._seen.popitem(last=False)
+            fresh.append(alarm)
+
+        if fresh:
+            self.stats["alarms"] += len(fresh)
+            self.on_alarms(fresh)
+
+    def stop(self):
+        """Ask `run()` to return after the current message."""
+        self._stopping = True
+
+    def start(self) -> threading.Thread:
+        """Run the stream on its own event loop in a daemon thread."""
+
+        thread = threading.Thread(
+            target=asyncio.run, args=(self.run(),), name="mist-stream", daemon=True
+        )
+        thread.start()
+
+        return thread
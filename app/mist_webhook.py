@@ -0,0 +1,301 @@
+"""Mist webhook receiver: signed alarm/event payloads batched into few posts."""
+
+# Standard library
+import hashlib
+import hmac
+import logging
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Mapping, Optional
+
+# Local
+from mist_helper import AlarmRecord
+from mist_json import loads
+
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------
+# Receiver parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+DEFAULT_WEBHOOK_PORT = int(os.environ.get("MIST_WEBHOOK_PORT", "0"))
+DEFAULT_WEBHOOK_PATH = os.environ.get("MIST_WEBHOOK_PATH", "/mist/webhook")
+DEFAULT_WEBHOOK_SECRET = os.environ.get("MIST_WEBHOOK_SECRET", "")
+# unsigned deliveries are refused unless explicitly allowed (e.g. behind a
+# proxy that authenticates Mist itself)
+DEFAULT_WEBHOOK_ALLOW_UNSIGNED = os.environ.get(
+    "MIST_WEBHOOK_ALLOW_UNSIGNED", "false"
+).lower() in ("1", "true", "yes")
+DEFAULT_WEBHOOK_WINDOW = float(os.environ.get("MIST_WEBHOOK_WINDOW", "10"))
+DEFAULT_WEBHOOK_BATCH_MAX = int(os.environ.get("MIST_WEBHOOK_BATCH_MAX", "2000"))
+MAX_BODY = 1024 * 1024
+# alarm ids remembered to drop webhook retries of deliveries already taken
+SEEN_ALARMS = 10000
+
+# device event types that mean a device went away
+DISCONNECT_EVENTS = ("AP_DISCONNECTED", "SW_DISCONNECTED", "GW_DISCONNECTED")
+
+
+# -----------------------------------------------------------------------------
+# Signatures
+# -----------------------------------------------------------------------------
+def verify_signature(secret: str, body: bytes, headers: Mapping[str, str]) -> bool:
+    """Check the HMAC Mist signs each delivery with.
+
+    `X-Mist-Signature-v2` carries a hex HMAC-SHA256 of the raw body; older
+    deployments only send the HMAC-SHA1 `X-Mist-Signature`.
+    """
+
+    for header, digest in (
+        ("X-Mist-Signature-v2", hashlib.sha256),
+        ("X-Mist-Signature", hashlib.sha1),
+    ):
+        signature = headers.get(header)
+        if signature:
+            expected = hmac.new(secret.encode(), body, digest).hexdigest()
+            return hmac.compare_digest(expected, signature.strip().lower())
+
+    return False
+
+
+# -----------------------------------------------------------------------------
+# Payload parsing
+# -----------------------------------------------------------------------------
+def _device_event_alarm(event: dict) -> dict:
+    """Shape a device up/down event like an `alarms/search` result."""
+
+    event_type = event.get("type", "")
+    timestamp = int(event.get("timestamp") or 0)
+    disconnected = event_type in DISCONNECT_EVENTS
+
+    return {
+        "id": f"{event.get('mac')}-{event_type}-{timestamp}",
+        "count": 1,
+        "group": "infrastructure",
+        "hostnames": [event.get("device_name") or event.get("mac") or ""],
+        "last_seen": timestamp,
+        "org_id": event.get("org_id", ""),
+        "severity": "warn" if disconnected else "info",
+        "site_id": event.get("site_id", ""),
+        "timestamp": timestamp,
+        "type": "device_down" if disconnected else event_type.lower(),
+    }
+
+
+def valid_payload(payload) -> bool:
+    """True for a delivery shaped like Mist's: an object whose `events`,
+    when present, is a list of objects."""
+
+    if not isinstance(payload, dict):
+        return False
+
+    events = payload.get("events")
+    if events is None:
+        return True
+
+    return isinstance(events, list) and all(isinstance(each, dict) for each in events)
+
+
+def webhook_alarms(payload: dict) -> List[AlarmRecord]:
+    """Turn one webhook delivery into alarm records, skipping malformed events."""
+
+    topic = payload.get("topic")
+    alarms = []
+    for event in payload.get("events") or []:
+        if topic not in ("alarms", "device-updowns", "device-events"):
+            continue
+
+        try:
+            if topic == "alarms":
+                event = {
+                    "count": 1,
+                    "group": "",
+                    "hostnames": [],
+                    "last_seen": event.get("timestamp"),
+                    "org_id": payload.get("org_id", ""),
+                    **event,
+                }
+            else:
+                event = _device_event_alarm(event)
+            alarms.append(AlarmRecord(event))
+        except (TypeError, ValueError) as error:
+            logger.warning("Mist webhook: skipping %s event: %s", topic, error)
+
+    return alarms
+
+
+# -----------------------------------------------------------------------------
+# Time-windowed batching
+# -----------------------------------------------------------------------------
+class WebhookBatcher:
+    """Coalesce bursts of webhook alarms into one flush per window.
+
+    The first alarm after a quiet period opens a `window` second batch;
+    everything arriving until it closes (or until `batch_max` alarms) is
+    handed to `flush(alarms)` in one go, so a storm of hundreds of events
+    becomes a handful of Slack posts. Redelivered alarm ids are dropped.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List], None],
+        window: float = DEFAULT_WEBHOOK_WINDOW,
+        batch_max: int = DEFAULT_WEBHOOK_BATCH_MAX,
+    ):
+        self.flush = flush
+        self.window = window
+        self.batch_max = batch_max
+        self.stats = {"received": 0, "duplicates": 0, "batches": 0}
+        self._pending: List = []
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def add(self, alarms: List):
+        """Queue alarms for the current batch."""
+
+        with self._lock:
+            for alarm in alarms:
+                self.stats["received"] += 1
+                if alarm.id in self._seen:
+                    self.stats["duplicates"] += 1
+                    continue
+                self._seen[alarm.id] = None
+                if len(self._seen) > SEEN_ALARMS:
+                    self._seen.popitem(last=False)
+                self._pending.append(alarm)
+
+            full = len(self._pending) >= self.batch_max
+            if self._pending and self._timer is None and not full:
+                self._timer = threading.Timer(self.window, self.drain)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if full:
+            self.drain()
+
+    def drain(self):
+        """Flush whatever is pending now."""
+
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            batch, self._pending = self._pending, []
+
+        if batch:
+            self.stats["batches"] += 1
+            try:
+                self.flush(batch)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Mist webhook: flushing %s alarms failed", len(batch))
+
+
+# -----------------------------------------------------------------------------
+# HTTP receiver
+# -----------------------------------------------------------------------------
+class WebhookServer:
+    """Threaded HTTP endpoint receiving Mist webhook deliveries.
+
+    Deliveries are verified, parsed and queued on `batcher` before the
+    response goes out, so Mist gets its 200 straight away and never
+    retries because a Slack post was slow. Without a `secret` the receiver
+    refuses to start unless `allow_unsigned` is set, since anyone able to
+    reach it could otherwise post alarms to Slack.
+    """
+
+    def __init__(
+        self,
+        batcher: WebhookBatcher,
+        port: int = DEFAULT_WEBHOOK_PORT,
+        path: str = DEFAULT_WEBHOOK_PATH,
+        secret: str = DEFAULT_WEBHOOK_SECRET,
+        host: str = "0.0.0.0",
+        allow_unsigned: bool = DEFAULT_WEBHOOK_ALLOW_UNSIGNED,
+    ):
+        if not secret and not allow_unsigned:
+            raise ValueError(
+                "MIST_WEBHOOK_SECRET is required to receive Mist webhooks "
+                "(set MIST_WEBHOOK_ALLOW_UNSIGNED=true to accept unsigned ones)"
+            )
+
+        self.batcher = batcher
+        self.path = path
+        self.secret = secret
+        self.stats = {"accepted": 0, "rejected": 0}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.port = self.httpd.server_address[1]
+
+    def _handler(self):
+        """Build the request handler class bound to this receiver."""
+
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                logger.debug("webhook %s", format % args)
+
+            def reply(self, status: int):
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):  # noqa: N802
+                try:
+                    length = int(self.headers.get("Content-Length"))
+                except (TypeError, ValueError):
+                    length = None
+                status = receiver.receive(self.path, self.headers, self.rfile, length)
+                self.reply(status)
+
+        return Handler
+
+    def receive(self, path, headers, body_file, length) -> int:
+        """Handle one delivery and return the HTTP status to answer with.
+
+        `length` is the request's Content-Length, None when it is missing
+        or not a number.
+        """
+
+        status = 200
+        if path.split("?", 1)[0] != self.path:
+            status = 404
+        elif length is None or length < 0:
+            status = 400
+        elif length > MAX_BODY:
+            status = 413
+        else:
+            body = body_file.read(length)
+            if self.secret and not verify_signature(self.secret, body, headers):
+                status = 401
+            else:
+                try:
+                    payload = loads(body)
+                except ValueError:
+                    payload = None
+                if valid_payload(payload):
+                    self.batcher.add(webhook_alarms(payload))
+                else:
+                    status = 400
+
+        self.stats["accepted" if status == 200 else "rejected"] += 1
+
+        return status
+
+    def start(self) -> threading.Thread:
+        """Serve on a daemon thread."""
+
+        if not self.secret:
+            logger.warning(
+                "MIST_WEBHOOK_ALLOW_UNSIGNED is set, accepting unsigned webhooks"
+            )
+
+        thread = threading.Thread(
+            target=self.httpd.serve_forever, name="mist-webhook", daemon=True
+        )
+        thread.start()
+
+        return thread
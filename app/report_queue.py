@@ -0,0 +1,242 @@
+"""Bounded worker pool that runs reports off the Bolt listener threads."""
+
+# Standard library
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+# Local
+from mist_metrics import track_queue
+
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------
+# Queue parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+DEFAULT_REPORT_WORKERS = int(os.environ.get("MIST_REPORT_WORKERS", "4"))
+DEFAULT_REPORT_QUEUE_SIZE = int(os.environ.get("MIST_REPORT_QUEUE_SIZE", "50"))
+
+
+class ReportQueueFull(Exception):
+    """Raised when a report is submitted to a saturated queue."""
+
+
+class ReportCancelled(Exception):
+    """Raised inside a report whose job was cancelled while it ran."""
+
+
+# the job each worker thread is running, for reports to check cancellation
+_running = threading.local()
+
+
+def current_job() -> Optional["ReportJob"]:
+    """The job running on this thread, if it is a report worker."""
+    return getattr(_running, "job", None)
+
+
+def check_cancelled():
+    """Raise ReportCancelled if the report running here was cancelled.
+
+    Reports call this between steps (pages, sites) so a cancelled job
+    stops at the next one instead of running to the end.
+    """
+
+    job = current_job()
+    if job is not None and job.cancelled:
+        raise ReportCancelled(f"{job.name} report cancelled")
+
+
+# -----------------------------------------------------------------------------
+# Report jobs
+# -----------------------------------------------------------------------------
+class ReportJob:
+    """A queued report, with its timing and cooperative cancellation flag."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name: str, fn: Callable, args: tuple, kwargs: dict):
+        self.id = next(self._ids)
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.status = self.PENDING
+        self.error: Optional[BaseException] = None
+        self.position = 0
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        """True once cancellation was requested; see `check_cancelled`."""
+        return self._cancel.is_set()
+
+    @property
+    def wait_time(self) -> Optional[float]:
+        """Seconds spent queued before a worker picked the job up."""
+        return None if self.started_at is None else self.started_at - self.submitted_at
+
+    @property
+    def run_time(self) -> Optional[float]:
+        """Seconds the job ran for, once finished."""
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def cancel(self):
+        """Ask the job to stop; pending jobs are skipped entirely, running ones
+        stop at their next `check_cancelled()`."""
+        self._cancel.set()
+
+
+# -----------------------------------------------------------------------------
+# Report queue
+# -----------------------------------------------------------------------------
+class ReportQueue:
+    """Bounded FIFO of report jobs served by a fixed pool of worker threads."""
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_REPORT_WORKERS,
+        maxsize: int = DEFAULT_REPORT_QUEUE_SIZE,
+        name: str = "reports",
+    ):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.name = name
+        self.stats = {
+            "submitted": 0,
+            "rejected": 0,
+            "done": 0,
+            "failed": 0,
+            "cancelled": 0,
+        }
+        self._pending: Deque[ReportJob] = deque()
+        self._jobs: Dict[int, ReportJob] = {}
+        self._busy = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        track_queue(name, self.depth, self.running)
+
+    def start(self):
+        """Spawn the worker threads; called lazily on the first submission."""
+
+        with self._cond:
+            for index in range(len(self._threads), self.workers):
+                thread = threading.Thread(
+                    target=self._work, name=f"{self.name}-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, name: str, fn: Callable, *args, **kwargs) -> ReportJob:
+        """Queue `fn(*args, **kwargs)`; the job's `position` is 0 if it runs now."""
+
+        job = ReportJob(name, fn, args, kwargs)
+
+        with self._cond:
+            if len(self._pending) >= self.maxsize:
+                self.stats["rejected"] += 1
+                raise ReportQueueFull(f"{self.name} queue is full")
+
+            # jobs ahead of us that no free worker will pick up straight away
+            job.position = max(0, len(self._pending) + self._busy - self.workers + 1)
+            self._pending.append(job)
+            self._jobs[job.id] = job
+            self.stats["submitted"] += 1
+            self._cond.notify()
+
+            # checked under the lock so concurrent first submissions spawn
+            # the pool once
+            if len(self._threads) < self.workers:
+                self.start()
+
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a job by id; returns False if it already finished."""
+
+        job = self._jobs.get(job_id)
+        if job is None:
+            return False
+
+        job.cancel()
+        with self._cond:
+            if job in self._pending:
+                self._pending.remove(job)
+                self._finish(job, ReportJob.CANCELLED)
+
+        return True
+
+    def depth(self) -> int:
+        """Number of jobs waiting for a worker."""
+        return len(self._pending)
+
+    def running(self) -> int:
+        """Number of jobs being worked on right now."""
+        return self._busy
+
+    def _finish(self, job: ReportJob, status: str):
+        """Record a job's outcome and forget it."""
+
+        job.status = status
+        job.finished_at = time.monotonic()
+        self._jobs.pop(job.id, None)
+        if status in self.stats:
+            self.stats[status] += 1
+
+    def _work(self):
+        """Worker loop: take the oldest job and run it."""
+
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job = self._pending.popleft()
+                self._busy += 1
+
+            job.started_at = time.monotonic()
+            job.status = ReportJob.RUNNING
+            status = ReportJob.DONE
+
+            _running.job = job
+            try:
+                if job.cancelled:
+                    status = ReportJob.CANCELLED
+                else:
+                    job.fn(*job.args, **job.kwargs)
+            except ReportCancelled:
+                status = ReportJob.CANCELLED
+                logger.info("report %s cancelled while running", job.name)
+            except Exception as error:  # pylint: disable=broad-except
+                job.error = error
+                status = ReportJob.FAILED
+                logger.exception("report %s failed", job.name)
+            finally:
+                _running.job = None
+                with self._cond:
+                    self._busy -= 1
+                    self._finish(job, status)
+
+            logger.info(
+                "report %s #%s %s: waited %.3fs, ran %.3fs",
+                job.name,
+                job.id,
+                status,
+                job.wait_time,
+                job.run_time,
+            )
@@ -0,0 +1,253 @@
+"""Scheduler keeping automated reports rendered ahead of the button clicks."""
+
+# Standard library
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# Local
+from mist_json import dumps, loads
+from report_queue import ReportQueue, ReportQueueFull
+
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------
+# Scheduler parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+DEFAULT_SCHEDULER_WORKERS = int(os.environ.get("MIST_SCHEDULER_WORKERS", "2"))
+# a warm result older than this many intervals is recomputed on demand
+DEFAULT_WARM_INTERVALS = float(os.environ.get("MIST_WARM_INTERVALS", "2"))
+
+
+def parse_interval(spec: str) -> float:
+    """Turn "900", "15m", "6h", "1d" or a cron-style "*/15" (minutes) into seconds."""
+
+    spec = (spec or "").strip().lower()
+    if not spec:
+        return 0.0
+    if spec.startswith("*/"):
+        return float(spec[2:]) * 60
+
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if spec[-1] in units:
+        return float(spec[:-1]) * units[spec[-1]]
+
+    return float(spec)
+
+
+# -----------------------------------------------------------------------------
+# Scheduled jobs
+# -----------------------------------------------------------------------------
+class ScheduledJob:
+    """One report rendered every `interval` seconds, with its last result."""
+
+    def __init__(
+        self,
+        name: str,
+        render: Callable[[], str],
+        interval: float,
+        publish: Optional[Callable[[str], None]] = None,
+    ):
+        self.name = name
+        self.render = render
+        self.interval = interval
+        self.publish = publish
+        self.running = False
+        self.next_run = 0.0
+        self.result: Optional[str] = None
+        self.rendered_at: Optional[float] = None
+        self.last_runtime: Optional[float] = None
+        self.stats = {"runs": 0, "failures": 0, "skipped": 0, "total_runtime": 0.0}
+
+    def schedule_next(self, now: float):
+        """Align the next run to the wall clock, as cron's */N would."""
+        self.next_run = (now // self.interval + 1) * self.interval
+
+    def age(self) -> Optional[float]:
+        """Seconds since the result was rendered."""
+        return None if self.rendered_at is None else time.time() - self.rendered_at
+
+
+# -----------------------------------------------------------------------------
+# Report scheduler
+# -----------------------------------------------------------------------------
+class ReportScheduler:
+    """Run report jobs on their intervals and keep their output warm.
+
+    Due jobs are handed to a small background `ReportQueue`, never to the
+    interactive one. A job still running when it comes due again is
+    skipped for that slot, so runs of one job never overlap. Each run's
+    duration is kept on the job and logged.
+
+    With several replicas, only the holder of `lease` runs (and publishes)
+    jobs; results are put on the `shared` backend so the other replicas
+    serve them warm too.
+    """
+
+    def __init__(self, queue: Optional[ReportQueue] = None, lease=None, shared=None):
+        self.queue = queue or ReportQueue(
+            workers=DEFAULT_SCHEDULER_WORKERS, name="scheduled"
+        )
+        self.lease = lease
+        self.shared = shared
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+
+    def add(
+        self,
+        name: str,
+        render: Callable[[], str],
+        interval: float,
+        publish: Optional[Callable[[str], None]] = None,
+    ) -> Optional[ScheduledJob]:
+        """Schedule `render()` every `interval` seconds; 0 leaves it unscheduled."""
+
+        if interval <= 0:
+            return None
+
+        job = ScheduledJob(name, render, interval, publish)
+        if publish is not None:
+            # warm-only jobs run at start-up, published ones wait for their slot
+            job.schedule_next(time.time())
+        with self._lock:
+            self.jobs[name] = job
+        self._wake.set()
+
+        return job
+
+    def warm(self, name: str) -> Optional[Tuple[str, float]]:
+        """Return `(result, age in seconds)` of a job if it is fresh enough."""
+
+        job = self.jobs.get(name)
+        if job is None:
+            return None
+
+        result, rendered_at = job.result, job.rendered_at
+        shared = self._from_shared(job)
+        if shared is not None and (rendered_at is None or shared[1] > rendered_at):
+            result, rendered_at = shared
+        if result is None:
+            return None
+
+        age = time.time() - rendered_at
+        if age > job.interval * DEFAULT_WARM_INTERVALS:
+            return None
+
+        return result, age
+
+    def _from_shared(self, job: ScheduledJob) -> Optional[Tuple[str, float]]:
+        """`(result, rendered_at)` of `job` as published by the leader."""
+
+        if self.shared is None:
+            return None
+
+        try:
+            raw = self.shared.get(f"scheduled:{job.name}")
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning("reading shared %s failed: %s", job.name, error)
+            return None
+
+        return None if raw is None else tuple(loads(raw))
+
+    def run_due(self, now: Optional[float] = None):
+        """Queue every job whose time has come."""
+
+        now = time.time() if now is None else now
+        with self._lock:
+            due = [job for job in self.jobs.values() if job.next_run <= now]
+
+        # checked even when nothing is due, which keeps the lease renewed
+        leading = self.lease is None or self.lease.held()
+        for job in due:
+            job.schedule_next(now)
+            if not leading:
+                # another replica runs this slot
+                continue
+            if job.running:
+                job.stats["skipped"] += 1
+                logger.info("scheduled %s still running, skipping this slot", job.name)
+                continue
+
+            job.running = True
+            try:
+                self.queue.submit(job.name, self._run, job)
+            except ReportQueueFull:
+                job.running = False
+                job.stats["skipped"] += 1
+
+    def _run(self, job: ScheduledJob):
+        """Render one job, record its runtime and publish it if asked to."""
+
+        started = time.monotonic()
+        try:
+            result = job.render()
+        except Exception:  # pylint: disable=broad-except
+            job.stats["failures"] += 1
+            logger.exception("scheduled %s failed", job.name)
+            return
+        else:
+            job.result, job.rendered_at = result, time.time()
+            self._share(job)
+        finally:
+            job.last_runtime = time.monotonic() - started
+            job.stats["runs"] += 1
+            job.stats["total_runtime"] += job.last_runtime
+            job.running = False
+            logger.info("scheduled %s ran in %.3fs", job.name, job.last_runtime)
+
+        if job.publish is not None:
+            job.publish(result)
+
+    def _share(self, job: ScheduledJob):
+        """Publish a fresh result for the replicas that do not lead."""
+
+        if self.shared is None:
+            return
+
+        try:
+            self.shared.set(
+                f"scheduled:{job.name}",
+                dumps([job.result, job.rendered_at]),
+                job.interval * DEFAULT_WARM_INTERVALS,
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning("sharing %s failed: %s", job.name, error)
+
+    def run(self):
+        """Scheduler loop: sleep until the next job is due, then queue it.
+
+        With a lease, it also wakes every `renew_interval` to renew it.
+        """
+
+        while not self._stopping:
+            self.run_due()
+            with self._lock:
+                next_run = min(
+                    (job.next_run for job in self.jobs.values()), default=None
+                )
+            timeout = None if next_run is None else max(0.0, next_run - time.time())
+            if self.lease is not None:
+                renew = self.lease.renew_interval
+                timeout = renew if timeout is None else min(timeout, renew)
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def stop(self):
+        """End `run()` at its next wake-up."""
+
+        self._stopping = True
+        self._wake.set()
+
+    def start(self) -> threading.Thread:
+        """Run the scheduler loop on a daemon thread."""
+
+        thread = threading.Thread(target=self.run, name="scheduler", daemon=True)
+        thread.start()
+
+        return thread
@@ -0,0 +1,159 @@
+"""In-memory prefix and trigram index over site names for typeahead lookups."""
+
+# Standard library
+import bisect
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------
+# Index parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+DEFAULT_REFRESH_INTERVAL = float(os.environ.get("MIST_SITE_INDEX_REFRESH", "300"))
+
+# Slack renders at most 100 options per external_select response
+MAX_OPTIONS = 100
+
+
+def trigrams(text: str) -> Set[str]:
+    """Return the three-character shingles of a lowercased string."""
+    return {text[index : index + 3] for index in range(len(text) - 2)}
+
+
+# -----------------------------------------------------------------------------
+# Site index
+# -----------------------------------------------------------------------------
+class SiteIndex:
+    """Searchable index of site names and ids.
+
+    Names and ids are kept in sorted lists for prefix lookups with bisect,
+    and every name is shingled into trigrams so infix queries only have to
+    check a handful of candidates. Updates apply the difference against the
+    previous snapshot instead of rebuilding everything.
+    """
+
+    def __init__(self):
+        self.sites: Dict[str, str] = {}
+        self.refreshed_at = 0.0
+        self._names: List[Tuple[str, str]] = []
+        self._ids: List[str] = []
+        self._grams: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.sites)
+
+    def _add(self, site_id: str, name: str):
+        """Index one site."""
+
+        self.sites[site_id] = name
+        lowered = name.lower()
+        bisect.insort(self._names, (lowered, site_id))
+        bisect.insort(self._ids, site_id)
+        for gram in trigrams(lowered):
+            self._grams.setdefault(gram, set()).add(site_id)
+
+    def _remove(self, site_id: str):
+        """Drop one site from the index."""
+
+        lowered = self.sites.pop(site_id).lower()
+        index = bisect.bisect_left(self._names, (lowered, site_id))
+        del self._names[index]
+        del self._ids[bisect.bisect_left(self._ids, site_id)]
+        for gram in trigrams(lowered):
+            ids = self._grams.get(gram)
+            if ids is not None:
+                ids.discard(site_id)
+                if not ids:
+                    del self._grams[gram]
+
+    def update(self, sites: Iterable[dict]):
+        """Apply a fresh `orgs/{org_id}/sites` listing, touching only changes."""
+
+        latest = {site["id"]: site.get("name") or site["id"] for site in sites}
+
+        with self._lock:
+            for site_id in [each for each in self.sites if each not in latest]:
+                self._remove(site_id)
+
+            for site_id, name in latest.items():
+                current = self.sites.get(site_id)
+                if current == name:
+                    continue
+                if current is not None:
+                    self._remove(site_id)
+                self._add(site_id, name)
+
+            self.refreshed_at = time.monotonic()
+
+    def search(self, query: str, limit: int = MAX_OPTIONS) -> List[Tuple[str, str]]:
+        """Return up to `limit` (site id, name) pairs matching `query`.
+
+        Name prefixes rank first, then id prefixes, then names containing
+        the query anywhere.
+        """
+
+        query = (query or "").strip().lower()
+        found: Dict[str, None] = {}
+
+        with self._lock:
+            start = bisect.bisect_left(self._names, (query, ""))
+            for lowered, site_id in self._names[start:]:
+                if len(found) >= limit or not lowered.startswith(query):
+                    break
+                found[site_id] = None
+
+            start = bisect.bisect_left(self._ids, query)
+            for site_id in self._ids[start:]:
+                if len(found) >= limit or not site_id.startswith(query):
+                    break
+                found[site_id] = None
+
+            if len(found) < limit and len(query) >= 3:
+                grams = sorted(
+                    (self._grams.get(gram, set()) for gram in trigrams(query)), key=len
+                )
+                candidates = set.intersection(*grams) if grams else set()
+                for site_id in sorted(candidates, key=lambda each: self.sites[each]):
+                    if len(found) >= limit:
+                        break
+                    if query in self.sites[site_id].lower():
+                        found[site_id] = None
+
+            return [(site_id, self.sites[site_id]) for site_id in found]
+
+    def is_stale(self, interval: float = DEFAULT_REFRESH_INTERVAL) -> bool:
+        """True when the index is older than `interval` seconds."""
+        return time.monotonic() - self.refreshed_at > interval
+
+
+def slack_options(matches: Iterable[Tuple[str, str]]) -> List[dict]:
+    """Format index matches as Slack external_select options."""
+
+    return [
+        {"text": {"type": "plain_text", "text": name[:75]}, "value": site_id}
+        for site_id, name in matches
+    ]
+
+
+def start_refresher(index: SiteIndex, fetch, interval=DEFAULT_REFRESH_INTERVAL):
+    """Keep `index` up to date from `fetch()` on a daemon thread."""
+
+    def run():
+        while True:
+            try:
+                index.update(fetch())
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning("site index refresh failed: %s", error)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="site-index", daemon=True)
+    thread.start()
+
+    return thread
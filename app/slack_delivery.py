@@ -0,0 +1,435 @@
+"""Outbound Slack delivery: Block Kit chunking, tier pacing, batching and
+progressive updates."""
+
+# Standard library
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Third Party
+from slack_sdk.errors import SlackApiError
+
+# Local
+from mist_metrics import SLACK_RATE_LIMITED, SLACK_REQUEST_SECONDS, track_queue
+
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------
+# Delivery parameters, overridable through the environment
+# -----------------------------------------------------------------------------
+SECTION_LIMIT = 3000  # Slack's cap on a section block's text
+MAX_BLOCKS = int(os.environ.get("SLACK_MAX_BLOCKS", "20"))
+MAX_RETRIES = int(os.environ.get("SLACK_MAX_RETRIES", "3"))
+BATCH_WINDOW = float(os.environ.get("SLACK_BATCH_WINDOW", "2"))
+BATCH_MAX_CHARS = int(os.environ.get("SLACK_BATCH_MAX_CHARS", "1500"))
+UPDATE_INTERVAL = float(os.environ.get("SLACK_UPDATE_INTERVAL", "1.5"))
+
+# seconds between calls per Slack method, from the published rate limit tiers
+# (chat.postMessage is special: about one message per second per channel)
+METHOD_INTERVALS = {
+    "chat_postMessage": 1.0,
+    "chat_update": 60 / 50,
+    "chat_postEphemeral": 60 / 100,
+    "views_open": 60 / 100,
+    "views_update": 60 / 100,
+}
+DEFAULT_INTERVAL = 60 / 20
+
+
+# -----------------------------------------------------------------------------
+# Block Kit chunking
+# -----------------------------------------------------------------------------
+def chunk_text(text: str, limit: int = SECTION_LIMIT) -> List[str]:
+    """Split text on line boundaries into pieces of at most `limit` chars."""
+
+    chunks, current, size = [], [], 0
+    for line in text.splitlines():
+        while len(line) > limit:
+            if current:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            chunks.append(line[:limit])
+            line = line[limit:]
+
+        if size + len(line) + 1 > limit and current:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+
+        current.append(line)
+        size += len(line) + 1
+
+    if current:
+        chunks.append("\n".join(current))
+
+    return [chunk for chunk in chunks if chunk.strip()] or [" "]
+
+
+def to_messages(text: str, max_blocks: int = MAX_BLOCKS) -> List[Tuple[str, list]]:
+    """Turn a report into (fallback text, blocks) messages of `max_blocks`."""
+
+    blocks = [
+        {"type": "section", "text": {"type": "mrkdwn", "text": chunk}}
+        for chunk in chunk_text(text)
+    ]
+
+    messages = []
+    for start in range(0, len(blocks), max_blocks):
+        group = blocks[start : start + max_blocks]
+        fallback = group[0]["text"]["text"].split("\n", 1)[0][:150]
+        messages.append((fallback, group))
+
+    return messages
+
+
+# -----------------------------------------------------------------------------
+# Tier-aware pacing and 429 retry
+# -----------------------------------------------------------------------------
+class SlackPacer:
+    """Space out calls per Slack method (and channel) to stay within tier."""
+
+    def __init__(self, intervals: Optional[Dict[str, float]] = None):
+        self.intervals = dict(METHOD_INTERVALS if intervals is None else intervals)
+        self.stats = {"calls": 0, "rate_limited": 0, "failed": 0}
+        self._next_slot: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def _reserve(self, method: str, channel: str) -> float:
+        """Book the next slot of `method` for `channel`; returns the wait for it."""
+
+        interval = self.intervals.get(method, DEFAULT_INTERVAL)
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get((method, channel), now))
+            self._next_slot[(method, channel)] = slot + interval
+
+        return slot - now
+
+    def wait(self, method: str, channel: str = ""):
+        """Block until `method` may be called again for `channel`."""
+
+        delay = self._reserve(method, channel)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self, method: str, channel: str = ""):
+        """Like `wait`, without blocking the event loop."""
+
+        delay = self._reserve(method, channel)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def call(self, client, method: str, **kwargs):
+        """Call `client.<method>(**kwargs)` paced, retrying on HTTP 429.
+
+        Returns the Slack response, or None once the call has failed for
+        good (the error is logged, as the bot always did).
+        """
+
+        channel = kwargs.get("channel", "")
+        for attempt in range(MAX_RETRIES + 1):
+            self.wait(method, channel)
+            self.stats["calls"] += 1
+            try:
+                with SLACK_REQUEST_SECONDS.labels(method).time():
+                    return getattr(client, method)(**kwargs)
+
+            except SlackApiError as error:
+                if not self._retry_later(error, method, channel, attempt):
+                    return None
+
+        return None
+
+    async def call_async(self, client, method: str, **kwargs):
+        """`call` for the asyncio Slack client."""
+
+        channel = kwargs.get("channel", "")
+        for attempt in range(MAX_RETRIES + 1):
+            await self.wait_async(method, channel)
+            self.stats["calls"] += 1
+            try:
+                with SLACK_REQUEST_SECONDS.labels(method).time():
+                    return await getattr(client, method)(**kwargs)
+
+            except SlackApiError as error:
+                if not self._retry_later(error, method, channel, attempt):
+                    return None
+
+        return None
+
+    def _retry_later(self, error: SlackApiError, method: str, channel: str, attempt):
+        """Push the next slot back on a 429; False once the call has failed for good."""
+
+        response = error.response
+        if response is None or response.status_code != 429:
+            self.stats["failed"] += 1
+            logger.error(error)
+            return False
+
+        self.stats["rate_limited"] += 1
+        SLACK_RATE_LIMITED.labels(method).inc()
+        if attempt == MAX_RETRIES:
+            self.stats["failed"] += 1
+            logger.error(
+                "Slack %s still rate limited after %s retries", method, MAX_RETRIES
+            )
+            return False
+
+        retry_after = float(response.headers.get("Retry-After", 1))
+        logger.warning("Slack %s rate limited, retrying in %ss", method, retry_after)
+        with self._lock:
+            key = (method, channel)
+            self._next_slot[key] = max(
+                self._next_slot.get(key, 0), time.monotonic() + retry_after
+            )
+
+        return True
+
+
+# -----------------------------------------------------------------------------
+# Report delivery
+# -----------------------------------------------------------------------------
+class SlackDelivery:
+    """Post reports as Block Kit messages, overflowing into a thread."""
+
+    def __init__(self, pacer: Optional[SlackPacer] = None):
+        self.pacer = pacer or SlackPacer()
+
+    def post(self, client, channel: str, text: str, thread_ts: Optional[str] = None):
+        """Post `text` in chunks; returns the ts of the first message or None."""
+
+        first_ts = None
+        for fallback, blocks in to_messages(text):
+            result = self.pacer.call(
+                client,
+                "chat_postMessage",
+                channel=channel,
+                text=fallback,
+                blocks=blocks,
+                thread_ts=thread_ts or first_ts,
+            )
+            if result is None:
+                break
+            if first_ts is None:
+                first_ts = result.get("ts")
+                if thread_ts is None and first_ts is None:
+                    break
+
+        return first_ts
+
+    async def post_async(
+        self, client, channel: str, text: str, thread_ts: Optional[str] = None
+    ):
+        """`post` for the asyncio Slack client."""
+
+        first_ts = None
+        for fallback, blocks in to_messages(text):
+            result = await self.pacer.call_async(
+                client,
+                "chat_postMessage",
+                channel=channel,
+                text=fallback,
+                blocks=blocks,
+                thread_ts=thread_ts or first_ts,
+            )
+            if result is None:
+                break
+            if first_ts is None:
+                first_ts = result.get("ts")
+                if thread_ts is None and first_ts is None:
+                    break
+
+        return first_ts
+
+    def progressive(
+        self, client, channel: str, placeholder: str, actions: Optional[list] = None
+    ):
+        """Post `placeholder` now and return a `ProgressiveMessage` to fill in."""
+
+        message = ProgressiveMessage(self, client, channel, actions=actions)
+        message.start(placeholder)
+
+        return message
+
+
+class ProgressiveMessage:
+    """A report message posted early and edited in place as it fills in.
+
+    Intermediate `update`s are throttled to one `chat_update` every
+    `interval` seconds and are dropped, not queued, when they come too
+    soon: only the latest state matters. `finish` always goes out, and
+    threads whatever no longer fits in the first message. `actions` blocks
+    (a cancel button) ride along until the report is finished.
+    """
+
+    def __init__(
+        self,
+        delivery: SlackDelivery,
+        client,
+        channel: str,
+        interval: float = UPDATE_INTERVAL,
+        actions: Optional[list] = None,
+    ):
+        self.delivery = delivery
+        self.client = client
+        self.channel = channel
+        self.interval = interval
+        self.actions = actions or []
+        self.ts: Optional[str] = None
+        self.updates = 0
+        self._last_update = 0.0
+
+    def start(self, placeholder: str):
+        """Post the placeholder and remember its ts."""
+
+        fallback, blocks = to_messages(placeholder)[0]
+        result = self.delivery.pacer.call(
+            self.client,
+            "chat_postMessage",
+            channel=self.channel,
+            text=fallback,
+            blocks=blocks + self.actions,
+        )
+        self.ts = None if result is None else result.get("ts")
+        self._last_update = time.monotonic()
+
+    def due(self) -> bool:
+        """True when an intermediate update would be sent right now."""
+        return (
+            self.ts is not None
+            and time.monotonic() - self._last_update >= self.interval
+        )
+
+    def update(self, text: str) -> bool:
+        """Replace the message with `text` unless the last update was too recent."""
+
+        if not self.due():
+            return False
+
+        fallback, blocks = to_messages(text)[0]
+
+        return self._edit(text, (fallback, blocks + self.actions)) is not None
+
+    def finish(self, text: str):
+        """Show the complete report, threading any overflow under it."""
+
+        if self.ts is None:
+            self.delivery.post(self.client, self.channel, text)
+            return
+
+        messages = to_messages(text)
+        if self._edit(text, messages[0]) is None:
+            self.delivery.post(self.client, self.channel, text, thread_ts=self.ts)
+            return
+
+        for fallback, blocks in messages[1:]:
+            self.delivery.pacer.call(
+                self.client,
+                "chat_postMessage",
+                channel=self.channel,
+                text=fallback,
+                blocks=blocks,
+                thread_ts=self.ts,
+            )
+
+    def _edit(self, text: str, message: Optional[Tuple[str, list]] = None):
+        """Send one `chat_update` with the first message's worth of `text`."""
+
+        fallback, blocks = message or to_messages(text)[0]
+        self._last_update = time.monotonic()
+        self.updates += 1
+
+        return self.delivery.pacer.call(
+            self.client,
+            "chat_update",
+            channel=self.channel,
+            ts=self.ts,
+            text=fallback,
+            blocks=blocks,
+        )
+
+
+class SlackOutbox:
+    """Single sender thread that batches small reports per channel.
+
+    Messages shorter than `batch_max_chars` that arrive within
+    `batch_window` seconds of each other go out as one post; larger reports
+    are sent on their own, in order, so channel throughput stays steady.
+    """
+
+    def __init__(
+        self,
+        delivery: Optional[SlackDelivery] = None,
+        batch_window: float = BATCH_WINDOW,
+        batch_max_chars: int = BATCH_MAX_CHARS,
+        name: str = "slack-outbox",
+    ):
+        self.delivery = delivery or SlackDelivery()
+        self.batch_window = batch_window
+        self.batch_max_chars = batch_max_chars
+        self.name = name
+        self._pending: "OrderedDict[str, List[Tuple[object, str]]]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._thread = None
+        track_queue(name, self.depth)
+
+    def submit(self, client, channel: str, text: str):
+        """Queue a report for delivery to `channel`."""
+
+        with self._cond:
+            self._pending.setdefault(channel, []).append((client, text))
+            self._cond.notify()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name=self.name, daemon=True
+                )
+                self._thread.start()
+
+    def depth(self) -> int:
+        """Number of reports waiting to be posted."""
+        return sum(len(each) for each in self._pending.values())
+
+    def _run(self):
+        """Sender loop: wait for the batch window, then flush every channel."""
+
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+
+            time.sleep(self.batch_window)
+
+            with self._cond:
+                pending, self._pending = self._pending, OrderedDict()
+
+            for channel, messages in pending.items():
+                for client, text in self._batches(messages):
+                    try:
+                        self.delivery.post(client, channel, text)
+                    except Exception:  # pylint: disable=broad-except
+                        # a network error loses this post, not the sender
+                        logger.exception("posting to Slack channel %s failed", channel)
+
+    def _batches(self, messages):
+        """Merge consecutive small messages, keeping large ones separate."""
+
+        batch, batch_client, size = [], None, 0
+        for client, text in messages:
+            small = len(text) < self.batch_max_chars
+            if batch and (not small or size + len(text) > SECTION_LIMIT):
+                yield batch_client, "\n\n".join(batch)
+                batch, size = [], 0
+            if not small:
+                yield client, text
+                continue
+            batch.append(text)
+            batch_client = client
+            size += len(text)
+
+        if batch:
+            yield batch_client, "\n\n".join(batch)
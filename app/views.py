@@ -0,0 +1,379 @@
+"""Slack Block Kit views shared by the sync and async Bolt apps."""
+
+# -----------------------------------------------------------------------------
+# Choices offered by the site alerts form
+# -----------------------------------------------------------------------------
+# value: (label, seconds); the first one is fetched live from Mist, the
+# longer ones are answered from the bot's local alarm history
+ALARM_WINDOWS = {
+    "6h": ("the last six hours", 21600),
+    "24h": ("the last 24 hours", 86400),
+    "7d": ("the last 7 days", 604800),
+    "30d": ("the last 30 days", 2592000),
+}
+LIVE_WINDOW = "6h"
+
+# replied when /mist is run in a channel no Mist org is mapped to
+UNMAPPED_CHANNEL = "This channel is not mapped to a Mist org."
+
+ALARM_TYPES = {
+    "rogue_ap": "Rogue AP",
+    "rogue_client": "Rogue Client",
+    "infra_dhcp_failure": "DHCP Failure",
+    "arp_failure": "ARP Failure",
+    "sw_alarm_chassis_poe": "PoE Issue",
+    "sw_alarm_chassis_partition": "Disk Partition Issue",
+    "device_down": "Device Down",
+    "sw_bgp_neighbor_state_changed": "BGP Failure",
+}
+
+
+def _option(value, label):
+    """Return a static_select option."""
+    return {"text": {"type": "plain_text", "text": label}, "value": value}
+
+
+def _forward_metadata(body):
+    """Carry the parent view's private_metadata over to the next view."""
+    return (body.get("view") or {}).get("private_metadata") or ""
+
+
+# -----------------------------------------------------------------------------
+# Mist API budget footnote
+# -----------------------------------------------------------------------------
+def _budget_context(budget):
+    """Return a context block with the Mist calls left this hour, if known."""
+
+    if not budget:
+        return []
+
+    text = f":hourglass: Mist API budget: {budget['remaining']}/{budget['capacity']} calls left"
+    if budget.get("blocked_for"):
+        text += f", throttled for {budget['blocked_for']}s"
+
+    return [{"type": "context", "elements": [{"type": "mrkdwn", "text": text}]}]
+
+
+# -----------------------------------------------------------------------------
+# Main task menu presented when /mist is executed
+# -----------------------------------------------------------------------------
+def task_menu_view(logo, budget=None, metadata=""):
+    """Build the modal listing the tasks our bot can run.
+
+    `metadata` rides along in `private_metadata` through the follow-up
+    views, which is how reports know which Mist org they are for.
+    """
+
+    return {
+        "type": "modal",
+        "private_metadata": metadata,
+        # View identifier
+        "callback_id": "task-menu",
+        "title": {
+            "type": "plain_text",
+            "text": "Juniper Mist Slack bot",
+            "emoji": True,
+        },
+        # "submit": {"type": "plain_text", "text": "Submit", "emoji": True},
+        "close": {"type": "plain_text", "text": "Cancel", "emoji": True},
+        "blocks": [
+            {
+                "type": "image",
+                "image_url": logo,
+                "alt_text": "Juniper Mist Slack bot",
+            },
+            {"type": "divider"},
+            {
+                "type": "header",
+                "text": {
+                    "type": "plain_text",
+                    "text": "Please select a task",
+                    "emoji": True,
+                },
+            },
+            *_budget_context(budget),
+            {"type": "divider"},
+            {
+                "type": "section",
+                "text": {
+                    "type": "plain_text",
+                    "text": "Retrieve site alerts",
+                    "emoji": True,
+                },
+                "accessory": {
+                    "type": "button",
+                    "text": {"type": "plain_text", "text": "Click Here"},
+                    "action_id": "site_alerts",
+                },
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "plain_text",
+                    "text": "Run Automated Reports",
+                    "emoji": True,
+                },
+                "accessory": {
+                    "type": "button",
+                    "text": {"type": "plain_text", "text": "Click Here"},
+                    "action_id": "automated_reports",
+                },
+            },
+        ],
+    }
+
+
+# -----------------------------------------------------------------------------
+# Site alerts form, shown when `site_alerts` is clicked in the task menu
+# -----------------------------------------------------------------------------
+def site_alerts_form_view(body):
+    """Build the modal asking for the site to report on."""
+
+    return {
+        "type": "modal",
+        "callback_id": "site_alerts",  # View identifier
+        "private_metadata": _forward_metadata(body),
+        "title": {
+            "type": "plain_text",
+            "text": "Juniper Mist",
+            "emoji": True,
+        },
+        "blocks": [
+            {
+                "type": "header",
+                "text": {
+                    "type": "plain_text",
+                    "text": ":bar_chart:  Reports",
+                    "emoji": True,
+                },
+            },
+            {
+                "type": "context",
+                "elements": [
+                    {
+                        "text": "Slack bot automation",
+                        "type": "mrkdwn",
+                    }
+                ],
+            },
+            {
+                "type": "divider",
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": " :spiral_note_pad: *List of sites*",
+                },
+            },
+            {
+                "type": "input",
+                "block_id": "site_name",
+                "element": {
+                    "type": "external_select",
+                    "action_id": "site_lookup",
+                    "placeholder": {
+                        "type": "plain_text",
+                        "text": "Start typing a site name or ID",
+                    },
+                    "min_query_length": 1,
+                },
+                "label": {
+                    "type": "plain_text",
+                    "text": "Name of site",
+                    "emoji": True,
+                },
+            },
+            {
+                "type": "input",
+                "block_id": "alarm_window",
+                "element": {
+                    "type": "static_select",
+                    "action_id": "alarm_window",
+                    "initial_option": _option(
+                        LIVE_WINDOW, ALARM_WINDOWS[LIVE_WINDOW][0].capitalize()
+                    ),
+                    "options": [
+                        _option(value, label.capitalize())
+                        for value, (label, _) in ALARM_WINDOWS.items()
+                    ],
+                },
+                "label": {"type": "plain_text", "text": "Time window"},
+            },
+            {
+                "type": "input",
+                "block_id": "alarm_type",
+                "optional": True,
+                "element": {
+                    "type": "static_select",
+                    "action_id": "alarm_type",
+                    "placeholder": {"type": "plain_text", "text": "All alarm types"},
+                    "options": [
+                        _option(value, label) for value, label in ALARM_TYPES.items()
+                    ],
+                },
+                "label": {"type": "plain_text", "text": "Alarm type"},
+            },
+            {"type": "divider"},
+            {
+                "type": "context",
+                "elements": [
+                    {
+                        "type": "mrkdwn",
+                        "text": ":pushpin: Do you have something that you would like to see automated? Here's *how to submit a request*.",
+                    }
+                ],
+            },
+        ],
+        "submit": {"type": "plain_text", "text": "Submit", "emoji": True},
+        "close": {"type": "plain_text", "text": "Cancel", "emoji": True},
+    }
+
+
+# -----------------------------------------------------------------------------
+# Automated reports menu, shown when `automated_reports` is clicked
+# -----------------------------------------------------------------------------
+def automated_reports_menu_view(body):
+    """Build the modal listing our automated reports."""
+
+    return {
+        "type": "modal",
+        "callback_id": "automated_reports_view",  # View identifier
+        "private_metadata": _forward_metadata(body),
+        "title": {
+            "type": "plain_text",
+            "text": "Juniper Mist",
+            "emoji": True,
+        },
+        "blocks": [
+            {
+                "type": "header",
+                "text": {
+                    "type": "plain_text",
+                    "text": ":bar_chart:  Reports",
+                    "emoji": True,
+                },
+            },
+            {
+                "type": "context",
+                "elements": [
+                    {
+                        "text": "Slack bot automation",
+                        "type": "mrkdwn",
+                    }
+                ],
+            },
+            {
+                "type": "divider",
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": " :spiral_note_pad: *List of sites*",
+                },
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": "Retrieve a list of sites within an organization.",
+                },
+                "accessory": {
+                    "type": "button",
+                    "text": {
+                        "type": "plain_text",
+                        "text": "Create Report",
+                        "emoji": True,
+                    },
+                    "action_id": "list_of_sites",
+                },
+            },
+            {
+                "type": "divider",
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": " :robot_face: *Marvis Issues*",
+                },
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": "Retrieve a list of issues reported by Marvis.",
+                },
+                "accessory": {
+                    "type": "button",
+                    "text": {
+                        "type": "plain_text",
+                        "text": "Create Report",
+                        "emoji": True,
+                    },
+                    "action_id": "marvis_issues",
+                },
+            },
+            {
+                "type": "divider",
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": " :rotating_light: *All Sites Alerts*",
+                },
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": "Retrieve the alerts of every site within an organization.",
+                },
+                "accessory": {
+                    "type": "button",
+                    "text": {
+                        "type": "plain_text",
+                        "text": "Create Report",
+                        "emoji": True,
+                    },
+                    "action_id": "org_alerts",
+                },
+            },
+            {"type": "divider"},
+            {
+                "type": "context",
+                "elements": [
+                    {
+                        "type": "mrkdwn",
+                        "text": ":pushpin: Do you have something that you would like to see automated? Here's *how to submit a request*.",
+                    }
+                ],
+            },
+        ],
+        # "submit": {"type": "plain_text", "text": "Submit", "emoji": True},
+        "close": {"type": "plain_text", "text": "Close Window", "emoji": True},
+    }
+
+
+# -----------------------------------------------------------------------------
+# Cancel button shown while a report is queued or running
+# -----------------------------------------------------------------------------
+def cancel_report_actions(value):
+    """Return an actions block whose button cancels the report `value` names."""
+
+    return [
+        {
+            "type": "actions",
+            "elements": [
+                {
+                    "type": "button",
+                    "text": {"type": "plain_text", "text": "Cancel", "emoji": True},
+                    "style": "danger",
+                    "action_id": "cancel_report",
+                    "value": value,
+                }
+            ],
+        }
+    ]
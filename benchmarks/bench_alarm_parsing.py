@@ -0,0 +1,95 @@
+"""Compare alarms/second of pydantic `Results` against bulk `AlarmRecord`s.
+
+Builds a synthetic alarm search payload shaped like an org-wide sweep and
+parses it both ways through `SiteAlerts.extend`.
+
+    python benchmarks/bench_alarm_parsing.py --alarms 50000
+"""
+
+# standard library
+import argparse
+import os
+import random
+import sys
+import time
+
+# local
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+from mist_helper import SiteAlerts  # noqa: E402
+
+
+# -----------------------------------------------------------------------------
+# Synthetic payload
+# -----------------------------------------------------------------------------
+TYPES = [
+    ("critical", "rogue_ap"),
+    ("critical", "infra_dhcp_failure"),
+    ("warn", "device_down"),
+    ("warn", "sw_alarm_chassis_poe"),
+    ("info", "sw_bgp_neighbor_state_changed"),
+]
+
+
+def synthetic_alarm(index):
+    """Return one alarm with a realistic mix of present and absent fields."""
+
+    severity, alarm_type = random.choice(TYPES)
+    alarm = {
+        "count": random.randint(1, 20),
+        "group": "infrastructure",
+        "hostnames": [f"device-{index % 500}"],
+        "id": f"{index:08x}-0000-4000-8000-000000000000",
+        "last_seen": 1657000000 + index,
+        "org_id": "00000000-0000-0000-0000-000000000001",
+        "severity": severity,
+        "site_id": f"00000000-0000-0000-0000-{index % 400:012d}",
+        "timestamp": 1657000000 + index,
+        "type": alarm_type,
+    }
+    if alarm_type == "rogue_ap":
+        alarm["ssids"] = ["guest"]
+        alarm["bssids"] = ["5c:5b:35:00:00:01"]
+    if alarm_type == "infra_dhcp_failure":
+        alarm["servers"] = ["10.0.0.2"]
+        alarm["vlans"] = [10]
+    if alarm_type == "sw_alarm_chassis_poe":
+        alarm["reasons"] = ["PoE budget exceeded"]
+
+    return alarm
+
+
+# -----------------------------------------------------------------------------
+# Benchmark
+# -----------------------------------------------------------------------------
+def alarms_per_second(page, strict, rounds):
+    """Return the best alarms/second seen parsing `page` over `rounds` runs."""
+
+    best = 0.0
+    for _ in range(rounds):
+        site_alerts = SiteAlerts(results=[])
+        start = time.perf_counter()
+        site_alerts.extend(page, strict=strict)
+        elapsed = time.perf_counter() - start
+        best = max(best, len(page["results"]) / elapsed)
+
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--alarms", type=int, default=50000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    random.seed(0)
+    page = {"results": [synthetic_alarm(index) for index in range(args.alarms)]}
+
+    strict = alarms_per_second(page, True, args.rounds)
+    bulk = alarms_per_second(page, False, args.rounds)
+
+    print(f"pydantic Results     {strict:12,.0f} alarms/s")
+    print(f"bulk AlarmRecord     {bulk:12,.0f} alarms/s   ({bulk / strict:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Compare per-report latency with and without the pooled Mist sessions.
+
+A local fake Mist server answers `alarms/search` with a canned payload. The
+benchmark times a report fetch the old way (a fresh `requests.request` per
+call, which dials a new connection every time) against the pooled
+keep-alive session used by `MistApi`.
+
+    python benchmarks/bench_session_pool.py --reports 500
+
+The fake server speaks plain HTTP on loopback, so the numbers only capture
+the TCP setup that pooling saves; against api.mist.com the TLS handshake and
+DNS lookup widen the gap considerably.
+"""
+
+# standard library
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# third party
+import requests
+
+# local
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+from mist_helper import MistApi  # noqa: E402
+from mist_session import SessionPool  # noqa: E402
+
+
+# -----------------------------------------------------------------------------
+# Fake Mist server
+# -----------------------------------------------------------------------------
+ALARM = {
+    "count": 1,
+    "group": "infrastructure",
+    "hostnames": ["ap-lobby"],
+    "id": "00000000-0000-0000-0000-000000000000",
+    "last_seen": 1657000000,
+    "org_id": "00000000-0000-0000-0000-000000000001",
+    "severity": "warn",
+    "site_id": "00000000-0000-0000-0000-000000000002",
+    "timestamp": 1657000000,
+    "type": "device_down",
+}
+PAYLOAD = json.dumps({"results": [ALARM] * 20, "limit": 100, "total": 20}).encode()
+
+
+class FakeMistHandler(BaseHTTPRequestHandler):
+    """Answer every GET with the canned alarm payload over keep-alive."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server():
+    """Start the fake Mist server on an ephemeral loopback port."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeMistHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# -----------------------------------------------------------------------------
+# Benchmark
+# -----------------------------------------------------------------------------
+def time_reports(fetch, reports):
+    """Return the per-report latencies, in milliseconds, of `fetch()`."""
+
+    latencies = []
+    for _ in range(reports):
+        start = time.perf_counter()
+        fetch()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return latencies
+
+
+def summary(name, latencies):
+    """Print the median and p95 latency of a run."""
+    p95 = statistics.quantiles(latencies, n=20)[18]
+    print(
+        f"{name:<28} median {statistics.median(latencies):7.3f} ms   p95 {p95:7.3f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=int, default=200)
+    args = parser.parse_args()
+
+    server = start_server()
+    baseurl = f"127.0.0.1:{server.server_address[1]}/api/v1"
+    path = "sites/fake/alarms/search?limit=100"
+    url = f"http://{baseurl}/{path}"
+
+    def unpooled():
+        response = requests.request("GET", url, timeout=(3.05, 30))
+        response.raise_for_status()
+        return response.json()
+
+    mist = MistApi(api_token="benchmark", baseurl=baseurl, pool=SessionPool())
+    mist.baseurl = f"http://{baseurl}"
+
+    def pooled():
+        return mist.get(path)
+
+    # warm both paths so imports and the first connect are excluded
+    unpooled()
+    pooled()
+
+    summary("new connection per report", time_reports(unpooled, args.reports))
+    summary("pooled keep-alive session", time_reports(pooled, args.reports))
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""Put the bot's flat modules in `app/` on the import path."""
+
+# Standard library
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
@@ -0,0 +1,53 @@
+"""Incremental alarm polling and its resilience to failing cycles."""
+
+# Local
+from alarm_poller import AlarmPoller
+
+
+def alarm(alarm_id, timestamp):
+    return {
+        "id": alarm_id,
+        "count": 1,
+        "group": "infrastructure",
+        "hostnames": ["ap-1"],
+        "last_seen": timestamp,
+        "org_id": "org",
+        "severity": "critical",
+        "site_id": "s1",
+        "timestamp": timestamp,
+        "type": "device_down",
+    }
+
+
+class FlakyMist:
+    """Answer alarm searches from a list of outcomes, raising the exceptions."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+
+    def iter_results(self, path, priority=None):
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return iter(outcome)
+
+
+def test_a_failing_cycle_is_counted_and_the_next_one_runs():
+    pushed = []
+    mist = FlakyMist(
+        KeyError("timestamp"), [alarm("a", 2000000000)], [alarm("b", 2000000000)]
+    )
+    poller = AlarmPoller(mist, "org", pushed.append, interval=0)
+
+    def failing_push(org_alerts):
+        raise TypeError("sink failed")
+
+    poller.tick()
+    poller.push = failing_push
+    poller.tick()
+    poller.push = pushed.append
+    poller.tick()
+
+    assert poller.stats["failed"] == 2
+    assert poller.stats["polls"] == 2
+    assert len(pushed) == 1
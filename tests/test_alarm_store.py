@@ -0,0 +1,48 @@
+"""Alarm history kept in SQLite."""
+
+# Standard library
+import os
+
+# Local
+import alarm_store
+from alarm_store import AlarmStore
+from mist_helper import SiteAlerts
+
+
+def alarm(alarm_id, timestamp, site_id="s1"):
+    return {
+        "id": alarm_id,
+        "count": 1,
+        "group": "infrastructure",
+        "hostnames": ["ap-1"],
+        "last_seen": timestamp,
+        "org_id": "org",
+        "severity": "critical",
+        "site_id": site_id,
+        "timestamp": timestamp,
+        "type": "device_down",
+    }
+
+
+def test_default_database_does_not_depend_on_the_working_directory():
+    assert os.path.isabs(alarm_store.DEFAULT_ALARM_DB)
+
+
+def test_store_creates_its_directory(tmp_path):
+    path = tmp_path / "data" / "alarms.sqlite3"
+
+    AlarmStore(str(path))
+
+    assert path.exists()
+
+
+def test_query_is_bounded_but_counts_every_match(tmp_path):
+    store = AlarmStore(str(tmp_path / "alarms.sqlite3"))
+    records = [alarm(f"a{index}", 1000 + index) for index in range(5)]
+    store.record(SiteAlerts.from_records(records + [alarm("b", 2000, "s2")]).results)
+
+    recent = store.query("s1", since=1000, limit=3)
+
+    assert [each.id for each in recent.results] == ["a4", "a3", "a2"]
+    assert recent.total == 5
+    assert len(store.query("s1", limit=None).results) == 5
@@ -0,0 +1,76 @@
+"""Marvis trend rings, rollups and the report lines they annotate."""
+
+# Standard library
+import time
+
+# Local
+from marvis_trends import MarvisTrends, Ring, Rollup, ago, sparkline
+from mist_helper import MARVIS_SYMPTOMS, MistApi, MarvisIssues
+
+
+def issues(count):
+    return MarvisIssues(counts={each.key: count for each in MARVIS_SYMPTOMS})
+
+
+def test_ring_overwrites_the_oldest_rows_once_full():
+    ring = Ring(3, ["a"])
+    for timestamp in range(5):
+        ring.append(timestamp, {"a": timestamp * 10})
+
+    assert ring.series("a") == [(2, 20), (3, 30), (4, 40)]
+    assert ring.oldest() == 2
+    assert ring.latest() == 4
+    assert ring.at("a", 3.5) == (3, 30)
+
+
+def test_rollup_averages_each_bucket():
+    rollup = Rollup(3600, 10, ["a"])
+    for timestamp, value in ((0, 2), (1800, 4), (3600, 10), (7200, 1)):
+        rollup.add(timestamp, {"a": value})
+
+    # the open bucket is only written once the next one starts
+    assert rollup.ring.series("a") == [(0, 3), (3600, 10)]
+
+
+def test_samples_closer_than_the_interval_are_dropped():
+    trends = MarvisTrends(interval=300)
+
+    assert trends.sample(issues(1), now=1000)
+    assert not trends.sample(issues(5), now=1100)
+    assert trends.sample(issues(2), now=1300)
+
+    key = MARVIS_SYMPTOMS[0].key
+    assert trends.raw.series(key) == [(1000, 1), (1300, 2)]
+
+
+def test_delta_reaches_back_into_the_rollups():
+    trends = MarvisTrends(interval=0, raw_samples=4)
+    key = MARVIS_SYMPTOMS[0].key
+    for hour in range(30):
+        trends.sample(issues(hour + 1), now=hour * 3600)
+
+    # a day ago fell out of the raw ring but is still in the hourly one
+    assert trends.delta(key, 86400, now=29 * 3600) == (30, 6, 86400)
+
+
+def test_sparkline_and_ago():
+    assert sparkline([1, 2, 3]) == "▁▅█"
+    assert sparkline([4, 4]) == "▁▁"
+    assert ago(90000) == "yesterday"
+    assert ago(7200) == "2h ago"
+
+
+def test_report_lines_end_without_trailing_spaces():
+    trends = MarvisTrends()
+    now = time.time()
+    bare = MistApi(api_token="token").template(issues(1), "marvis_issues.j2")
+
+    trends.sample(issues(2), now=now - 3600)
+    trends.sample(issues(1), now=now)
+    annotated = MistApi(api_token="token").template(
+        issues(1), "marvis_issues.j2", trends=trends
+    )
+
+    assert "-50% vs 1h ago" in annotated
+    for message in (bare, annotated):
+        assert all(line == line.rstrip() for line in message.splitlines())
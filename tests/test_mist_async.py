@@ -0,0 +1,211 @@
+"""AsyncMistApi against a local aiohttp server: limiter, 429s, retries, breakers,
+cache and coalescing."""
+
+# Standard library
+import asyncio
+
+# Third Party
+import aiohttp
+from aiohttp import web
+
+# Local
+from mist_async import AsyncMistApi
+from mist_cache import ResponseCache
+from mist_ratelimit import MistRateLimited, RateLimiter
+from mist_resilience import BreakerBoard, RetryPolicy
+from mist_singleflight import AsyncSingleFlight
+
+
+def run(answers, calls):
+    """Serve `answers` (status codes, in order), then make each of `calls`."""
+
+    async def main():
+        async def handler(request):
+            status = answers.pop(0)
+            headers = {"Retry-After": "0"} if status == 429 else {}
+            return web.json_response({"status": status}, status=status, headers=headers)
+
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        mist = AsyncMistApi(
+            api_token="token",
+            limiter=RateLimiter(),
+            breakers=BreakerBoard(threshold=1, reset_timeout=0),
+            retry=RetryPolicy(attempts=3, base=0.01, cap=0.01),
+        )
+        mist.baseurl = f"http://127.0.0.1:{port}"
+        outcomes = []
+        try:
+            for path in calls:
+                try:
+                    outcomes.append(await mist.get(path))
+                except aiohttp.ClientResponseError as error:
+                    outcomes.append(error.status)
+                except MistRateLimited:
+                    outcomes.append("throttled")
+        finally:
+            await mist.close()
+            await runner.cleanup()
+
+        return mist, outcomes
+
+    return asyncio.run(main())
+
+
+def test_429_pauses_the_shared_limiter_and_is_retried():
+    mist, outcomes = run([429, 200], ["orgs/org/sites"])
+
+    assert outcomes == [{"status": 200}]
+    assert mist.limiter.throttled == 1
+
+
+def test_server_errors_are_retried_and_client_errors_are_not():
+    mist, outcomes = run([503, 200, 404], ["orgs/org/sites", "orgs/org/missing"])
+
+    assert outcomes == [{"status": 200}, 404]
+    # a 404 says nothing about Mist's health
+    assert mist.breakers.breaker("orgs/org/missing").state == "closed"
+
+
+def test_rate_limited_probe_does_not_wedge_the_breaker():
+    mist, outcomes = run(
+        [503, 503, 503, 429, 429, 200],
+        ["orgs/org/sites", "orgs/org/sites", "orgs/org/sites"],
+    )
+
+    # down, then a throttled half-open probe, then healthy again
+    assert outcomes == [503, "throttled", {"status": 200}]
+
+
+def test_sweep_covers_every_site_and_reports_failures():
+    def alarm(site_id):
+        return {
+            "id": f"alarm-{site_id}",
+            "count": 1,
+            "group": "infrastructure",
+            "hostnames": ["ap-1"],
+            "last_seen": 1700000000,
+            "org_id": "org",
+            "severity": "critical",
+            "site_id": site_id,
+            "timestamp": 1700000000,
+            "type": "device_down",
+        }
+
+    async def main():
+        async def sites(request):
+            return web.json_response(
+                [{"id": "s1", "name": "One"}, {"id": "s2", "name": "Two"}]
+            )
+
+        async def alarms(request):
+            site_id = request.match_info["site_id"]
+            if site_id == "s2":
+                return web.json_response({}, status=404)
+            return web.json_response({"results": [alarm(site_id)]})
+
+        app = web.Application()
+        app.router.add_get("/orgs/org/sites", sites)
+        app.router.add_get("/sites/{site_id}/alarms/search", alarms)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        mist = AsyncMistApi(api_token="token", limiter=RateLimiter())
+        mist.baseurl = f"http://127.0.0.1:{port}"
+        try:
+            return await mist.sweep_alarms("org", "limit=100", concurrency=2)
+        finally:
+            await mist.close()
+            await runner.cleanup()
+
+    org_alerts = asyncio.run(main())
+
+    assert org_alerts.total == 1
+    assert org_alerts.failed_sites == ["Two"]
+
+
+def test_cached_and_concurrent_gets_share_one_upstream_call():
+    path = "orgs/9f8e7d6c-1111-2222-3333-444455556666/sites"
+    hits = []
+
+    async def main():
+        async def sites(request):
+            hits.append(request.path)
+            await asyncio.sleep(0.05)
+            return web.json_response([{"id": "s1", "name": "One"}])
+
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", sites)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        mist = AsyncMistApi(
+            api_token="token", limiter=RateLimiter(), cache=ResponseCache()
+        )
+        mist.baseurl = f"http://127.0.0.1:{port}"
+        try:
+            # concurrent identical GETs collapse, then the cache answers
+            first = await asyncio.gather(mist.get(path), mist.get(path))
+            again = await mist.get(path)
+            fresh = await mist.get(path, cache=False)
+        finally:
+            await mist.close()
+            await runner.cleanup()
+
+        return mist, first, again, fresh
+
+    mist, first, again, fresh = asyncio.run(main())
+
+    assert first[0] == first[1] == again == fresh
+    assert len(hits) == 2
+    assert mist.flight.stats["collapsed"] == 1
+    assert mist.cache.stats["hits"] == 1
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    flight = AsyncSingleFlight()
+
+    async def main():
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "sites"
+
+        leader = asyncio.ensure_future(flight.do("key", slow))
+        follower = asyncio.ensure_future(flight.do("key", slow))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+
+        return await follower, leader.cancelled()
+
+    assert asyncio.run(main()) == ("sites", True)
+
+
+def test_stale_entries_are_served_while_a_task_refreshes_them():
+    cache = ResponseCache(ttls={"sites": 60}, stale_ttl=60)
+    answers = ["old", "new"]
+
+    async def fetch():
+        return answers.pop(0)
+
+    async def main():
+        first = await cache.get_or_fetch_async("k", "sites", fetch)
+        cache._entries["k"].fresh_until = 0
+        stale = await cache.get_or_fetch_async("k", "sites", fetch)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return first, stale, await cache.get_or_fetch_async("k", "sites", fetch)
+
+    assert asyncio.run(main()) == ("old", "old", "new")
+    assert cache.stats["stale_hits"] == 1
@@ -0,0 +1,96 @@
+"""TTLs, stale-while-revalidate and eviction of the Mist response cache."""
+
+# Standard library
+import threading
+import time
+
+# Local
+from mist_cache import ResponseCache
+
+
+class Upstream:
+    """Count fetches and answer each with the next version of a body."""
+
+    def __init__(self, delay=0):
+        self.calls = 0
+        self.delay = delay
+        self.refreshed = threading.Event()
+
+    def fetch(self):
+        time.sleep(self.delay)
+        self.calls += 1
+        if self.calls > 1:
+            self.refreshed.set()
+        return {"version": self.calls}
+
+
+def test_fresh_entries_are_served_without_fetching():
+    cache = ResponseCache(ttls={"sites": 60})
+    upstream = Upstream()
+
+    for _ in range(3):
+        assert cache.get_or_fetch("sites/1", "sites", upstream.fetch) == {"version": 1}
+
+    assert upstream.calls == 1
+    assert cache.stats["hits"] == 2
+    assert cache.stats["misses"] == 1
+
+
+def test_endpoints_without_a_ttl_are_always_fetched():
+    cache = ResponseCache(ttls={"sites": 60})
+    upstream = Upstream()
+
+    cache.get_or_fetch("alarms/1", "alarms", upstream.fetch)
+    cache.get_or_fetch("alarms/1", "alarms", upstream.fetch)
+
+    assert upstream.calls == 2
+    assert len(cache) == 0
+
+
+def test_stale_entries_are_served_at_once_and_refreshed_in_the_background():
+    cache = ResponseCache(ttls={"sites": 0.05}, stale_ttl=5)
+    upstream = Upstream(delay=0.2)
+    cache.get_or_fetch("sites/1", "sites", upstream.fetch)
+    time.sleep(0.06)
+
+    started = time.monotonic()
+    stale = [cache.get_or_fetch("sites/1", "sites", upstream.fetch) for _ in range(3)]
+
+    # the stale copy comes back without waiting on the slow refresh
+    assert time.monotonic() - started < 0.1
+    assert stale == [{"version": 1}] * 3
+    assert cache.stats["stale_hits"] == 3
+    assert upstream.refreshed.wait(2)
+    deadline = time.monotonic() + 2
+    served = stale[0]
+    while served != {"version": 2} and time.monotonic() < deadline:
+        time.sleep(0.005)
+        served = cache.get_or_fetch("sites/1", "sites", upstream.fetch)
+    assert served == {"version": 2}
+    # only the first stale hit refreshed the entry
+    assert upstream.calls == 2
+
+
+def test_expired_entries_are_fetched_again():
+    cache = ResponseCache(ttls={"sites": 0.02}, stale_ttl=0.02)
+    upstream = Upstream()
+    cache.get_or_fetch("sites/1", "sites", upstream.fetch)
+    time.sleep(0.05)
+
+    assert cache.get_or_fetch("sites/1", "sites", upstream.fetch) == {"version": 2}
+    assert cache.stats["misses"] == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(maxsize=2, ttls={"sites": 60})
+    upstream = Upstream()
+    for key in ("sites/1", "sites/2"):
+        cache.get_or_fetch(key, "sites", upstream.fetch)
+    cache.get_or_fetch("sites/1", "sites", upstream.fetch)
+    cache.get_or_fetch("sites/3", "sites", upstream.fetch)
+
+    cache.get_or_fetch("sites/1", "sites", upstream.fetch)
+    cache.get_or_fetch("sites/2", "sites", upstream.fetch)
+
+    assert cache.stats["evictions"] == 2
+    assert upstream.calls == 4
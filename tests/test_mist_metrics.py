@@ -0,0 +1,97 @@
+"""Prometheus metrics recorded around Mist calls and the /metrics exporter."""
+
+# Standard library
+import asyncio
+import threading
+import time
+import urllib.request
+
+# Third Party
+from prometheus_client import REGISTRY
+
+# Local
+from mist_metrics import DEFAULT_METRICS_ADDR, observe_mist, serve_metrics
+from mist_singleflight import AsyncSingleFlight, SingleFlight
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_observe_mist_counts_each_response_by_status():
+    before = sample(
+        "mist_responses_total", method="GET", endpoint="test/{id}", status="200"
+    )
+    errors = sample(
+        "mist_responses_total", method="GET", endpoint="test/{id}", status="error"
+    )
+
+    with observe_mist("GET", "test/{id}") as outcome:
+        outcome["status"] = 200
+    try:
+        with observe_mist("GET", "test/{id}"):
+            raise ConnectionError
+    except ConnectionError:
+        pass
+
+    assert (
+        sample("mist_responses_total", method="GET", endpoint="test/{id}", status="200")
+        == before + 1
+    )
+    assert (
+        sample(
+            "mist_responses_total", method="GET", endpoint="test/{id}", status="error"
+        )
+        == errors + 1
+    )
+    assert sample("mist_request_seconds_count", method="GET", endpoint="test/{id}") >= 2
+
+
+def test_single_flight_roles_are_exported():
+    leaders = sample("mist_singleflight_calls_total", role="leader")
+    collapsed = sample("mist_singleflight_calls_total", role="collapsed")
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "body"
+
+    leader = threading.Thread(target=flight.do, args=("k", slow))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=flight.do, args=("k", slow))
+    follower.start()
+    while flight.stats["collapsed"] < 1:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    async def both():
+        async_flight = AsyncSingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            return "body"
+
+        await asyncio.gather(async_flight.do("k", fetch), async_flight.do("k", fetch))
+
+    asyncio.run(both())
+
+    assert sample("mist_singleflight_calls_total", role="leader") == leaders + 2
+    assert sample("mist_singleflight_calls_total", role="collapsed") == collapsed + 2
+
+
+def test_exporter_listens_on_loopback_by_default_and_can_be_left_off():
+    assert DEFAULT_METRICS_ADDR == "127.0.0.1"
+    assert serve_metrics(port=0) is None
+
+    server = serve_metrics(port=18765)
+    try:
+        with urllib.request.urlopen("http://127.0.0.1:18765/metrics") as response:
+            assert b"mist_singleflight_calls_total" in response.read()
+    finally:
+        if server is not None:
+            server[0].shutdown()
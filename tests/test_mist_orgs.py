@@ -0,0 +1,58 @@
+"""Routing of requests and alarms to the configured Mist orgs."""
+
+# Local
+from mist_orgs import OrgConfig, OrgRegistry
+
+
+def registry():
+    return OrgRegistry(
+        [
+            OrgConfig(name="a", org_id="org-a", api_token="x", channels=["C1"]),
+            OrgConfig(name="b", org_id="org-b", api_token="y", hourly_budget=10),
+        ],
+        "C0",
+    )
+
+
+def test_unmapped_channels_are_not_routed_unless_asked_to():
+    orgs = registry()
+
+    assert orgs.for_channel("C1").name == "a"
+    assert orgs.for_channel("elsewhere") is None
+    assert orgs.get("b").channel == "C0"
+
+    orgs.fallback = True
+    assert orgs.for_channel("elsewhere").name == "a"
+
+
+def test_unknown_org_ids_are_not_routed():
+    orgs = registry()
+
+    assert orgs.for_org_id("org-b").name == "b"
+    assert orgs.for_org_id("org-z") is None
+    assert orgs.for_org_id(None) is None
+
+
+def test_orgs_do_not_share_budgets_or_caches():
+    a, b = registry()
+
+    assert a.mist.limiter is not b.mist.limiter
+    assert a.mist.cache is not b.mist.cache
+    assert b.mist.limiter.budget()["capacity"] == 10
+
+
+def test_requests_route_by_channel_or_modal_metadata():
+    orgs = registry()
+
+    assert orgs.for_request({"channel_id": "C1"}).name == "a"
+    assert orgs.for_request({"view": {"private_metadata": '{"org": "b"}'}}).name == "b"
+    assert orgs.for_request({"view": {"private_metadata": '{"org": "z"}'}}) is None
+    assert orgs.for_request({"view": {}}) is None
+
+
+def test_async_client_shares_the_org_budget_and_breakers():
+    org = registry().get("b")
+
+    assert org.async_mist.limiter is org.mist.limiter
+    assert org.async_mist.breakers is org.mist.breakers
+    assert org.async_mist is org.async_mist
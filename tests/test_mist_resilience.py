@@ -0,0 +1,148 @@
+"""Circuit breaker bookkeeping, retries and 429 handling of MistApi.send."""
+
+# Standard library
+import time
+
+# Third Party
+import pytest
+import requests
+
+# Local
+from mist_cache import ResponseCache
+from mist_helper import MistApi
+from mist_ratelimit import MistRateLimited, RateLimiter
+from mist_resilience import BreakerBoard, RetryPolicy
+
+PATH = "orgs/9f8e7d6c-1111-2222-3333-444455556666/sites"
+
+
+class Response:
+    status_code = 200
+    content = b"[]"
+
+    def raise_for_status(self):
+        pass
+
+
+def client():
+    return MistApi(
+        api_token="token",
+        breakers=BreakerBoard(threshold=1, reset_timeout=0),
+        retry=RetryPolicy(attempts=1),
+    )
+
+
+@pytest.mark.parametrize(
+    "probe_error",
+    [
+        MistRateLimited("throttled"),
+        ValueError("bad json"),
+        requests.exceptions.ChunkedEncodingError(),
+    ],
+)
+def test_inconclusive_probe_frees_the_breaker(monkeypatch, probe_error):
+    outcomes = [requests.ConnectionError("down"), probe_error, Response()]
+
+    def fake_request(self, *args, **kwargs):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(MistApi, "_request", fake_request)
+    mist = client()
+
+    with pytest.raises(requests.ConnectionError):
+        mist.send("GET", PATH, mist.headers)
+    with pytest.raises(type(probe_error)):
+        mist.send("GET", PATH, mist.headers)
+
+    # Mist is healthy again: the next probe must be let through
+    assert mist.send("GET", PATH, mist.headers) == []
+
+
+class Answer:
+    """A canned Mist answer to one request."""
+
+    def __init__(self, status_code=200, content=b"[]", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}", response=self)
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    """Hand out canned answers in order and count the requests made."""
+
+    timeout = 5
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.requests = 0
+
+    def session(self, url):
+        return self
+
+    def request(self, method, url, **kwargs):
+        self.requests += 1
+        return self.answers.pop(0)
+
+
+def retrying_client(*answers, max_wait=10):
+    return MistApi(
+        api_token="token",
+        pool=FakePool(*answers),
+        cache=ResponseCache(ttls={}),
+        limiter=RateLimiter(max_wait=max_wait),
+        breakers=BreakerBoard(),
+        retry=RetryPolicy(attempts=3, base=0.01, cap=0.01, deadline=5),
+    )
+
+
+def test_server_errors_are_retried_with_backoff():
+    mist = retrying_client(Answer(503), Answer(502), Answer(content=b'["ok"]'))
+
+    assert mist.get(PATH, cache=False) == ["ok"]
+    assert mist.pool.requests == 3
+
+
+def test_client_errors_and_exhausted_attempts_are_not_retried_further():
+    mist = retrying_client(Answer(404))
+    with pytest.raises(requests.HTTPError):
+        mist.get(PATH, cache=False)
+    assert mist.pool.requests == 1
+
+    mist = retrying_client(Answer(500), Answer(500), Answer(500), Answer())
+    with pytest.raises(requests.HTTPError):
+        mist.get(PATH, cache=False)
+    assert mist.pool.requests == 3
+
+
+def test_long_retry_after_is_waited_out_within_the_deadline():
+    mist = retrying_client(
+        Answer(429, headers={"Retry-After": "0.3"}),
+        Answer(content=b'["ok"]'),
+        max_wait=0.05,
+    )
+
+    started = time.monotonic()
+    assert mist.get(PATH, cache=False, deadline=2) == ["ok"]
+    assert time.monotonic() - started >= 0.25
+
+
+def test_retry_after_past_the_deadline_gives_up_without_sleeping():
+    mist = retrying_client(
+        Answer(429, headers={"Retry-After": "30"}), Answer(), max_wait=0.05
+    )
+
+    started = time.monotonic()
+    with pytest.raises(MistRateLimited):
+        mist.get(PATH, cache=False, deadline=1)
+    assert time.monotonic() - started < 1
+    assert mist.pool.requests == 1
@@ -0,0 +1,198 @@
+"""Leadership handover and shared state between replicas, on a fakeredis stand-in."""
+
+# Standard library
+import threading
+import time
+
+# Third Party
+import pytest
+
+# Local
+from alarm_poller import AlarmPoller
+from mist_cache import ResponseCache
+from mist_shared import Lease, RedisBackend
+from report_scheduler import ReportScheduler
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def replicas():
+    """Build backends of separate replicas talking to one Redis server."""
+    server = fakeredis.FakeServer()
+
+    return lambda: RedisBackend(fakeredis.FakeRedis(server=server), "test:")
+
+
+def alarm(alarm_id, timestamp):
+    return {
+        "id": alarm_id,
+        "count": 1,
+        "group": "infrastructure",
+        "hostnames": ["ap-1"],
+        "last_seen": timestamp,
+        "org_id": "org",
+        "severity": "critical",
+        "site_id": "s1",
+        "timestamp": timestamp,
+        "type": "device_down",
+    }
+
+
+class FakeMist:
+    """Answer alarm searches with fixed alarms and remember the paths asked."""
+
+    def __init__(self, *alarms):
+        self.alarms = list(alarms)
+        self.paths = []
+
+    def iter_results(self, path, priority=None):
+        self.paths.append(path)
+        return iter(self.alarms)
+
+
+def test_lease_goes_to_one_replica_and_is_handed_over_on_release(replicas):
+    a = Lease(replicas(), "poller", owner="a", ttl=0.3)
+    b = Lease(replicas(), "poller", owner="b", ttl=0.3)
+
+    assert a.held()
+    assert not b.held()
+
+    a.release()
+    time.sleep(b.renew_interval + 0.01)
+
+    assert b.held()
+    assert not Lease(a.backend, "poller", owner="a", ttl=0.3).held()
+
+
+def test_lease_of_a_dead_leader_runs_out(replicas):
+    a = Lease(replicas(), "scheduler", owner="a", ttl=0.2)
+    b = Lease(replicas(), "scheduler", owner="b", ttl=0.2)
+
+    assert a.held()
+    assert not b.held()
+
+    # a stops renewing, as it would once its replica died
+    time.sleep(0.25)
+
+    assert b.held()
+
+
+def test_cached_responses_are_shared_between_replicas(replicas):
+    a = ResponseCache(ttls={"sites": 60}, shared=replicas())
+    b = ResponseCache(ttls={"sites": 60}, shared=replicas())
+
+    def unreachable():
+        raise AssertionError("b should not call Mist")
+
+    assert a.get_or_fetch("sites/1", "sites", lambda: {"name": "hq"}) == {"name": "hq"}
+    assert b.get_or_fetch("sites/1", "sites", unreachable) == {"name": "hq"}
+    assert b.stats["shared_hits"] == 1
+
+
+def test_only_the_leader_renders_and_followers_serve_its_result(replicas):
+    renders = []
+
+    def render():
+        renders.append(1)
+        return "report"
+
+    leader = ReportScheduler(
+        lease=Lease(replicas(), "scheduler", owner="a"), shared=replicas()
+    )
+    follower = ReportScheduler(
+        lease=Lease(replicas(), "scheduler", owner="b"), shared=replicas()
+    )
+    for scheduler in (leader, follower):
+        scheduler.add("sites", render, 60)
+
+    leader.run_due()
+    follower.run_due()
+    deadline = time.monotonic() + 5
+    while leader.warm("sites") is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert follower.jobs["sites"].result is None
+    assert follower.warm("sites")[0] == "report"
+    assert len(renders) == 1
+
+
+def test_new_leader_resumes_polling_where_the_last_one_stopped(replicas):
+    pushed = []
+    first = AlarmPoller(
+        FakeMist(alarm("seen", 1050)),
+        "org",
+        pushed.append,
+        interval=60,
+        lease=Lease(replicas(), "org:poller", owner="a", ttl=30),
+    )
+    assert first.lease.held()
+    first.poll(now=1000)
+    first.poll(now=1060)
+    first.lease.release()
+
+    mist = FakeMist(alarm("seen", 1050), alarm("new", 1080))
+    second = AlarmPoller(
+        mist,
+        "org",
+        pushed.append,
+        interval=60,
+        lease=Lease(replicas(), "org:poller", owner="b", ttl=30),
+    )
+    assert second.lease.held()
+    fresh = second.poll(now=1100)
+
+    # the overlap re-reads alarms the last leader pushed without pushing them again
+    assert "start=940&end=1100" in mist.paths[0]
+    assert [each.id for each in fresh] == ["new"]
+
+
+def run_for(seconds, *runners):
+    """Run the loops of several replicas side by side, then stop them."""
+
+    threads = [threading.Thread(target=runner.run, daemon=True) for runner in runners]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    for runner in runners:
+        runner.stop()
+    for thread in threads:
+        thread.join(2)
+
+
+def test_poller_keeps_the_lead_when_its_interval_outlasts_the_lease(replicas):
+    leading, waiting = FakeMist(), FakeMist()
+    pollers = [
+        AlarmPoller(
+            mist,
+            "org",
+            list,
+            interval=0.6,
+            lease=Lease(replicas(), "org:poller", owner=owner, ttl=0.3),
+        )
+        for mist, owner in ((leading, "a"), (waiting, "b"))
+    ]
+    assert pollers[0].lease.held()
+
+    run_for(2, *pollers)
+
+    assert len(leading.paths) >= 3
+    assert waiting.paths == []
+
+
+def test_scheduler_keeps_the_lead_when_its_jobs_outlast_the_lease(replicas):
+    renders = []
+    schedulers = []
+    for owner in ("a", "b"):
+        scheduler = ReportScheduler(
+            lease=Lease(replicas(), "scheduler", owner=owner, ttl=0.3),
+            shared=replicas(),
+        )
+        scheduler.add("sites", lambda owner=owner: renders.append(owner) or owner, 0.6)
+        schedulers.append(scheduler)
+    assert schedulers[0].lease.held()
+
+    run_for(2, *schedulers)
+
+    assert len(renders) >= 2
+    assert set(renders) == {"a"}
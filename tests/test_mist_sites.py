@@ -0,0 +1,21 @@
+"""Org site listings follow every page."""
+
+# Local
+from mist_helper import MistApi
+
+
+def test_list_sites_merges_every_page(monkeypatch):
+    sites = [{"id": f"site-{index}", "name": f"Site {index}"} for index in range(450)]
+    paths = []
+
+    def fake_get(self, path=None, cache=True, priority=None, deadline=None):
+        paths.append(path)
+        query = dict(each.split("=") for each in path.split("?")[1].split("&"))
+        limit, page = int(query["limit"]), int(query["page"])
+        return sites[(page - 1) * limit : page * limit]
+
+    monkeypatch.setattr(MistApi, "get", fake_get)
+    monkeypatch.setattr("mist_helper.SITES_PAGE_LIMIT", 200)
+
+    assert MistApi(api_token="token").list_sites("org") == sites
+    assert len(paths) == 3
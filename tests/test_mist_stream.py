@@ -0,0 +1,127 @@
+"""MistStream against a local aiohttp WebSocket server."""
+
+# Standard library
+import asyncio
+import json
+
+# Third Party
+from aiohttp import web
+
+# Local
+from mist_resilience import RetryPolicy
+from mist_stream import MistStream
+
+
+def alarm(alarm_id):
+    return {
+        "id": alarm_id,
+        "count": 1,
+        "group": "infrastructure",
+        "hostnames": ["ap-1"],
+        "last_seen": 1700000000,
+        "org_id": "org",
+        "severity": "critical",
+        "site_id": "s1",
+        "timestamp": 1700000000,
+        "type": "device_down",
+    }
+
+
+def frame(*alarm_ids):
+    return json.dumps(
+        {
+            "event": "data",
+            "channel": "/sites/s1/alarms",
+            "data": json.dumps([alarm(each) for each in alarm_ids]),
+        }
+    )
+
+
+async def serve(connections):
+    """WebSocket server sending each connection its own list of frames, then closing."""
+
+    subscriptions = []
+
+    async def handler(request):
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        subscriptions.append(await websocket.receive_json())
+        for each in connections.pop(0) if connections else []:
+            await websocket.send_str(each)
+        if connections:
+            await websocket.close()
+        else:
+            # hold the last connection until the client leaves
+            await websocket.receive()
+        return websocket
+
+    app = web.Application()
+    app.router.add_get("/stream", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    return runner, f"http://127.0.0.1:{port}/stream", subscriptions
+
+
+def run_stream(connections, on_alarms, until):
+    """Stream until `until()` holds (or a few seconds pass) and return the stream."""
+
+    async def main():
+        runner, url, subscriptions = await serve(connections)
+        stream = MistStream(
+            url,
+            "token",
+            lambda: ["/sites/s1/alarms"],
+            on_alarms,
+            resync=0.1,
+            backoff=RetryPolicy(base=0.01, cap=0.02),
+        )
+        task = asyncio.ensure_future(stream.run())
+        for _ in range(300):
+            if until() or task.done():
+                break
+            await asyncio.sleep(0.01)
+        stream.stop()
+        await asyncio.wait_for(task, 2)
+        await runner.cleanup()
+        stream.subscriptions = subscriptions
+        return stream
+
+    return asyncio.run(main())
+
+
+def test_bad_frame_is_skipped_and_stream_reconnects_and_dedupes():
+    received = []
+    stream = run_stream(
+        [["not json", frame("a1")], [frame("a1", "a2")]],
+        lambda alarms: received.extend(each.id for each in alarms),
+        lambda: len(received) >= 2,
+    )
+
+    assert received == ["a1", "a2"]
+    assert stream.stats["failed"] == 1
+    assert stream.stats["duplicates"] == 1
+    assert stream.stats["connects"] >= 2
+    # the channel is subscribed again on every new connection
+    assert stream.subscriptions[:2] == [{"subscribe": "/sites/s1/alarms"}] * 2
+
+
+def test_failing_handler_does_not_end_the_stream():
+    received = []
+
+    def on_alarms(alarms):
+        if not received:
+            received.append(None)
+            raise RuntimeError("database is locked")
+        received.extend(each.id for each in alarms)
+
+    run_stream(
+        [[frame("a1"), frame("a2")]],
+        on_alarms,
+        lambda: "a2" in received,
+    )
+
+    assert received == [None, "a2"]
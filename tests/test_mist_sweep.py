@@ -0,0 +1,205 @@
+"""Org-wide alarm sweeps over streamed per-site searches."""
+
+# Standard library
+import io
+import json
+
+# Third Party
+import requests
+from urllib3.exceptions import ProtocolError
+
+# Local
+from mist_helper import MistApi
+from mist_resilience import BreakerBoard, RetryPolicy
+
+
+def alarm(alarm_id, site_id):
+    return {
+        "id": alarm_id,
+        "count": 1,
+        "group": "infrastructure",
+        "hostnames": ["ap-1"],
+        "last_seen": 1700000000,
+        "org_id": "org",
+        "severity": "critical",
+        "site_id": site_id,
+        "timestamp": 1700000000,
+        "type": "device_down",
+    }
+
+
+def sweep(monkeypatch, answers, sites=None):
+    """Sweep sites s1 and s2, each answering from its list of outcomes."""
+
+    calls = []
+
+    def fake_iter_results(self, path, priority=None, stream=False, deadline=None):
+        site_id = path.split("/")[1]
+        calls.append(site_id)
+        for outcome in answers[site_id].pop(0):
+            if isinstance(outcome, Exception):
+                raise outcome
+            yield outcome
+
+    monkeypatch.setattr(
+        MistApi,
+        "list_sites",
+        lambda self, org_id, priority=None: sites
+        or [{"id": "s1", "name": "HQ"}, {"id": "s2", "name": "Branch"}],
+    )
+    monkeypatch.setattr(MistApi, "iter_results", fake_iter_results)
+    mist = MistApi(api_token="token", retry=RetryPolicy(attempts=3, base=0.01))
+
+    return mist.sweep_alarms("org", "limit=100", concurrency=2), calls
+
+
+def test_sweep_merges_the_alarms_of_every_site(monkeypatch):
+    org_alerts, calls = sweep(
+        monkeypatch,
+        {"s1": [[alarm("a", "s1")]], "s2": [[alarm("b", "s2"), alarm("c", "s2")]]},
+    )
+
+    assert sorted(calls) == ["s1", "s2"]
+    assert not org_alerts.failed_sites
+    assert len(org_alerts.severities["critical"]["s2"]) == 2
+
+
+def test_transient_failure_retries_the_site_not_the_sweep(monkeypatch):
+    reset = requests.exceptions.ChunkedEncodingError("connection reset")
+    org_alerts, calls = sweep(
+        monkeypatch,
+        {
+            "s1": [[alarm("a", "s1")]],
+            # dropped halfway through the body, then answered in full
+            "s2": [[alarm("b", "s2"), reset], [alarm("b", "s2"), alarm("c", "s2")]],
+        },
+    )
+
+    assert calls.count("s2") == 2
+    assert not org_alerts.failed_sites
+    assert [each.id for each in org_alerts.severities["critical"]["s2"]] == ["b", "c"]
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    response = requests.Response()
+    response.status_code = 404
+    org_alerts, calls = sweep(
+        monkeypatch,
+        {"s1": [[alarm("a", "s1")]], "s2": [[requests.HTTPError(response=response)]]},
+    )
+
+    assert calls.count("s2") == 1
+    assert org_alerts.failed_sites == ["Branch"]
+
+
+def test_unnamed_sites_are_reported_under_their_id(monkeypatch):
+    org_alerts, _ = sweep(
+        monkeypatch,
+        {"s1": [[alarm("a", "s1")]], "s2": [[alarm("b", "s2")]], "s3": [[]]},
+        sites=[{"id": "s1", "name": "HQ"}, {"id": "s2", "name": None}, {"id": "s3"}],
+    )
+
+    assert not org_alerts.failed_sites
+    assert org_alerts.sites == {"s1": "HQ", "s2": "s2", "s3": "s3"}
+    assert [name for _, name, _ in org_alerts.ordered()] == ["HQ", "s2"]
+
+
+class Body(io.BytesIO):
+    """A response body that drops the connection after `cut` bytes."""
+
+    def __init__(self, payload, cut=None):
+        super().__init__(json.dumps(payload).encode())
+        self.cut = cut
+
+    def read(self, size=-1):
+        if self.cut is not None:
+            left = self.cut - self.tell()
+            if left <= 0 or size < 0:
+                raise ProtocolError("Connection broken: IncompleteRead")
+            size = min(size, left)
+        return super().read(size)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+class Streamed:
+    """A streamed Mist answer."""
+
+    status_code = 200
+    headers = {}
+
+    def __init__(self, body):
+        self.raw = body
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class WirePool:
+    """Answer each search path with its queue of response bodies."""
+
+    timeout = 5
+
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.paths = []
+
+    def session(self, url):
+        return self
+
+    def request(self, method, url, stream=False, **kwargs):
+        path = url.split("/api/v1/", 1)[1]
+        self.paths.append(path)
+        return Streamed(self.bodies[path].pop(0))
+
+
+def test_streamed_sweep_follows_next_links_and_restarts_a_dropped_site(monkeypatch):
+    first = "sites/s1/alarms/search?limit=2"
+    second = "sites/s1/alarms/search?limit=2&search_after=b"
+    page_one = {
+        "results": [alarm("a", "s1"), alarm("b", "s1")],
+        "next": f"/api/v1/{second}",
+    }
+    page_two = {"results": [alarm("c", "s1")]}
+    pool = WirePool(
+        {
+            first: [Body(page_one, cut=200), Body(page_one)],
+            second: [Body(page_two)],
+            "sites/s2/alarms/search?limit=2": [Body({"results": []})],
+        }
+    )
+    monkeypatch.setattr(
+        MistApi,
+        "list_sites",
+        lambda self, org_id, priority=None: [{"id": "s1", "name": "HQ"}, {"id": "s2"}],
+    )
+    mist = MistApi(
+        api_token="token",
+        pool=pool,
+        breakers=BreakerBoard(),
+        retry=RetryPolicy(attempts=3, base=0.01),
+    )
+
+    org_alerts = mist.sweep_alarms("org", "limit=2", concurrency=2)
+
+    assert not org_alerts.failed_sites
+    assert [each.id for each in org_alerts.severities["critical"]["s1"]] == [
+        "a",
+        "b",
+        "c",
+    ]
+    # the dropped first page was fetched again, the sweep was not restarted
+    assert pool.paths.count(first) == 2
+    assert pool.paths.count("sites/s2/alarms/search?limit=2") == 1
@@ -0,0 +1,100 @@
+"""Templates compiled once at import, and where their bytecode is kept."""
+
+# Standard library
+import os
+import stat
+import subprocess
+import sys
+
+# Third Party
+import pytest
+
+# Local
+import mist_helper
+from mist_helper import MistApi, SiteAlerts
+
+APP_DIR = os.path.join(os.path.dirname(__file__), "..", "app")
+
+
+def alarm(alarm_id, severity, alarm_type):
+    return {
+        "id": alarm_id,
+        "count": 1,
+        "group": "infrastructure",
+        "hostnames": ["ap-1"],
+        "last_seen": 1700000000,
+        "org_id": "org",
+        "severity": severity,
+        "site_id": "s1",
+        "timestamp": 1700000000,
+        "type": alarm_type,
+    }
+
+
+def test_every_template_is_compiled_at_import():
+    on_disk = {
+        name for name in os.listdir(mist_helper.TEMPLATE_DIR) if name.endswith(".j2")
+    }
+
+    assert set(mist_helper.templates) == on_disk
+
+
+def test_renders_use_the_precompiled_templates(monkeypatch):
+    def unexpected(name, *args, **kwargs):
+        raise AssertionError(f"{name} was loaded again")
+
+    monkeypatch.setattr(mist_helper.env, "get_template", unexpected)
+    site_alerts = SiteAlerts.from_records([alarm("a", "critical", "device_down")])
+
+    message = MistApi(api_token="token").template(site_alerts, "site_alerts.j2")
+
+    assert "*Mist Alerts*" in message
+
+
+def test_reload_mode_loads_templates_on_every_render(monkeypatch):
+    loaded = []
+    get_template = mist_helper.env.get_template
+
+    def tracking(name, *args, **kwargs):
+        loaded.append(name)
+        return get_template(name, *args, **kwargs)
+
+    monkeypatch.setattr(mist_helper, "TEMPLATE_RELOAD", True)
+    monkeypatch.setattr(mist_helper.env, "get_template", tracking)
+    site_alerts = SiteAlerts.from_records([])
+
+    MistApi(api_token="token").template(site_alerts, "site_alerts.j2")
+
+    assert loaded == ["site_alerts.j2"]
+
+
+def test_alerts_are_bucketed_by_severity_then_type():
+    site_alerts = SiteAlerts.from_records(
+        [
+            alarm("a", "critical", "device_down"),
+            alarm("b", "warn", "dhcp_failure"),
+            alarm("c", "critical", "device_down"),
+        ]
+    )
+
+    buckets = site_alerts.by_severity
+
+    assert [each.id for each in buckets["critical"]["device_down"]] == ["a", "c"]
+    assert [each.id for each in buckets["warn"]["dhcp_failure"]] == ["b"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX permissions")
+def test_bytecode_cache_directory_is_private(tmp_path):
+    cache = tmp_path / "jinja"
+    cache.mkdir(mode=0o777)
+    cache.chmod(0o777)
+
+    subprocess.run(
+        [sys.executable, "-c", "import mist_helper"],
+        cwd=APP_DIR,
+        env={**os.environ, "MIST_TEMPLATE_CACHE": str(cache)},
+        check=True,
+    )
+
+    assert stat.S_IMODE(cache.stat().st_mode) == 0o700
+    assert any(name.endswith(".cache") for name in os.listdir(cache))
@@ -0,0 +1,92 @@
+"""Signature policy and request validation of the Mist webhook receiver."""
+
+# Standard library
+import hashlib
+import hmac
+import io
+import json
+import socket
+
+# Third Party
+import pytest
+
+# Local
+from mist_webhook import WebhookBatcher, WebhookServer, webhook_alarms
+
+
+def server(**kwargs):
+    received = []
+    batcher = WebhookBatcher(received.extend, window=60)
+    return WebhookServer(batcher, port=0, host="127.0.0.1", **kwargs), batcher
+
+
+def test_refuses_to_start_without_a_secret():
+    with pytest.raises(ValueError):
+        server(secret="")
+
+
+def test_unsigned_deliveries_need_an_explicit_opt_out():
+    receiver, _ = server(secret="", allow_unsigned=True)
+    body = json.dumps({"topic": "alarms", "events": []}).encode()
+
+    assert receiver.receive(receiver.path, {}, io.BytesIO(body), len(body)) == 200
+    receiver.httpd.server_close()
+
+
+def test_rejects_bad_signatures():
+    receiver, _ = server(secret="s3cret")
+    body = json.dumps({"topic": "alarms", "events": []}).encode()
+    signed = hmac.new(b"s3cret", body, hashlib.sha256).hexdigest()
+
+    def deliver(headers):
+        return receiver.receive(receiver.path, headers, io.BytesIO(body), len(body))
+
+    assert deliver({}) == 401
+    assert deliver({"X-Mist-Signature-v2": "0" * 64}) == 401
+    assert deliver({"X-Mist-Signature-v2": signed}) == 200
+    receiver.httpd.server_close()
+
+
+@pytest.mark.parametrize("length", [None, "abc", "-5"])
+def test_rejects_a_missing_or_bad_content_length(length):
+    receiver, _ = server(secret="", allow_unsigned=True)
+    receiver.start()
+    request = f"POST {receiver.path} HTTP/1.1\r\nHost: localhost\r\n"
+    if length is not None:
+        request += f"Content-Length: {length}\r\n"
+
+    with socket.create_connection(("127.0.0.1", receiver.port), timeout=5) as sock:
+        sock.sendall(f"{request}Connection: close\r\n\r\n".encode())
+        status_line = sock.makefile("rb").readline()
+
+    assert status_line.split()[1] == b"400"
+    receiver.httpd.shutdown()
+    receiver.httpd.server_close()
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        [],
+        {"topic": "alarms", "events": {"id": "a"}},
+        {"topic": "alarms", "events": ["a", None]},
+    ],
+)
+def test_rejects_payloads_not_shaped_like_mist_deliveries(payload):
+    receiver, batcher = server(secret="", allow_unsigned=True)
+    body = json.dumps(payload).encode()
+
+    assert receiver.receive(receiver.path, {}, io.BytesIO(body), len(body)) == 400
+    assert batcher.stats["received"] == 0
+    receiver.httpd.server_close()
+
+
+def test_malformed_events_are_skipped_not_fatal():
+    events = [
+        {"type": "AP_DISCONNECTED", "mac": "a", "site_id": "s1", "timestamp": "x"},
+        {"type": "AP_DISCONNECTED", "mac": "b", "site_id": "s1", "timestamp": 1},
+    ]
+
+    alarms = webhook_alarms({"topic": "device-updowns", "events": events})
+
+    assert [each.hostnames for each in alarms] == [["b"]]
@@ -0,0 +1,84 @@
+"""Worker pool bounds and cancellation of the report queue."""
+
+# Standard library
+import threading
+import time
+
+# Local
+from mist_singleflight import SingleFlight
+from report_queue import ReportJob, ReportQueue, check_cancelled
+
+
+def test_concurrent_first_submissions_spawn_one_pool():
+    queue = ReportQueue(workers=4, maxsize=100, name="bounded")
+    barrier = threading.Barrier(16)
+
+    def submit():
+        barrier.wait()
+        queue.submit("noop", time.sleep, 0.01)
+
+    threads = [threading.Thread(target=submit) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(queue._threads) == 4
+
+
+def test_running_job_stops_at_its_next_check():
+    queue = ReportQueue(workers=1, name="cancel")
+    started, steps = threading.Event(), []
+
+    def report():
+        started.set()
+        for step in range(100):
+            check_cancelled()
+            steps.append(step)
+            time.sleep(0.01)
+
+    job = queue.submit("slow", report)
+    assert started.wait(1)
+    queue.cancel(job.id)
+
+    deadline = time.monotonic() + 2
+    while job.status == ReportJob.RUNNING and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert job.status == ReportJob.CANCELLED
+    assert len(steps) < 100
+
+
+def test_cancelling_one_of_two_coalesced_reports_spares_the_other():
+    queue = ReportQueue(workers=2, name="coalesced")
+    flight = SingleFlight()
+    fetching, release, posted = threading.Event(), threading.Event(), {}
+
+    def fetch():
+        fetching.set()
+        release.wait(2)
+        return "alerts"
+
+    def report(name):
+        # checked around the shared fetch, as the app's reports do
+        check_cancelled()
+        alerts = flight.do("sites/1/alarms", fetch)
+        check_cancelled()
+        posted[name] = alerts
+
+    leader = queue.submit("leader", report, "leader")
+    assert fetching.wait(1)
+    follower = queue.submit("follower", report, "follower")
+    deadline = time.monotonic() + 2
+    while not flight.stats["collapsed"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    queue.cancel(leader.id)
+    release.set()
+    while {leader.status, follower.status} & {ReportJob.PENDING, ReportJob.RUNNING}:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    assert leader.status == ReportJob.CANCELLED
+    assert follower.status == ReportJob.DONE
+    assert posted == {"follower": "alerts"}
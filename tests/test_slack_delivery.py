@@ -0,0 +1,67 @@
+"""Chunked Slack delivery and resilience of the outbox sender thread."""
+
+# Standard library
+import asyncio
+import time
+import urllib.error
+
+# Local
+from slack_delivery import SECTION_LIMIT, SlackDelivery, SlackOutbox, SlackPacer
+
+
+class FlakyDelivery:
+    """Fails the first post with a network error, then records the rest."""
+
+    def __init__(self):
+        self.posted = []
+
+    def post(self, client, channel, text):
+        if not self.posted and text == "first":
+            self.posted.append(None)
+            raise urllib.error.URLError("connection reset")
+        self.posted.append(text)
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not predicate():
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_network_error_does_not_stop_the_outbox():
+    delivery = FlakyDelivery()
+    outbox = SlackOutbox(delivery, batch_window=0.01, batch_max_chars=0)
+
+    outbox.submit(None, "C1", "first")
+    assert wait_for(lambda: delivery.posted == [None])
+
+    outbox.submit(None, "C1", "second")
+    assert wait_for(lambda: delivery.posted == [None, "second"])
+
+
+def test_async_delivery_chunks_long_reports_into_a_thread():
+    class AsyncClient:
+        def __init__(self):
+            self.calls = []
+
+        async def chat_postMessage(self, **kwargs):
+            self.calls.append(kwargs)
+            return {"ts": f"ts-{len(self.calls)}"}
+
+    client = AsyncClient()
+    pacer = SlackPacer(intervals={"chat_postMessage": 0})
+    report = "\n".join(f"line {index} " + "x" * 200 for index in range(400))
+
+    ts = asyncio.run(SlackDelivery(pacer).post_async(client, "C1", report))
+
+    assert ts == "ts-1"
+    assert len(client.calls) > 1
+    assert all(
+        len(block["text"]["text"]) <= SECTION_LIMIT
+        for call in client.calls
+        for block in call["blocks"]
+    )
+    assert [call["thread_ts"] for call in client.calls[1:]] == ["ts-1"] * (
+        len(client.calls) - 1
+    )